@@ -2,7 +2,13 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
 from django.db.models import Count, Sum, Q
-from .models import Categoria, Producto, Cliente, Pedido, DetallePedido, Oferta
+from .models import Categoria, Producto, Cliente, Pedido, DetallePedido, Oferta, CorreoPendiente, TransicionPedido
+from .autocompletado_logic import invalidar_nombres
+from .catalogo_logic import invalidar_catalogo
+from .checkout_logic import actualizar_resumen_pedidos
+from .pedido_logic import transicionar_pedidos
+from .rollup_logic import recalcular_dias_de_pedidos
+from .busqueda_logic import filtrar_por_texto, usa_busqueda_completa
 from django.templatetags.static import static
 
 # ===== CONFIGURACIÓN PARA CATEGORÍA =====
@@ -58,12 +64,16 @@ class CategoriaAdmin(admin.ModelAdmin):
     actions = ['activar_categorias', 'desactivar_categorias']
     
     def activar_categorias(self, request, queryset):
-        updated = queryset.update(activa=True)
+        updated = queryset.update(activa=True, fecha_modificacion=timezone.now())
+        invalidar_catalogo()
+        invalidar_nombres()
         self.message_user(request, f'{updated} categoría(s) activada(s).')
     activar_categorias.short_description = "✓ Activar categorías seleccionadas"
     
     def desactivar_categorias(self, request, queryset):
-        updated = queryset.update(activa=False)
+        updated = queryset.update(activa=False, fecha_modificacion=timezone.now())
+        invalidar_catalogo()
+        invalidar_nombres()
         self.message_user(request, f'{updated} categoría(s) desactivada(s).')
     desactivar_categorias.short_description = "✗ Desactivar categorías seleccionadas"
 
@@ -177,12 +187,14 @@ class OfertaAdmin(admin.ModelAdmin):
     actions = ['activar_ofertas', 'desactivar_ofertas']
     
     def activar_ofertas(self, request, queryset):
-        updated = queryset.update(activa=True)
+        updated = queryset.update(activa=True, fecha_modificacion=timezone.now())
+        invalidar_catalogo()
         self.message_user(request, f'{updated} oferta(s) activada(s).')
     activar_ofertas.short_description = "✓ Activar ofertas"
     
     def desactivar_ofertas(self, request, queryset):
-        updated = queryset.update(activa=False)
+        updated = queryset.update(activa=False, fecha_modificacion=timezone.now())
+        invalidar_catalogo()
         self.message_user(request, f'{updated} oferta(s) desactivada(s).')
     desactivar_ofertas.short_description = "✗ Desactivar ofertas"
 
@@ -196,6 +208,7 @@ class ProductoAdmin(admin.ModelAdmin):
     search_fields = ('nombre', 'descripcion', 'id')
     ordering = ('-fecha_creacion',)
     list_per_page = 20
+    list_select_related = ('categoria',)
     autocomplete_fields = ['categoria']
     readonly_fields = ('fecha_creacion', 'fecha_modificacion', 'imagen_preview_large')
     
@@ -255,18 +268,24 @@ class ProductoAdmin(admin.ModelAdmin):
         )
     stock_badge.short_description = 'Stock'
     
+    def get_queryset(self, request):
+        # Anota la oferta vigente para que oferta_badge no consulte por fila
+        return super().get_queryset(request).con_precio_vigente()
+    
+    def get_search_results(self, request, queryset, search_term):
+        # En PostgreSQL se busca con el índice de texto completo en lugar de
+        # icontains sobre la descripción (búsqueda por ID se mantiene igual)
+        termino = search_term.strip()
+        if not termino or termino.isdigit() or not usa_busqueda_completa():
+            return super().get_search_results(request, queryset, search_term)
+        return filtrar_por_texto(queryset, termino), False
+    
     def oferta_badge(self, obj):
-        if obj.tiene_oferta_activa:
-            oferta = obj.ofertas.filter(
-                fecha_inicio__lte=timezone.now(),
-                fecha_fin__gte=timezone.now(),
-                activa=True
-            ).first()
-            if oferta:
-                return format_html(
-                    '<span style="background-color: #dc3545; color: white; padding: 3px 10px; border-radius: 3px; font-weight: bold;">🔥 -{}%</span>',
-                    oferta.descuento_porcentaje
-                )
+        if obj.tiene_oferta_vigente:
+            return format_html(
+                '<span style="background-color: #dc3545; color: white; padding: 3px 10px; border-radius: 3px; font-weight: bold;">🔥 -{}%</span>',
+                obj.descuento_vigente
+            )
         return format_html('<span style="color: #6c757d;">-</span>')
     oferta_badge.short_description = 'Oferta'
     
@@ -283,17 +302,22 @@ class ProductoAdmin(admin.ModelAdmin):
     actions = ['activar_productos', 'desactivar_productos', 'marcar_sin_stock']
     
     def activar_productos(self, request, queryset):
-        updated = queryset.update(activo=True)
+        updated = queryset.update(activo=True, fecha_modificacion=timezone.now())
+        invalidar_catalogo()
+        invalidar_nombres()
         self.message_user(request, f'{updated} producto(s) activado(s).')
     activar_productos.short_description = "✓ Activar productos"
     
     def desactivar_productos(self, request, queryset):
-        updated = queryset.update(activo=False)
+        updated = queryset.update(activo=False, fecha_modificacion=timezone.now())
+        invalidar_catalogo()
+        invalidar_nombres()
         self.message_user(request, f'{updated} producto(s) desactivado(s).')
     desactivar_productos.short_description = "✗ Desactivar productos"
     
     def marcar_sin_stock(self, request, queryset):
-        updated = queryset.update(stock_disponible=0)
+        updated = queryset.update(stock_disponible=0, fecha_modificacion=timezone.now())
+        invalidar_catalogo()
         self.message_user(request, f'{updated} producto(s) marcado(s) sin stock.')
     marcar_sin_stock.short_description = "⚠ Marcar sin stock"
 
@@ -313,6 +337,18 @@ class DetallePedidoInline(admin.TabularInline):
     subtotal_calculado.short_description = 'Subtotal'
 
 
+# ===== HISTORIAL DE ESTADOS DEL PEDIDO (INLINE) =====
+class TransicionPedidoInline(admin.TabularInline):
+    model = TransicionPedido
+    extra = 0
+    can_delete = False
+    fields = ('fecha', 'estado_anterior', 'estado_nuevo', 'usuario', 'origen')
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 # ===== CONFIGURACIÓN PARA PEDIDO =====
 @admin.register(Pedido)
 class PedidoAdmin(admin.ModelAdmin):
@@ -321,7 +357,7 @@ class PedidoAdmin(admin.ModelAdmin):
     list_filter = ('estado_pedido', 'metodo_pago', 'fecha_pedido')
     search_fields = ('nombre_cliente', 'correo_cliente', 'telefono_cliente', 'id', 'numero_seguimiento')
     date_hierarchy = 'fecha_pedido'
-    inlines = [DetallePedidoInline]
+    inlines = [DetallePedidoInline, TransicionPedidoInline]
     ordering = ('-fecha_pedido',)
     readonly_fields = ('fecha_pedido', 'total_pedido', 'fecha_pago', 'fecha_envio', 'fecha_entrega')
     
@@ -395,35 +431,39 @@ class PedidoAdmin(admin.ModelAdmin):
     
     actions = ['marcar_como_pagado', 'marcar_como_enviado', 'marcar_como_completado', 'cancelar_pedidos']
     
+    def _transicionar(self, request, queryset, estado_nuevo, accion):
+        """
+        Aplica la transición a todos los pedidos seleccionados en un solo
+        UPDATE (ver pedido_logic.transicionar_pedidos) e informa cuántos
+        cambiaron desde cada estado y cuántos se omitieron.
+        """
+        seleccionados = queryset.count()
+        conteo = transicionar_pedidos(queryset, estado_nuevo, usuario=request.user)
+        cambiados = sum(conteo.values())
+        nombres = dict(Pedido.ESTADOS)
+        mensaje = f'{cambiados} pedido(s) {accion}.'
+        if conteo:
+            detalle = ', '.join(f'{nombres[estado]}: {cantidad}' for estado, cantidad in sorted(conteo.items()))
+            mensaje += f' Desde {detalle}.'
+        if seleccionados > cambiados:
+            mensaje += f' {seleccionados - cambiados} omitido(s) por su estado actual.'
+        self.message_user(request, mensaje)
+    
     def marcar_como_pagado(self, request, queryset):
-        count = 0
-        for pedido in queryset.filter(estado_pedido='pendiente_pago'):
-            pedido.marcar_como_pagado()
-            count += 1
-        self.message_user(request, f'{count} pedido(s) marcado(s) como pagado.')
+        self._transicionar(request, queryset, 'pagado', 'marcado(s) como pagado')
     marcar_como_pagado.short_description = "✅ Marcar como Pagado"
     
     def marcar_como_enviado(self, request, queryset):
-        count = 0
-        for pedido in queryset.filter(estado_pedido__in=['pagado', 'preparando']):
-            pedido.marcar_como_enviado()
-            count += 1
-        self.message_user(request, f'{count} pedido(s) marcado(s) como enviado.')
+        self._transicionar(request, queryset, 'enviado', 'marcado(s) como enviado')
     marcar_como_enviado.short_description = "📦 Marcar como Enviado"
     
     def marcar_como_completado(self, request, queryset):
-        count = 0
-        for pedido in queryset.filter(estado_pedido='enviado'):
-            pedido.marcar_como_completado()
-            count += 1
-        self.message_user(request, f'{count} pedido(s) marcado(s) como completado.')
+        self._transicionar(request, queryset, 'completado', 'marcado(s) como completado')
     marcar_como_completado.short_description = "✔️ Marcar como Completado"
     
     def cancelar_pedidos(self, request, queryset):
-        updated = queryset.filter(estado_pedido__in=['pendiente_pago', 'pagado']).update(
-            estado_pedido='cancelado'
-        )
-        self.message_user(request, f'{updated} pedido(s) cancelado(s).')
+        # Devuelve al stock las unidades de los pedidos cancelados
+        self._transicionar(request, queryset, 'cancelado', 'cancelado(s)')
     cancelar_pedidos.short_description = "❌ Cancelar Pedidos"
 
 
@@ -445,6 +485,49 @@ class DetallePedidoAdmin(admin.ModelAdmin):
     def subtotal_formateado(self, obj):
         return f'${obj.subtotal:,.0f}'
     subtotal_formateado.short_description = 'Subtotal'
+    
+    # Los detalles editados por separado cambian los rollups de ventas de su día
+    # y el resumen desnormalizado de su pedido
+    def save_model(self, request, obj, form, change):
+        pedidos_ids = {obj.pedido_id}
+        if change and 'pedido' in form.changed_data:
+            pedidos_ids.add(form.initial.get('pedido'))
+        super().save_model(request, obj, form, change)
+        actualizar_resumen_pedidos(pedidos_ids)
+        recalcular_dias_de_pedidos(Pedido.objects.filter(id__in=pedidos_ids))
+    
+    def delete_model(self, request, obj):
+        pedido_id = obj.pedido_id
+        super().delete_model(request, obj)
+        actualizar_resumen_pedidos([pedido_id])
+        recalcular_dias_de_pedidos(Pedido.objects.filter(id=pedido_id))
+    
+    def delete_queryset(self, request, queryset):
+        pedidos_ids = set(queryset.values_list('pedido_id', flat=True))
+        super().delete_queryset(request, queryset)
+        actualizar_resumen_pedidos(pedidos_ids)
+        recalcular_dias_de_pedidos(Pedido.objects.filter(id__in=pedidos_ids))
+
+
+# ===== CONFIGURACIÓN PARA CORREOS PENDIENTES (OUTBOX) =====
+@admin.register(CorreoPendiente)
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'pedido', 'asunto', 'estado', 'intentos', 'proximo_intento', 'fecha_envio')
+    list_display_links = ('id', 'asunto')
+    list_filter = ('estado', 'tipo')
+    search_fields = ('asunto', 'pedido__id')
+    ordering = ('-fecha_creacion',)
+    list_select_related = ('pedido',)
+    readonly_fields = ('fecha_creacion', 'fecha_envio', 'intentos', 'ultimo_error')
+    
+    actions = ['reintentar_correos']
+    
+    def reintentar_correos(self, request, queryset):
+        updated = queryset.exclude(estado='enviado').update(
+            estado='pendiente', intentos=0, proximo_intento=timezone.now()
+        )
+        self.message_user(request, f'{updated} correo(s) en cola para reintentar.')
+    reintentar_correos.short_description = "🔁 Reintentar envío"
 
 
 # ===== PERSONALIZACIÓN DEL SITIO ADMIN =====
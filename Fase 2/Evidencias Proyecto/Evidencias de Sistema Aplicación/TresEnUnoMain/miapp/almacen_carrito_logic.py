@@ -0,0 +1,170 @@
+# miapp/almacen_carrito_logic.py
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+
+# ===== ALMACENES DEL CARRITO =====
+#
+# Los carritos se guardan por clave ('carrito_guest' / 'carrito_user_{id}')
+# en el almacén elegido con settings.CARRITO_BACKEND:
+#   - 'sesion': dentro de la sesión de Django (reescribe la fila de django_session)
+#   - 'cache':  en el cache (Redis en producción), indexado por la sesión
+#   - 'cookie': en una cookie firmada y comprimida, sin estado en el servidor
+#
+# Todos exponen obtener(request, clave), guardar(request, clave, carrito),
+# eliminar(request, clave) y persistir(request, response); este último lo
+# llama AlmacenCarritoMiddleware al final de cada request.
+
+
+class AlmacenSesion:
+    """Carrito dentro de request.session (comportamiento original)."""
+
+    def obtener(self, request, clave):
+        return request.session.get(clave)
+
+    def guardar(self, request, clave, carrito):
+        request.session[clave] = carrito
+        request.session.modified = True
+
+    def eliminar(self, request, clave):
+        if clave in request.session:
+            del request.session[clave]
+            request.session.modified = True
+            return True
+        return False
+
+    def persistir(self, request, response):
+        pass
+
+
+class AlmacenCache:
+    """
+    Carrito en el cache, una entrada por sesión y clave. La sesión solo se
+    escribe al crearse; las modificaciones del carrito no tocan django_session.
+    Requiere un cache compartido entre workers (REDIS_URL) en producción.
+    """
+
+    def _clave_cache(self, request, clave, crear=False):
+        if not request.session.session_key:
+            if not crear:
+                return None
+            request.session.save()
+        return f'carrito:{request.session.session_key}:{clave}'
+
+    def obtener(self, request, clave):
+        clave_cache = self._clave_cache(request, clave)
+        return cache.get(clave_cache) if clave_cache else None
+
+    def guardar(self, request, clave, carrito):
+        cache.set(self._clave_cache(request, clave, crear=True), carrito, timeout=settings.SESSION_COOKIE_AGE)
+
+    def eliminar(self, request, clave):
+        clave_cache = self._clave_cache(request, clave)
+        return bool(clave_cache) and cache.delete(clave_cache)
+
+    def persistir(self, request, response):
+        pass
+
+
+class AlmacenCookieFirmada:
+    """
+    Todos los carritos del navegador en una cookie firmada (HMAC con
+    SECRET_KEY) y comprimida. Los ítems se guardan como [[id, cantidad], ...]
+    para que la cookie quede muy por debajo del límite de ~4 KB.
+    """
+
+    salt = 'miapp.carrito'
+
+    def _carritos(self, request):
+        # Se decodifica una sola vez por request; las escrituras se acumulan
+        # en el HttpRequest (no en el Request de DRF que lo envuelve) y el
+        # middleware las envía en la respuesta
+        request = _http_request(request)
+        if not hasattr(request, '_carritos_cookie'):
+            request._carritos_cookie = self._leer_cookie(request)
+            request._carritos_cookie_modificados = False
+        return request._carritos_cookie
+
+    def _leer_cookie(self, request):
+        valor = request.COOKIES.get(settings.CARRITO_COOKIE_NOMBRE)
+        if not valor:
+            return {}
+        try:
+            datos = signing.loads(valor, salt=self.salt, max_age=settings.SESSION_COOKIE_AGE)
+        except signing.BadSignature:
+            return {}
+        return {
+            clave: {
+                'items': {str(producto_id): cantidad for producto_id, cantidad in compacto['i']},
+                'version': compacto['v'],
+            }
+            for clave, compacto in datos.items()
+        }
+
+    def obtener(self, request, clave):
+        return self._carritos(request).get(clave)
+
+    def guardar(self, request, clave, carrito):
+        self._carritos(request)[clave] = carrito
+        _http_request(request)._carritos_cookie_modificados = True
+
+    def eliminar(self, request, clave):
+        carritos = self._carritos(request)
+        if clave in carritos:
+            del carritos[clave]
+            _http_request(request)._carritos_cookie_modificados = True
+            return True
+        return False
+
+    def persistir(self, request, response):
+        if not getattr(request, '_carritos_cookie_modificados', False):
+            return
+        carritos = request._carritos_cookie
+        if not carritos:
+            response.delete_cookie(settings.CARRITO_COOKIE_NOMBRE, samesite=settings.SESSION_COOKIE_SAMESITE)
+            return
+        datos = {
+            clave: {
+                'i': [[int(producto_id), cantidad] for producto_id, cantidad in carrito['items'].items()],
+                'v': carrito.get('version', 0),
+            }
+            for clave, carrito in carritos.items()
+        }
+        response.set_cookie(
+            settings.CARRITO_COOKIE_NOMBRE,
+            signing.dumps(datos, salt=self.salt, compress=True),
+            max_age=settings.SESSION_COOKIE_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite=settings.SESSION_COOKIE_SAMESITE,
+        )
+
+
+def _http_request(request):
+    """HttpRequest subyacente (las vistas de DRF reciben un Request que lo envuelve)."""
+    return getattr(request, '_request', request)
+
+
+ALMACENES = {
+    'sesion': AlmacenSesion(),
+    'cache': AlmacenCache(),
+    'cookie': AlmacenCookieFirmada(),
+}
+
+
+def obtener_almacen():
+    """Almacén configurado en settings.CARRITO_BACKEND."""
+    return ALMACENES[settings.CARRITO_BACKEND]
+
+
+class AlmacenCarritoMiddleware:
+    """Envía en la respuesta los cambios pendientes del almacén (cookie firmada)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        obtener_almacen().persistir(request, response)
+        return response
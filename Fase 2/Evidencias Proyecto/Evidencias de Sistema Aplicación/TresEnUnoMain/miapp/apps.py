@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MiappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'miapp'
+
+    def ready(self):
+        # Registrar las señales de invalidación de cache
+        from . import signals  # noqa: F401
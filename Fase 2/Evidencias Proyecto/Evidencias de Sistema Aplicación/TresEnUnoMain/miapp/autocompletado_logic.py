@@ -0,0 +1,219 @@
+# miapp/autocompletado_logic.py
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Categoria, Producto
+
+LIMITE_AUTOCOMPLETADO = 8
+# Cantidad de candidatos que se revisan antes de ordenar por relevancia
+CANDIDATOS_POR_SUGERENCIA = 4
+
+# Versión de los nombres indexados, separada de la versión del catálogo: los
+# cambios de stock, precio u ofertas no tocan el índice y no lo invalidan
+CLAVE_VERSION_NOMBRES = 'autocompletado:version'
+
+
+def version_nombres():
+    """Versión actual de los nombres indexables (en el cache compartido)."""
+    version = cache.get(CLAVE_VERSION_NOMBRES)
+    if version is None:
+        cache.add(CLAVE_VERSION_NOMBRES, 1, timeout=None)
+        version = cache.get(CLAVE_VERSION_NOMBRES, 1)
+    return version
+
+
+def invalidar_nombres():
+    """
+    Incrementa la versión de los nombres. Se llama cuando cambia el nombre,
+    el estado activo o la categoría de un producto o categoría (o se
+    eliminan); los índices de los demás procesos se reconstruyen.
+    """
+    try:
+        return cache.incr(CLAVE_VERSION_NOMBRES)
+    except ValueError:
+        cache.add(CLAVE_VERSION_NOMBRES, 1, timeout=None)
+        return cache.incr(CLAVE_VERSION_NOMBRES)
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes y con espacios simples ('  Plátano  Macho' -> 'platano macho')."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def _claves(nombre):
+    """
+    Genera una clave por cada palabra del nombre, desde esa palabra hasta
+    el final ('tomate cherry' -> 'tomate cherry', 'cherry'), para que
+    'cher' también encuentre 'Tomate Cherry'. Retorna tuplas (posición, clave).
+    """
+    palabras = normalizar(nombre).split()
+    return [(posicion, ' '.join(palabras[posicion:])) for posicion in range(len(palabras))]
+
+
+class IndicePrefijos:
+    """
+    Índice en memoria (por proceso) de nombres de productos y categorías
+    activos, guardado como un arreglo ordenado de claves normalizadas.
+    Una búsqueda por prefijo es un bisect más un recorrido corto, sin
+    consultar la base de datos.
+
+    El índice se construye la primera vez que se usa y se mantiene con las
+    señales post_save/post_delete. Si otro proceso cambia nombres (sube la
+    versión 'autocompletado:version' del cache compartido), se reconstruye
+    completo; los cambios de stock o precio no lo afectan. Esa versión se
+    revisa a lo más cada AUTOCOMPLETADO_REVISION_VERSION segundos (con
+    DatabaseCache cada revisión es una consulta), así que los cambios de
+    otros procesos aparecen con ese retraso; los del propio proceso, al
+    confirmarse.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta el índice; se volverá a construir en la próxima consulta."""
+        with self._lock:
+            # (claves, entradas): listas paralelas que se reemplazan juntas
+            self._indice = ([], [])
+            self._por_objeto = {}
+            self._version = None
+            # time.monotonic() de la última revisión de la versión compartida
+            self._revisado = 0.0
+
+    # ===== CONSTRUCCIÓN =====
+
+    def _construir(self):
+        # La versión se lee antes de consultar: un cambio concurrente deja
+        # el índice con una versión vieja y se vuelve a construir
+        version = version_nombres()
+        categorias = Categoria.objects.filter(activa=True).values_list('id', 'nombre')
+        productos = Producto.objects.filter(activo=True).values_list('id', 'nombre')
+        self.cargar(
+            [('categoria', objeto_id, nombre) for objeto_id, nombre in categorias.iterator()]
+            + [('producto', objeto_id, nombre) for objeto_id, nombre in productos.iterator()],
+            version,
+        )
+
+    def cargar(self, registros, version):
+        """Reemplaza el índice con los registros (tipo, id, nombre) dados."""
+        filas = []
+        por_objeto = {}
+        for tipo, objeto_id, nombre in registros:
+            claves = _claves(nombre)
+            por_objeto[(tipo, objeto_id)] = [clave for _, clave in claves]
+            for posicion, clave in claves:
+                filas.append((clave, (tipo, objeto_id, nombre, posicion)))
+
+        filas.sort(key=lambda fila: fila[0])
+        self._indice = ([clave for clave, _ in filas], [entrada for _, entrada in filas])
+        self._por_objeto = por_objeto
+        self._version = version
+
+    def _vigente_sin_revisar(self, ahora):
+        return (
+            self._version is not None
+            and ahora - self._revisado < settings.AUTOCOMPLETADO_REVISION_VERSION
+        )
+
+    def _asegurar_vigente(self):
+        ahora = time.monotonic()
+        if self._vigente_sin_revisar(ahora):
+            return
+        with self._lock:
+            if self._vigente_sin_revisar(ahora):
+                return
+            if self._version is None or self._version != version_nombres():
+                self._construir()
+            self._revisado = ahora
+
+    # ===== ACTUALIZACIÓN INCREMENTAL =====
+
+    def _quitar(self, claves, entradas, tipo, objeto_id):
+        for clave in self._por_objeto.pop((tipo, objeto_id), []):
+            indice = bisect_left(claves, clave)
+            while indice < len(claves) and claves[indice] == clave:
+                entrada = entradas[indice]
+                if entrada[0] == tipo and entrada[1] == objeto_id:
+                    del claves[indice]
+                    del entradas[indice]
+                    break
+                indice += 1
+
+    def _agregar(self, claves, entradas, tipo, objeto_id, nombre):
+        nuevas = _claves(nombre)
+        for posicion, clave in nuevas:
+            indice = bisect_left(claves, clave)
+            claves.insert(indice, clave)
+            entradas.insert(indice, (tipo, objeto_id, nombre, posicion))
+        self._por_objeto[(tipo, objeto_id)] = [clave for _, clave in nuevas]
+
+    def actualizar(self, tipo, objeto_id, nombre=None, activo=True):
+        """
+        Registra el cambio confirmado de un objeto: sube la versión compartida
+        (para los demás procesos) y lo aplica al índice de este proceso, si
+        ya fue construido. Con activo=False (o nombre None) el objeto se
+        elimina del índice.
+        """
+        version = invalidar_nombres()
+        with self._lock:
+            if self._version is None:
+                return
+            # Se modifica una copia y luego se reemplaza, para que las
+            # búsquedas concurrentes nunca vean las listas a medio actualizar
+            claves, entradas = list(self._indice[0]), list(self._indice[1])
+            self._quitar(claves, entradas, tipo, objeto_id)
+            if activo and nombre:
+                self._agregar(claves, entradas, tipo, objeto_id, nombre)
+            self._indice = (claves, entradas)
+            # Si este cambio es el único desde la versión del índice, se adopta
+            # la nueva versión sin reconstruir; si otro proceso cambió nombres
+            # entremedio, la próxima búsqueda reconstruye con sus cambios
+            if self._version == version - 1:
+                self._version = version
+
+    # ===== CONSULTA =====
+
+    def buscar(self, texto, limite=LIMITE_AUTOCOMPLETADO):
+        """
+        Retorna hasta `limite` sugerencias [{'texto', 'tipo', 'id'}] cuyo
+        nombre (o alguna de sus palabras) empieza con el texto escrito.
+        Primero las que coinciden desde el inicio del nombre; las categorías
+        antes que los productos.
+        """
+        prefijo = normalizar(texto)
+        if not prefijo:
+            return []
+
+        self._asegurar_vigente()
+        claves, entradas = self._indice
+
+        candidatos = {}
+        indice = bisect_left(claves, prefijo)
+        maximo = limite * CANDIDATOS_POR_SUGERENCIA
+        while indice < len(claves) and claves[indice].startswith(prefijo) and len(candidatos) < maximo:
+            tipo, objeto_id, nombre, posicion = entradas[indice]
+            anterior = candidatos.get((tipo, objeto_id))
+            if anterior is None or posicion < anterior[0]:
+                candidatos[(tipo, objeto_id)] = (posicion, claves[indice], nombre)
+            indice += 1
+
+        ordenados = sorted(
+            candidatos.items(),
+            key=lambda item: (item[1][0], item[0][0] != 'categoria', item[1][1])
+        )
+        return [
+            {'texto': nombre, 'tipo': tipo, 'id': objeto_id}
+            for (tipo, objeto_id), (_, _, nombre) in ordenados[:limite]
+        ]
+
+
+# Índice compartido por todas las peticiones del proceso
+indice_autocompletado = IndicePrefijos()
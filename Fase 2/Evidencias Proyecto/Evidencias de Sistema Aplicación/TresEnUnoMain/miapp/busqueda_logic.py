@@ -0,0 +1,95 @@
+# miapp/busqueda_logic.py
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import Producto
+
+# Configuración creada en la migración 0004 (español + unaccent)
+CONFIGURACION_BUSQUEDA = 'spanish_unaccent'
+LIMITE_RESULTADOS = 20
+LIMITE_RESULTADOS_MAXIMO = 50
+LIMITE_SUGERENCIAS = 8
+
+
+def tokenizar(texto):
+    """Separa el texto en palabras (letras y dígitos), descartando símbolos."""
+    return re.findall(r'\w+', (texto or '').lower())
+
+
+def _consulta_prefijos(tokens):
+    """
+    Construye una consulta tsquery en la que cada palabra es un prefijo
+    ("tom ces" -> "tom:* & ces:*"), para que la búsqueda funcione mientras
+    el usuario escribe.
+    """
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def usa_busqueda_completa():
+    """El índice tsvector/GIN solo existe en PostgreSQL."""
+    return connection.vendor == 'postgresql'
+
+
+def filtrar_por_texto(queryset, texto):
+    """
+    Filtra un queryset de productos por texto y lo ordena por relevancia.
+
+    En PostgreSQL usa la columna search_vector (índice GIN) con ranking;
+    en otros motores (SQLite en desarrollo/tests) usa icontains sobre
+    nombre, descripción y categoría.
+    """
+    tokens = tokenizar(texto)
+    if not tokens:
+        return queryset.none()
+
+    if usa_busqueda_completa():
+        consulta = SearchQuery(
+            _consulta_prefijos(tokens),
+            search_type='raw',
+            config=CONFIGURACION_BUSQUEDA,
+        )
+        return (
+            queryset
+            .filter(search_vector=consulta)
+            .annotate(rank=SearchRank(F('search_vector'), consulta))
+            .order_by('-rank', 'nombre')
+        )
+
+    filtro = Q()
+    for token in tokens:
+        filtro &= (
+            Q(nombre__icontains=token)
+            | Q(descripcion__icontains=token)
+            | Q(categoria__nombre__icontains=token)
+        )
+    return queryset.filter(filtro).order_by('nombre')
+
+
+def buscar_productos(texto, limite=LIMITE_RESULTADOS):
+    """
+    Retorna los productos activos que coinciden con el texto, con su precio
+    vigente anotado, ordenados por relevancia.
+    """
+    queryset = (
+        Producto.objects
+        .filter(activo=True)
+        .select_related('categoria')
+        .con_precio_vigente()
+    )
+    return list(filtrar_por_texto(queryset, texto)[:limite])
+
+
+def sugerencias(texto, limite=LIMITE_SUGERENCIAS):
+    """
+    Retorna nombres de productos activos para autocompletar lo que el
+    usuario está escribiendo. Usa la misma consulta por prefijos que la
+    búsqueda, de modo que en PostgreSQL también se resuelve con el índice GIN.
+    """
+    queryset = Producto.objects.filter(activo=True)
+    return list(
+        filtrar_por_texto(queryset, texto)
+        .values_list('nombre', flat=True)[:limite]
+    )
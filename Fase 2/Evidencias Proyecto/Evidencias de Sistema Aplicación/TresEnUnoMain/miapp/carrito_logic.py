@@ -0,0 +1,236 @@
+# miapp/carrito_logic.py
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .catalogo_logic import segundos_hasta_cambio_precio, version_catalogo
+from .checkout_logic import StockInsuficienteError
+from .models import Producto
+from .reserva_logic import con_stock_disponible, guardar_reservas
+
+
+def _ids_del_carrito(carrito):
+    """
+    Convierte las claves del carrito ({'<producto_id>': cantidad}) en una
+    lista ordenada de tuplas (producto_id, cantidad), descartando claves inválidas.
+    """
+    lineas = []
+    for producto_id_str, cantidad in carrito.get('items', {}).items():
+        try:
+            lineas.append((int(producto_id_str), cantidad))
+        except (TypeError, ValueError):
+            continue
+    return lineas
+
+
+def calcular_carrito_completo(carrito, productos=None):
+    """
+    Calcula el carrito completo con información de productos y totales.
+    Retorna un diccionario con items detallados, total y cantidad de items.
+
+    Usa una sola consulta (id__in) que además anota la mejor oferta vigente
+    de cada producto, en lugar de dos consultas por línea. Si se recibe
+    `productos` ({id: Producto} ya anotado con precio_vigente) no consulta.
+    """
+    lineas = _ids_del_carrito(carrito)
+    producto_ids = [producto_id for producto_id, _ in lineas]
+
+    if productos is None:
+        productos = Producto.objects.con_precio_vigente().in_bulk(producto_ids) if producto_ids else {}
+
+    items_detallados = []
+    total = Decimal('0.00')
+
+    for producto_id, cantidad in lineas:
+        producto = productos.get(producto_id)
+        if producto is None:
+            # Si el producto ya no existe, lo omitimos
+            continue
+
+        precio = Decimal(str(producto.precio_vigente))
+        subtotal = precio * cantidad
+
+        imagen_url = None
+        if producto.imagen:
+            imagen_url = producto.get_imagen_url()
+
+        items_detallados.append({
+            'producto_id': producto.id,
+            'nombre': producto.nombre,
+            'precio_unitario': precio,
+            'cantidad': cantidad,
+            'unidad_medida': producto.unidad_medida,
+            'imagen': producto.imagen,
+            'imagen_url': imagen_url,
+            'stock_disponible': producto.stock_disponible,
+            'subtotal': subtotal
+        })
+        total += subtotal
+
+    return {
+        'items': items_detallados,
+        'total': total,
+        'cantidad_items': sum(item['cantidad'] for item in items_detallados)
+    }
+
+
+def fusionar_carritos(invitado, usuario, titular=None):
+    """
+    Suma el carrito de invitado al del usuario (al hacer login) validando
+    todas las líneas con una sola consulta de productos.
+
+    Las líneas de productos inactivos o eliminados se descartan y las
+    cantidades se limitan al stock disponible (descontando reservas de otros
+    carritos si se indica `titular`). Retorna (carrito, carrito_completo,
+    ajustes); `ajustes` lista {'producto_id', 'nombre', 'solicitado', 'cantidad'}
+    de cada línea que cambió.
+    """
+    cantidades = {}
+    for producto_id, cantidad in _ids_del_carrito(usuario) + _ids_del_carrito(invitado):
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+
+    productos = Producto.objects.con_precio_vigente().filter(activo=True)
+    if titular:
+        productos = con_stock_disponible(productos, titular=titular)
+    productos = productos.in_bulk(list(cantidades)) if cantidades else {}
+
+    items = {}
+    ajustes = []
+    for producto_id, solicitado in cantidades.items():
+        producto = productos.get(producto_id)
+        disponible = 0
+        if producto is not None:
+            disponible = max(producto.stock_libre if titular else producto.stock_disponible, 0)
+        cantidad = min(solicitado, disponible)
+        if cantidad != solicitado:
+            ajustes.append({
+                'producto_id': producto_id,
+                'nombre': producto.nombre if producto else None,
+                'solicitado': solicitado,
+                'cantidad': cantidad,
+            })
+        if cantidad:
+            items[str(producto_id)] = cantidad
+
+    carrito = dict(usuario, items=items)
+    return carrito, calcular_carrito_completo(carrito, productos), ajustes
+
+
+def aplicar_operaciones(carrito, operaciones, titular=None):
+    """
+    Aplica en orden un lote de operaciones ({'op': 'set'|'add'|'remove',
+    'producto_id', 'cantidad'}) y valida el resultado con una sola consulta
+    de productos. Es todo o nada: si alguna línea que aumenta no tiene
+    stock (o el producto no está activo) lanza StockInsuficienteError con
+    todas las faltantes y el carrito no cambia.
+
+    Con `titular` (modo de reservas) bloquea los productos, descuenta las
+    reservas de otros carritos y actualiza las reservas propias en bloque.
+    Retorna (carrito, carrito_completo).
+    """
+    originales = {int(producto_id): cantidad for producto_id, cantidad in _ids_del_carrito(carrito)}
+    items = dict(originales)
+    for operacion in operaciones:
+        producto_id = operacion['producto_id']
+        if operacion['op'] == 'set':
+            items[producto_id] = operacion['cantidad']
+        elif operacion['op'] == 'add':
+            items[producto_id] = items.get(producto_id, 0) + operacion['cantidad']
+        else:
+            items[producto_id] = 0
+    items = {producto_id: cantidad for producto_id, cantidad in items.items() if cantidad > 0}
+
+    tocados = {operacion['producto_id'] for operacion in operaciones}
+    cambios = {
+        producto_id: items.get(producto_id, 0)
+        for producto_id in tocados
+        if items.get(producto_id, 0) != originales.get(producto_id, 0)
+    }
+
+    with transaction.atomic():
+        productos = Producto.objects.con_precio_vigente()
+        if titular:
+            productos = con_stock_disponible(productos.select_for_update(), titular=titular)
+        productos = productos.in_bulk(list(set(items) | tocados)) if items or tocados else {}
+
+        faltantes = []
+        for producto_id, cantidad in cambios.items():
+            if cantidad <= originales.get(producto_id, 0):
+                continue
+            producto = productos.get(producto_id)
+            disponible = 0
+            if producto is not None and producto.activo:
+                disponible = max(producto.stock_libre if titular else producto.stock_disponible, 0)
+            if cantidad > disponible:
+                faltantes.append({
+                    'producto_id': producto_id,
+                    'nombre': producto.nombre if producto else None,
+                    'solicitado': cantidad,
+                    'disponible': disponible,
+                })
+        if faltantes:
+            raise StockInsuficienteError(faltantes)
+
+        if titular and cambios:
+            guardar_reservas(titular, cambios)
+
+    carrito = dict(carrito, items={str(producto_id): cantidad for producto_id, cantidad in items.items()})
+    return carrito, calcular_carrito_completo(carrito, productos)
+
+
+# ===== RESUMEN DEL CARRITO (BADGE DE LA BARRA DE NAVEGACIÓN) =====
+
+def clave_resumen_carrito(session_key, carrito_key):
+    """Clave de cache del snapshot del resumen para una sesión y un carrito."""
+    return f'carrito_resumen:{session_key}:{carrito_key}'
+
+
+def invalidar_resumen_carrito(session_key, carrito_key):
+    """Elimina el snapshot del resumen (se llama cuando el carrito cambia)."""
+    if session_key:
+        cache.delete(clave_resumen_carrito(session_key, carrito_key))
+
+
+def resumen_carrito(session_key, carrito_key, carrito):
+    """
+    Retorna {'cantidad_items', 'total', 'version'} del carrito.
+
+    El resultado se guarda en cache por sesión y solo se recalcula si el
+    carrito cambió (el snapshot se elimina al guardarlo) o si cambió la
+    versión del catálogo (precio, stock u ofertas).
+    """
+    version = carrito.get('version', 0)
+
+    if not carrito.get('items'):
+        return {'cantidad_items': 0, 'total': Decimal('0.00'), 'version': version}
+
+    catalogo = version_catalogo()
+    clave = clave_resumen_carrito(session_key, carrito_key) if session_key else None
+
+    if clave:
+        snapshot = cache.get(clave)
+        if snapshot and snapshot['catalogo'] == catalogo and snapshot['version'] == version:
+            return {
+                'cantidad_items': snapshot['cantidad_items'],
+                'total': snapshot['total'],
+                'version': version,
+            }
+
+    carrito_completo = calcular_carrito_completo(carrito)
+    resumen = {
+        'cantidad_items': carrito_completo['cantidad_items'],
+        'total': carrito_completo['total'],
+        'version': version,
+    }
+
+    if clave:
+        # El total usa precios de oferta: el snapshot vence en el próximo cambio de precio
+        cache.set(
+            clave,
+            dict(resumen, catalogo=catalogo),
+            timeout=segundos_hasta_cambio_precio(settings.CARRITO_RESUMEN_TTL)
+        )
+
+    return resumen
@@ -0,0 +1,213 @@
+# miapp/catalogo_logic.py
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min, Q, Subquery
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import Categoria, Oferta, Producto
+
+# Clave del contador de versión del catálogo en el cache compartido
+CLAVE_VERSION_CATALOGO = 'catalogo:version'
+
+
+def version_catalogo():
+    """
+    Retorna la versión actual del catálogo (precios, stock y ofertas).
+    Se guarda en el cache, por lo que leerla no consulta la base de datos.
+    """
+    version = cache.get(CLAVE_VERSION_CATALOGO)
+    if version is None:
+        cache.add(CLAVE_VERSION_CATALOGO, 1, timeout=None)
+        version = cache.get(CLAVE_VERSION_CATALOGO, 1)
+    return version
+
+
+def invalidar_catalogo():
+    """
+    Incrementa la versión del catálogo. Todo snapshot que dependa de precios,
+    stock u ofertas queda obsoleto al comparar su versión con la actual.
+
+    El incremento se registra para cuando confirme la transacción en curso
+    (de inmediato fuera de una): si se hiciera antes, un lector concurrente
+    que aún ve las filas sin confirmar las guardaría bajo la versión nueva,
+    y un rollback dejaría la versión subida sin cambios.
+    """
+    transaction.on_commit(_subir_version_catalogo)
+
+
+def _subir_version_catalogo():
+    try:
+        return cache.incr(CLAVE_VERSION_CATALOGO)
+    except ValueError:
+        # La clave no existe (cache reiniciado o expulsada): se vuelve a crear
+        cache.add(CLAVE_VERSION_CATALOGO, 1, timeout=None)
+        return cache.incr(CLAVE_VERSION_CATALOGO)
+
+
+def _ultimo(queryset, campo):
+    """Subconsulta con el mayor valor de `campo` (ORDER BY campo DESC LIMIT 1, por índice)."""
+    return Subquery(queryset.order_by(f'-{campo}').values(campo)[:1])
+
+
+def firma_catalogo(ahora=None):
+    """
+    Firma del estado visible del catálogo, para ETags de las APIs públicas.
+
+    Combina en una sola consulta (subconsultas resueltas por índice) la
+    última modificación de productos, categorías y ofertas y los últimos
+    límites de oferta ya cruzados (inicio y fin), de modo que la firma cambia
+    cuando una oferta empieza o termina aunque nadie edite nada. Se agrega
+    version_catalogo() para cubrir eliminaciones, que no dejan fecha.
+    """
+    ahora = ahora or timezone.now()
+    fila = (
+        Producto.objects.order_by('-fecha_modificacion')
+        .values('fecha_modificacion')
+        .annotate(
+            categorias=_ultimo(Categoria.objects.all(), 'fecha_modificacion'),
+            ofertas=_ultimo(Oferta.objects.all(), 'fecha_modificacion'),
+            inicio_oferta=_ultimo(Oferta.objects.filter(fecha_inicio__lte=ahora), 'fecha_inicio'),
+            fin_oferta=_ultimo(Oferta.objects.filter(fecha_fin__lt=ahora), 'fecha_fin'),
+        )
+        .first()
+    )
+    valores = [version_catalogo()] + (list(fila.values()) if fila else [])
+    return hashlib.sha1(repr(valores).encode()).hexdigest()[:32]
+
+
+# ===== LÍNEA DE TIEMPO DE OFERTAS =====
+#
+# El precio vigente depende de la hora (fecha_inicio <= ahora <= fecha_fin),
+# así que un precio cacheado solo es válido hasta el próximo inicio o fin de
+# una oferta activa. next_price_change_at() conoce ese instante y todo cache
+# que dependa de precios limita su TTL con segundos_hasta_cambio_precio().
+
+CLAVE_PROXIMO_CAMBIO = 'ofertas:proximo_cambio'
+
+
+def fronteras_ofertas(desde=None, hasta=None, limite=None):
+    """
+    Próximos inicios y fines de ofertas activas posteriores a `desde`,
+    ordenados: [{'instante', 'tipo' ('inicio'|'fin'), 'oferta'}, ...].
+    """
+    desde = desde or timezone.now()
+    ofertas = Oferta.objects.filter(activa=True).filter(
+        Q(fecha_inicio__gt=desde) | Q(fecha_fin__gt=desde)
+    )
+    if hasta:
+        ofertas = ofertas.filter(Q(fecha_inicio__lte=hasta) | Q(fecha_fin__lte=hasta))
+
+    fronteras = []
+    for oferta in ofertas.select_related('producto'):
+        for tipo, instante in (('inicio', oferta.fecha_inicio), ('fin', oferta.fecha_fin)):
+            if instante > desde and (hasta is None or instante <= hasta):
+                fronteras.append({'instante': instante, 'tipo': tipo, 'oferta': oferta})
+    fronteras.sort(key=lambda frontera: frontera['instante'])
+    return fronteras[:limite] if limite else fronteras
+
+
+def _calcular_proximo_cambio(ahora):
+    """Próximo inicio o fin de una oferta activa posterior a `ahora` (una consulta por índices)."""
+    fronteras = Oferta.objects.filter(activa=True).aggregate(
+        inicio=Min('fecha_inicio', filter=Q(fecha_inicio__gt=ahora)),
+        fin=Min('fecha_fin', filter=Q(fecha_fin__gt=ahora)),
+    )
+    pendientes = [frontera for frontera in fronteras.values() if frontera]
+    return min(pendientes) if pendientes else None
+
+
+def next_price_change_at(ahora=None):
+    """
+    Instante del próximo cambio de precio por ofertas (o None si no hay).
+
+    Se guarda en el cache junto a la versión del catálogo: se recalcula solo
+    cuando una oferta cambia (la versión sube) o cuando el instante guardado
+    ya pasó, así que consultarlo normalmente no toca la base de datos.
+    """
+    ahora = ahora or timezone.now()
+    version = version_catalogo()
+    guardado = cache.get(CLAVE_PROXIMO_CAMBIO)
+    if (guardado and guardado['version'] == version and guardado['calculado'] <= ahora
+            and (guardado['instante'] is None or ahora < guardado['instante'])):
+        return guardado['instante']
+
+    instante = _calcular_proximo_cambio(ahora)
+    duracion = int((instante - ahora).total_seconds()) + 1 if instante else None
+    cache.set(
+        CLAVE_PROXIMO_CAMBIO,
+        {'version': version, 'calculado': ahora, 'instante': instante},
+        timeout=duracion,
+    )
+    return instante
+
+
+def segundos_hasta_cambio_precio(maximo, ahora=None):
+    """TTL para un cache que depende de precios: `maximo`, acortado hasta el próximo cambio."""
+    ahora = ahora or timezone.now()
+    instante = next_price_change_at(ahora)
+    if instante:
+        maximo = min(maximo, int((instante - ahora).total_seconds()) + 1)
+    return max(maximo, 1)
+
+
+# ===== CACHE DE PÁGINAS DEL CATÁLOGO =====
+
+def duracion_pagina(ahora=None):
+    """
+    Segundos que puede reutilizarse una página del catálogo: PAGINAS_CATALOGO_TTL,
+    acortado hasta el próximo inicio/fin de oferta para que el precio
+    mostrado nunca quede desfasado.
+    """
+    return segundos_hasta_cambio_precio(settings.PAGINAS_CATALOGO_TTL, ahora)
+
+
+def _pagina_compartible(request):
+    """
+    Solo se cachean visitas anónimas: sin cookie de sesión (ni login ni
+    carrito en sesión), sin carrito en cookie y sin token. Se decide con los
+    encabezados, sin cargar la sesión ni consultar la base de datos.
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and settings.CARRITO_COOKIE_NOMBRE not in request.COOKIES
+        and 'HTTP_AUTHORIZATION' not in request.META
+    )
+
+
+def cache_pagina_catalogo(vista):
+    """
+    Cachea la respuesta HTML completa de una vista del catálogo para
+    visitantes anónimos. La clave incluye la ruta y version_catalogo(), por
+    lo que cualquier cambio de producto, categoría u oferta (señales o
+    invalidar_catalogo) la deja obsoleta; el inicio/fin de ofertas se cubre
+    con la duración de la entrada (duracion_pagina).
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not settings.PAGINAS_CATALOGO_CACHE or not _pagina_compartible(request):
+            return vista(request, *args, **kwargs)
+
+        ruta = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+        clave = f'pagina:{vista.__name__}:{version_catalogo()}:{ruta}'
+        guardada = cache.get(clave)
+        if guardada is not None:
+            contenido, tipo = guardada
+            response = HttpResponse(contenido, content_type=tipo)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = vista(request, *args, **kwargs)
+        # Si la vista usó la sesión o fijó cookies, la respuesta no es compartible
+        if (response.status_code == 200 and not response.streaming and not response.cookies
+                and not getattr(getattr(request, 'session', None), 'accessed', False)):
+            cache.set(clave, (response.content, response['Content-Type']), timeout=duracion_pagina())
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return envoltura
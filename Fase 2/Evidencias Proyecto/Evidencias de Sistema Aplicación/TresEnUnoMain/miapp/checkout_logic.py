@@ -0,0 +1,150 @@
+# miapp/checkout_logic.py
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from .catalogo_logic import invalidar_catalogo
+from .models import DetallePedido, Pedido, Producto, ReservaStock
+from .reserva_logic import con_stock_disponible
+
+
+class StockInsuficienteError(ValueError):
+    """
+    Uno o más productos del carrito no tienen stock suficiente.
+    `faltantes` lista cada línea con problema:
+    {'producto_id', 'nombre', 'solicitado', 'disponible'}.
+    """
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        detalle = ', '.join(
+            f"{faltante['nombre']} (disponible: {faltante['disponible']})" for faltante in faltantes
+        )
+        super().__init__(f'Stock insuficiente para: {detalle}')
+
+
+def resumir_items(items):
+    """
+    Resumen desnormalizado de las líneas de un pedido para el historial.
+    Retorna (cantidad_items, resumen_items), donde resumen_items es una lista
+    de {'producto_id', 'nombre', 'cantidad', 'precio', 'subtotal', 'imagen'}
+    con los montos como texto (JSON no tiene Decimal).
+
+    `items` son las líneas de calcular_carrito_completo.
+    """
+    resumen = [
+        {
+            'producto_id': item['producto_id'],
+            'nombre': item['nombre'],
+            'cantidad': item['cantidad'],
+            'precio': str(item['precio_unitario']),
+            'subtotal': str(item['precio_unitario'] * item['cantidad']),
+            'imagen': item['imagen'],
+        }
+        for item in items
+    ]
+    return sum(item['cantidad'] for item in items), resumen
+
+
+def actualizar_resumen_pedidos(pedidos_ids):
+    """
+    Recalcula cantidad_items y resumen_items desde los detalles guardados.
+    Se usa cuando los detalles cambian después del checkout (admin).
+    """
+    pedidos = list(Pedido.objects.filter(id__in=pedidos_ids).only('id').con_detalles())
+    for pedido in pedidos:
+        pedido.cantidad_items, pedido.resumen_items = resumir_items([
+            {
+                'producto_id': detalle.producto_id,
+                'nombre': detalle.producto.nombre,
+                'cantidad': detalle.cantidad,
+                'precio_unitario': detalle.precio_compra,
+                'imagen': detalle.producto.imagen,
+            }
+            for detalle in pedido.detalles.all()
+        ])
+    Pedido.objects.bulk_update(pedidos, ['cantidad_items', 'resumen_items'])
+
+
+def descontar_stock_pedido(pedido, items, titular=None):
+    """
+    Descuenta el stock y crea los detalles de un pedido en operaciones por
+    conjunto. Debe llamarse dentro de transaction.atomic().
+
+    1. Bloquea todos los productos en un solo SELECT ... FOR UPDATE ordenado
+       por id (orden fijo entre checkouts concurrentes, sin deadlocks).
+    2. Valida el stock de todas las líneas y reporta todas las faltantes juntas.
+    3. Descuenta con un único UPDATE condicional (CASE por producto, y solo
+       filas con stock >= cantidad).
+    4. Inserta los detalles con bulk_create.
+
+    `items` son las líneas de calcular_carrito_completo (producto_id,
+    nombre, cantidad, precio_unitario).
+
+    Con `titular` (modo de reservas del carrito) el stock disponible excluye
+    las reservas vigentes de otros carritos, y las del titular se convierten
+    en las líneas del pedido: se eliminan en la misma transacción.
+    """
+    cantidades = {}
+    for item in items:
+        cantidades[item['producto_id']] = cantidades.get(item['producto_id'], 0) + item['cantidad']
+
+    bloqueados = (
+        Producto.objects.select_for_update()
+        .filter(id__in=cantidades)
+        .only('id', 'nombre', 'stock_disponible')
+        .order_by('id')
+    )
+    if titular:
+        bloqueados = con_stock_disponible(bloqueados, titular=titular)
+    productos = {producto.id: producto for producto in bloqueados}
+
+    nombres = {item['producto_id']: item['nombre'] for item in items}
+    faltantes = []
+    for producto_id, cantidad in cantidades.items():
+        producto = productos.get(producto_id)
+        if producto is None:
+            disponible = 0
+        else:
+            disponible = producto.stock_libre if titular else producto.stock_disponible
+        if disponible < cantidad:
+            faltantes.append({
+                'producto_id': producto_id,
+                'nombre': producto.nombre if producto else nombres[producto_id],
+                'solicitado': cantidad,
+                'disponible': disponible,
+            })
+    if faltantes:
+        raise StockInsuficienteError(faltantes)
+
+    suficiente = Q()
+    for producto_id, cantidad in cantidades.items():
+        suficiente |= Q(id=producto_id, stock_disponible__gte=cantidad)
+
+    actualizados = Producto.objects.filter(suficiente).update(
+        stock_disponible=Case(
+            *[When(id=producto_id, then=F('stock_disponible') - cantidad)
+              for producto_id, cantidad in cantidades.items()],
+            default=F('stock_disponible'),
+        ),
+        fecha_modificacion=timezone.now(),
+    )
+    if actualizados != len(cantidades):
+        # No debería ocurrir con las filas bloqueadas; se revierte la transacción
+        raise ValueError('El stock cambió durante el checkout, intenta nuevamente')
+
+    detalles = DetallePedido.objects.bulk_create([
+        DetallePedido(
+            pedido=pedido,
+            producto_id=item['producto_id'],
+            cantidad=item['cantidad'],
+            precio_compra=item['precio_unitario'],
+        )
+        for item in items
+    ])
+
+    if titular:
+        ReservaStock.objects.filter(titular=titular).delete()
+
+    # update() no dispara las señales de Producto
+    invalidar_catalogo()
+    return detalles
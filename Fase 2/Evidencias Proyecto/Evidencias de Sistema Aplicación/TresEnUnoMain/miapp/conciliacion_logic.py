@@ -0,0 +1,182 @@
+# miapp/conciliacion_logic.py
+import csv
+import re
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from .models import Pedido
+from .pedido_logic import transicionar_pedidos
+
+
+# ===== CONCILIACIÓN DE TRANSFERENCIAS =====
+#
+# Cruza la cartola del banco (CSV) con los pedidos en 'pendiente_pago'.
+# Una fila concilia un pedido cuando su glosa contiene el número del pedido
+# y el monto abonado es igual al total. La cartola se recorre fila a fila
+# (memoria acotada sin importar su largo) contra un índice en memoria de
+# los pedidos pendientes armado con una sola consulta; los pedidos
+# conciliados se marcan como pagados en lotes con un UPDATE por lote.
+
+# Nombres de columna que usan los bancos para el monto y la glosa
+COLUMNAS_MONTO = ('monto', 'abono', 'abonos', 'monto abono', 'importe', 'amount')
+COLUMNAS_GLOSA = ('glosa', 'descripcion', 'descripción', 'detalle', 'comentario', 'memo', 'referencia')
+
+MOTIVOS = {
+    'sin_monto': 'Sin monto abonado',
+    'sin_pedido': 'La glosa no menciona un pedido pendiente',
+    'monto_distinto': 'El monto no coincide con el total del pedido',
+    'repetido': 'El pedido ya se concilió con otra fila',
+}
+
+NUMEROS = re.compile(r'\d+')
+
+
+class CartolaInvalidaError(ValueError):
+    """La cartola no es un CSV legible o no tiene las columnas de monto o glosa."""
+
+
+def leer_monto(texto):
+    """
+    Convierte montos como '12990', '$12.990', '12.990,00' o '12,990.00'
+    a Decimal. Retorna None si no es un número finito ('NaN', 'Infinity').
+    """
+    texto = (texto or '').strip().replace('$', '').replace(' ', '')
+    if ',' in texto and '.' in texto:
+        # El último separador es el decimal
+        if texto.rfind(',') > texto.rfind('.'):
+            texto = texto.replace('.', '').replace(',', '.')
+        else:
+            texto = texto.replace(',', '')
+    else:
+        separador = ',' if ',' in texto else '.'
+        entero, _, decimales = texto.rpartition(separador)
+        if entero and len(decimales) == 3:
+            texto = texto.replace(separador, '')  # separador de miles
+        else:
+            texto = texto.replace(',', '.')
+    try:
+        monto = Decimal(texto)
+    except InvalidOperation:
+        return None
+    return monto if monto.is_finite() else None
+
+
+def _columna(encabezados, pedida, candidatas):
+    normalizados = {encabezado.strip().lower(): encabezado for encabezado in encabezados if encabezado}
+    if pedida:
+        if pedida.strip().lower() in normalizados:
+            return normalizados[pedida.strip().lower()]
+        raise CartolaInvalidaError(f'La cartola no tiene la columna "{pedida}"')
+    for candidata in candidatas:
+        if candidata in normalizados:
+            return normalizados[candidata]
+    raise CartolaInvalidaError(
+        f"No se encontró una columna de {candidatas[0]} (se buscó: {', '.join(candidatas)})"
+    )
+
+
+def _lector(archivo, delimitador=None):
+    """csv.DictReader que detecta el delimitador (',', ';' o tabulador) si no se indica."""
+    if not delimitador:
+        muestra = archivo.read(4096)
+        archivo.seek(0)
+        try:
+            delimitador = csv.Sniffer().sniff(muestra, delimiters=',;\t').delimiter
+        except csv.Error:
+            delimitador = ','
+    return csv.DictReader(archivo, delimiter=delimitador)
+
+
+def _filas(lector):
+    """Recorre el lector convirtiendo los errores de formato del CSV en CartolaInvalidaError."""
+    try:
+        yield from lector
+    except csv.Error as error:
+        raise CartolaInvalidaError(f'La cartola no es un CSV válido (línea {lector.line_num}): {error}')
+
+
+def conciliar_transferencias(archivo, usuario=None, columna_monto=None, columna_glosa=None,
+                             delimitador=None, simular=False, reporte=None, lote=1000, muestra=100):
+    """
+    Concilia la cartola `archivo` (texto, con encabezados) y marca como
+    pagados los pedidos que calzan. Con `simular` solo informa.
+
+    `reporte` (opcional) es un archivo donde se escriben como CSV todas las
+    filas no conciliadas con su motivo; además se guardan las primeras
+    `muestra` en el resumen.
+
+    Retorna {'filas', 'conciliados', 'pagados', 'no_conciliadas',
+    'motivos': Counter, 'muestra': [...]}.
+    """
+    lector = _lector(archivo, delimitador)
+    try:
+        encabezados = lector.fieldnames or []
+    except csv.Error as error:
+        raise CartolaInvalidaError(f'La cartola no es un CSV válido: {error}')
+    monto_col = _columna(encabezados, columna_monto, COLUMNAS_MONTO)
+    glosa_col = _columna(encabezados, columna_glosa, COLUMNAS_GLOSA)
+
+    # Índice {id: total} de los pendientes, en una sola consulta
+    pendientes = dict(
+        Pedido.objects.filter(estado_pedido='pendiente_pago')
+        .order_by()
+        .values_list('id', 'total_pedido')
+        .iterator(chunk_size=5000)
+    )
+
+    escritor = None
+    if reporte is not None:
+        escritor = csv.writer(reporte)
+        escritor.writerow(['fila', 'motivo', glosa_col, monto_col])
+
+    resumen = {'filas': 0, 'conciliados': 0, 'pagados': 0, 'no_conciliadas': 0,
+               'motivos': Counter(), 'muestra': []}
+    conciliados = set()
+    por_marcar = []
+
+    def marcar():
+        if not simular and por_marcar:
+            conteo = transicionar_pedidos(
+                Pedido.objects.filter(id__in=por_marcar), 'pagado',
+                usuario=usuario, origen='conciliacion'
+            )
+            resumen['pagados'] += sum(conteo.values())
+        por_marcar.clear()
+
+    for numero_fila, fila in enumerate(_filas(lector), start=2):
+        resumen['filas'] += 1
+        glosa = fila.get(glosa_col) or ''
+        monto = leer_monto(fila.get(monto_col))
+
+        motivo = None
+        pedido_id = None
+        if monto is None or monto <= 0:
+            motivo = 'sin_monto'
+        else:
+            candidatos = [int(numero) for numero in NUMEROS.findall(glosa) if int(numero) in pendientes]
+            pedido_id = next((c for c in candidatos if pendientes[c] == monto), None)
+            if pedido_id is None:
+                motivo = 'monto_distinto' if candidatos else 'sin_pedido'
+            elif pedido_id in conciliados:
+                motivo = 'repetido'
+
+        if motivo:
+            resumen['no_conciliadas'] += 1
+            resumen['motivos'][motivo] += 1
+            if len(resumen['muestra']) < muestra:
+                resumen['muestra'].append({
+                    'fila': numero_fila, 'motivo': MOTIVOS[motivo],
+                    'glosa': glosa, 'monto': fila.get(monto_col),
+                })
+            if escritor:
+                escritor.writerow([numero_fila, MOTIVOS[motivo], glosa, fila.get(monto_col)])
+            continue
+
+        conciliados.add(pedido_id)
+        por_marcar.append(pedido_id)
+        resumen['conciliados'] += 1
+        if len(por_marcar) >= lote:
+            marcar()
+
+    marcar()
+    return resumen
@@ -0,0 +1,225 @@
+# miapp/correo_logic.py
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import CorreoPendiente
+
+logger = logging.getLogger(__name__)
+
+CORREO_ADMIN = 'ventas.tresenuno@gmail.com'
+
+
+# ===== CONTENIDO DE LOS CORREOS DEL PEDIDO =====
+
+def _correo_confirmacion(pedido, detalles):
+    """Correo al cliente con el resumen del pedido y los datos de transferencia."""
+    productos_html = "".join(
+        f"<li>{detalle.cantidad} x {detalle.producto.nombre} - ${detalle.precio_compra:,.0f}</li>"
+        for detalle in detalles
+    )
+
+    mensaje_html = f"""
+        <html>
+            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                <h2 style="color: #28a745;">¡Gracias por tu pedido!</h2>
+                
+                <div style="background: #f8f9fa; padding: 20px; border-radius: 5px; margin: 20px 0;">
+                    <h3>Pedido #{pedido.id}</h3>
+                    <p><strong>Total:</strong> ${pedido.total_pedido:,.0f}</p>
+                </div>
+                
+                <h3>Productos:</h3>
+                <ul>{productos_html}</ul>
+                
+                <div style="background: #fff3cd; padding: 20px; border-radius: 5px; margin: 20px 0; border-left: 4px solid #ffc107;">
+                    <h3 style="margin-top: 0;">💳 Datos para Transferencia</h3>
+                    <p><strong>Banco:</strong> Banco Estado</p>
+                    <p><strong>Tipo de Cuenta:</strong> Cuenta Vista</p>
+                    <p><strong>Número de Cuenta:</strong> 90272246717</p>
+                    <p><strong>RUT:</strong> 77.851.212-2</p>
+                    <p><strong>Titular:</strong> Tres en uno</p>
+                    <p><strong>Monto a transferir:</strong> ${pedido.total_pedido:,.0f}</p>
+                    <p style="color: #856404;"><strong>⚠️ Importante:</strong> Incluye el número de pedido #{pedido.id} en el mensaje de la transferencia.</p>
+                </div>
+                
+                <div style="background: #d4edda; padding: 20px; border-radius: 5px; margin: 20px 0;">
+                    <h3 style="margin-top: 0;">📦 Dirección de Envío</h3>
+                    <p>{pedido.direccion}</p>
+                    <p>{pedido.comuna}, {pedido.region}</p>
+                </div>
+                
+                <p>Si tienes alguna duda, contáctanos a: {CORREO_ADMIN}</p>
+            </body>
+        </html>
+        """
+
+    return CorreoPendiente(
+        tipo='confirmacion_pedido',
+        pedido=pedido,
+        destinatarios=[pedido.correo_cliente],
+        asunto=f"Pedido #{pedido.id} - Confirmación y Datos de Pago",
+        html=mensaje_html,
+    )
+
+
+def _correo_admin(pedido, detalles):
+    """Aviso en texto plano al administrador sobre el nuevo pedido."""
+    productos_texto = "\n".join(
+        f"- {d.cantidad} x {d.producto.nombre} - ${d.precio_compra:,.0f}" for d in detalles
+    )
+
+    mensaje = f"""
+        Nuevo pedido en Tres En Uno
+        
+        PEDIDO #{pedido.id}
+        Total: ${pedido.total_pedido:,.0f}
+        
+        CLIENTE:
+        Nombre: {pedido.nombre_cliente}
+        Email: {pedido.correo_cliente}
+        Teléfono: {pedido.telefono_cliente}
+        
+        DIRECCIÓN:
+        {pedido.direccion}
+        {pedido.comuna}, {pedido.region}
+        
+        PRODUCTOS:
+        {productos_texto}
+        """
+
+    return CorreoPendiente(
+        tipo='admin_nuevo_pedido',
+        pedido=pedido,
+        destinatarios=[CORREO_ADMIN],
+        asunto=f"🛒 Nuevo Pedido #{pedido.id} - {pedido.nombre_cliente}",
+        texto=mensaje,
+    )
+
+
+def encolar_correos_pedido(pedido):
+    """
+    Deja en la cola de salida los correos de un pedido nuevo (cliente y admin).
+    Debe llamarse dentro de la transacción del checkout: si ésta se revierte,
+    los correos tampoco existen. Lee los detalles una sola vez (con su producto).
+    """
+    detalles = list(pedido.detalles.select_related('producto'))
+    return CorreoPendiente.objects.bulk_create([
+        _correo_confirmacion(pedido, detalles),
+        _correo_admin(pedido, detalles),
+    ])
+
+
+# ===== REMITENTES =====
+
+class RemitenteResend:
+    """Envía los correos con la API HTTP de Resend."""
+
+    def enviar(self, correo):
+        import resend
+
+        resend.api_key = settings.EMAIL_HOST_PASSWORD  # API key de Resend
+        params = {
+            "from": f"Tres en Uno <{settings.DEFAULT_FROM_EMAIL}>",
+            "to": correo.destinatarios,
+            "subject": correo.asunto,
+        }
+        if correo.html:
+            params["html"] = correo.html
+        if correo.texto:
+            params["text"] = correo.texto
+        resend.Emails.send(params)
+
+
+class RemitenteMemoria:
+    """
+    Remitente local para desarrollo y tests: guarda los correos en una lista
+    en lugar de enviarlos. Con `fallar=True` simula un error de la API.
+    """
+    enviados = []
+    fallar = False
+
+    def enviar(self, correo):
+        if self.fallar:
+            raise ConnectionError('Fallo simulado del servicio de correo')
+        type(self).enviados.append({
+            'destinatarios': list(correo.destinatarios),
+            'asunto': correo.asunto,
+        })
+
+
+def obtener_remitente():
+    """Instancia del remitente configurado en settings.CORREO_REMITENTE."""
+    return import_string(settings.CORREO_REMITENTE)()
+
+
+# ===== PROCESAMIENTO DE LA COLA =====
+
+def espera_reintento(intentos):
+    """Backoff exponencial: base, 2*base, 4*base... con un máximo."""
+    segundos = settings.OUTBOX_REINTENTO_BASE * (2 ** max(intentos - 1, 0))
+    return timedelta(seconds=min(segundos, settings.OUTBOX_REINTENTO_MAXIMO))
+
+
+def procesar_outbox(lote=None, remitente=None):
+    """
+    Envía un lote de correos pendientes cuyo próximo intento ya llegó.
+
+    1. En una transacción corta toma las filas con SELECT ... FOR UPDATE
+       SKIP LOCKED y las reserva corriendo su próximo intento en
+       OUTBOX_RESERVA segundos; al confirmar se liberan los bloqueos.
+    2. Envía cada correo fuera de la transacción y guarda su resultado con
+       un UPDATE propio. Un envío lento no mantiene filas bloqueadas, y
+       otros workers no toman los correos reservados. Si el worker muere a
+       mitad del lote, los correos sin resultado vuelven a la cola al
+       vencer la reserva.
+
+    Un error deja el correo pendiente con backoff exponencial hasta
+    OUTBOX_MAX_INTENTOS; después queda como fallido.
+
+    Retorna {'enviados': n, 'reintentos': n, 'fallidos': n}.
+    """
+    lote = lote or settings.OUTBOX_LOTE
+    remitente = remitente or obtener_remitente()
+    resultado = {'enviados': 0, 'reintentos': 0, 'fallidos': 0}
+
+    with transaction.atomic():
+        ahora = timezone.now()
+        correos = list(
+            CorreoPendiente.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado='pendiente', proximo_intento__lte=ahora)
+            .order_by('proximo_intento')[:lote]
+        )
+        CorreoPendiente.objects.filter(id__in=[correo.id for correo in correos]).update(
+            proximo_intento=ahora + timedelta(seconds=settings.OUTBOX_RESERVA)
+        )
+
+    for correo in correos:
+        correo.intentos += 1
+        try:
+            remitente.enviar(correo)
+        except Exception as e:
+            correo.ultimo_error = str(e)[:1000]
+            if correo.intentos >= settings.OUTBOX_MAX_INTENTOS:
+                correo.estado = 'fallido'
+                resultado['fallidos'] += 1
+                logger.error(f"Correo #{correo.id} descartado tras {correo.intentos} intentos: {e}")
+            else:
+                correo.proximo_intento = ahora + espera_reintento(correo.intentos)
+                resultado['reintentos'] += 1
+                logger.warning(f"Error al enviar correo #{correo.id} (intento {correo.intentos}): {e}")
+        else:
+            correo.estado = 'enviado'
+            correo.fecha_envio = timezone.now()
+            correo.ultimo_error = ''
+            resultado['enviados'] += 1
+            logger.info(f"Correo #{correo.id} enviado ({correo.tipo})")
+
+        correo.save(update_fields=['estado', 'intentos', 'proximo_intento', 'ultimo_error', 'fecha_envio'])
+
+    return resultado
@@ -0,0 +1,391 @@
+# miapp/dashboard_logic.py
+import threading
+import time as reloj
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Cliente, DetallePedido, Pedido, Producto, VentaDiaria, VentaDiariaProducto
+
+# Estados que cuentan como venta concretada
+ESTADOS_VENTA = ['pagado', 'preparando', 'enviado', 'completado']
+
+ESTADOS_COLORES = {
+    'pendiente_pago': '#ffc107',
+    'pagado': '#28a745',
+    'preparando': '#17a2b8',
+    'enviado': '#007bff',
+    'completado': '#6c757d',
+    'cancelado': '#dc3545',
+}
+
+# Datos que el dashboard puede refrescar sin recargar la página
+CLAVES_GRAFICOS = (
+    'ventas_labels', 'ventas_data', 'estados_labels', 'estados_data',
+    'estados_background', 'categorias_labels', 'categorias_data',
+)
+CLAVES_INDICADORES = (
+    'ventas_mes', 'pedidos_mes', 'pedidos_pendientes', 'total_productos',
+    'total_clientes', 'ventas_esta_semana', 'cambio_porcentaje',
+)
+
+# Rangos del gráfico seleccionables con ?dias=
+DIAS_PERMITIDOS = (7, 30, 90, 365)
+DIAS_POR_DEFECTO = 30
+
+
+def dias_desde_parametro(valor):
+    """Convierte el parámetro ?dias= en uno de los rangos permitidos."""
+    try:
+        dias = int(valor)
+    except (TypeError, ValueError):
+        return DIAS_POR_DEFECTO
+    return dias if dias in DIAS_PERMITIDOS else DIAS_POR_DEFECTO
+
+
+def _bucket_vacio():
+    return {'total': Decimal('0'), 'pedidos': 0, 'estados': {}}
+
+
+# ===== FUENTES DE LOS BUCKETS DIARIOS =====
+# Ambas retornan {fecha: {'total': ventas, 'pedidos': n, 'estados': {estado: n}}}
+
+def buckets_desde_pedidos(desde, hasta):
+    """
+    Agrega los pedidos por día (America/Santiago) en una sola consulta:
+    un GROUP BY TruncDate con agregaciones condicionales para el total
+    vendido y la cantidad de pedidos de cada estado.
+    """
+    zona = timezone.get_default_timezone()
+    inicio = timezone.make_aware(datetime.combine(desde, time.min), zona)
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min), zona)
+
+    por_estado = {
+        f'estado_{codigo}': Count('id', filter=Q(estado_pedido=codigo))
+        for codigo, _ in Pedido.ESTADOS
+    }
+    filas = (
+        Pedido.objects
+        .filter(fecha_pedido__gte=inicio, fecha_pedido__lt=fin)
+        .annotate(dia=TruncDate('fecha_pedido', tzinfo=zona))
+        .values('dia')
+        .annotate(
+            total=Sum('total_pedido', filter=Q(estado_pedido__in=ESTADOS_VENTA)),
+            pedidos=Count('id'),
+            **por_estado
+        )
+        .order_by()
+    )
+
+    buckets = {}
+    for fila in filas:
+        buckets[fila['dia']] = {
+            'total': fila['total'] or Decimal('0'),
+            'pedidos': fila['pedidos'],
+            'estados': {
+                codigo: fila[f'estado_{codigo}']
+                for codigo, _ in Pedido.ESTADOS
+                if fila[f'estado_{codigo}']
+            },
+        }
+    return buckets
+
+
+def buckets_desde_rollups(desde, hasta):
+    """Lee los mismos buckets desde VentaDiaria (una fila por día y estado)."""
+    buckets = {}
+    filas = (
+        VentaDiaria.objects
+        .filter(fecha__gte=desde, fecha__lte=hasta)
+        .values_list('fecha', 'estado_pedido', 'pedidos', 'total')
+    )
+    for fecha, estado, pedidos, total in filas:
+        bucket = buckets.setdefault(fecha, _bucket_vacio())
+        bucket['pedidos'] += pedidos
+        bucket['estados'][estado] = pedidos
+        if estado in ESTADOS_VENTA:
+            bucket['total'] += total
+    return buckets
+
+
+# ===== PRODUCTOS Y CATEGORÍAS MÁS VENDIDOS =====
+
+# Ambas retornan filas {'nombre', 'total_vendido'}; agrupar es 'producto' o 'categoria'
+
+def top_desde_pedidos(agrupar, desde, hasta, limite=5):
+    """Unidades vendidas en el rango por producto o categoría (desde DetallePedido)."""
+    campo = 'producto__nombre' if agrupar == 'producto' else 'producto__categoria__nombre'
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    return (
+        DetallePedido.objects
+        .filter(
+            pedido__estado_pedido__in=ESTADOS_VENTA,
+            pedido__fecha_pedido__gte=inicio,
+            pedido__fecha_pedido__lt=fin,
+        )
+        .values(nombre=F(campo))
+        .annotate(total_vendido=Sum('cantidad'))
+        .order_by('-total_vendido')[:limite]
+    )
+
+
+def top_desde_rollups(agrupar, desde, hasta, limite=5):
+    """Unidades vendidas en el rango por producto o categoría (desde los rollups)."""
+    campo = 'producto__nombre' if agrupar == 'producto' else 'categoria__nombre'
+    return (
+        VentaDiariaProducto.objects
+        .filter(fecha__gte=desde, fecha__lte=hasta, estado_pedido__in=ESTADOS_VENTA)
+        .values(nombre=F(campo))
+        .annotate(total_vendido=Sum('unidades'))
+        .order_by('-total_vendido')[:limite]
+    )
+
+
+FUENTES = {
+    'rollups': (buckets_desde_rollups, top_desde_rollups),
+    'pedidos': (buckets_desde_pedidos, top_desde_pedidos),
+}
+
+
+def metricas_dashboard(dias=DIAS_POR_DEFECTO, hoy=None, fuente=None):
+    """
+    Calcula las métricas del dashboard de ventas para los últimos `dias`.
+
+    Los buckets diarios se leen en una sola consulta que cubre el gráfico,
+    el mes en curso y las dos últimas semanas; los días sin pedidos se
+    rellenan con cero en Python. La fuente ('rollups' o 'pedidos') se toma
+    de settings.DASHBOARD_FUENTE si no se indica. Las semanas se cuentan por
+    días completos: los últimos 7 días (incluido hoy) contra los 7 anteriores.
+    """
+    fuente = fuente or getattr(settings, 'DASHBOARD_FUENTE', 'rollups')
+    leer_buckets, leer_top = FUENTES[fuente]
+
+    hoy = hoy or timezone.localdate()
+    inicio_mes = hoy.replace(day=1)
+    inicio_grafico = hoy - timedelta(days=dias - 1)
+
+    buckets = leer_buckets(min(inicio_mes, inicio_grafico, hoy - timedelta(days=13)), hoy)
+
+    def total_entre(desde, hasta):
+        return sum(
+            (bucket['total'] for fecha, bucket in buckets.items() if desde <= fecha <= hasta),
+            Decimal('0')
+        )
+
+    ventas_mes = total_entre(inicio_mes, hoy)
+    pedidos_mes = sum(bucket['pedidos'] for fecha, bucket in buckets.items() if fecha >= inicio_mes)
+
+    # Serie del gráfico con los días vacíos en cero
+    labels_dias = []
+    ventas_por_dia = []
+    estados = {}
+    for i in range(dias - 1, -1, -1):
+        fecha = hoy - timedelta(days=i)
+        bucket = buckets.get(fecha) or _bucket_vacio()
+        labels_dias.append(fecha.strftime('%d/%m'))
+        ventas_por_dia.append(float(bucket['total']))
+        for estado, cantidad in bucket['estados'].items():
+            estados[estado] = estados.get(estado, 0) + cantidad
+    estados = dict(sorted(estados.items(), key=lambda item: -item[1]))
+
+    ventas_esta_semana = total_entre(hoy - timedelta(days=6), hoy)
+    ventas_semana_anterior = total_entre(hoy - timedelta(days=13), hoy - timedelta(days=7))
+    if ventas_semana_anterior > 0:
+        cambio_porcentaje = ((ventas_esta_semana - ventas_semana_anterior) / ventas_semana_anterior) * 100
+    else:
+        cambio_porcentaje = 100 if ventas_esta_semana > 0 else 0
+
+    nombres_estados = dict(Pedido.ESTADOS)
+    ventas_por_categoria = leer_top('categoria', inicio_grafico, hoy)
+
+    return {
+        'dias': dias,
+        'dias_permitidos': DIAS_PERMITIDOS,
+        'ventas_mes': ventas_mes,
+        'pedidos_mes': pedidos_mes,
+        'pedidos_pendientes': Pedido.objects.filter(estado_pedido='pendiente_pago').count(),
+        'total_productos': Producto.objects.filter(activo=True).count(),
+        'total_clientes': Cliente.objects.filter(is_active=True).count(),
+        'ventas_esta_semana': ventas_esta_semana,
+        'cambio_porcentaje': round(cambio_porcentaje, 1),
+        'ventas_labels': labels_dias,
+        'ventas_data': ventas_por_dia,
+        'estados_labels': [nombres_estados.get(estado, estado) for estado in estados],
+        'estados_data': list(estados.values()),
+        'estados_background': [ESTADOS_COLORES.get(estado, '#6c757d') for estado in estados],
+        'categorias_labels': [fila['nombre'] or 'Sin categoría' for fila in ventas_por_categoria],
+        'categorias_data': [fila['total_vendido'] for fila in ventas_por_categoria],
+        'productos_vendidos': list(leer_top('producto', inicio_grafico, hoy)),
+        'ultimos_pedidos': list(Pedido.objects.order_by('-fecha_pedido')[:10]),
+    }
+
+
+# ===== CACHE DEL DASHBOARD (STALE-WHILE-REVALIDATE) =====
+
+ESTADISTICAS_CACHE = ('aciertos', 'obsoletos', 'fallos', 'recalculos')
+
+
+def _clave_dashboard(fuente, dias):
+    return f'dashboard:{fuente}:{dias}'
+
+
+def _registrar(evento, cantidad=1):
+    """Incrementa un contador de monitoreo del cache del dashboard."""
+    clave = f'dashboard:estadisticas:{evento}'
+    try:
+        cache.incr(clave, cantidad)
+    except ValueError:
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave, cantidad)
+
+
+def _calcular(fuente, dias):
+    """Calcula las métricas y las envuelve en una entrada de cache (sin guardarla)."""
+    inicio = reloj.perf_counter()
+    datos = metricas_dashboard(dias=dias, fuente=fuente)
+    return {
+        'datos': datos,
+        'version': reloj.time_ns() // 1_000_000,
+        'calculado_en': reloj.time(),
+        'duracion_ms': round((reloj.perf_counter() - inicio) * 1000),
+    }
+
+
+def _recalcular(fuente, dias):
+    """Calcula las métricas, las guarda en cache y libera el candado de recálculo."""
+    clave = _clave_dashboard(fuente, dias)
+    try:
+        entrada = _calcular(fuente, dias)
+        datos, duracion_ms = entrada['datos'], entrada['duracion_ms']
+        vigencia = settings.DASHBOARD_CACHE_TTL + settings.DASHBOARD_CACHE_OBSOLETO
+        cache.set(clave, entrada, timeout=vigencia)
+        # Copia de los datos del gráfico de esta versión, para calcular deltas
+        cache.set(f"{clave}:v{entrada['version']}", datos_refrescables(datos), timeout=vigencia)
+
+        _registrar('recalculos')
+        _registrar('recalculo_ms_total', duracion_ms)
+        cache.set('dashboard:estadisticas:ultimo_recalculo_ms', duracion_ms, timeout=None)
+        return entrada
+    finally:
+        cache.delete(f'{clave}:recalculando')
+
+
+def _recalcular_en_segundo_plano(fuente, dias):
+    try:
+        _recalcular(fuente, dias)
+    finally:
+        # El hilo abrió sus propias conexiones a la base de datos
+        connections.close_all()
+
+
+def _esperar_entrada(clave):
+    """Espera (hasta DASHBOARD_CACHE_ESPERA segundos) a que otro proceso guarde la entrada."""
+    limite = reloj.monotonic() + settings.DASHBOARD_CACHE_ESPERA
+    while reloj.monotonic() < limite:
+        reloj.sleep(0.1)
+        entrada = cache.get(clave)
+        if entrada is not None:
+            return entrada
+    return None
+
+
+def obtener_dashboard(dias=DIAS_POR_DEFECTO, fuente=None):
+    """
+    Retorna {'datos', 'version', 'calculado_en', 'duracion_ms'} desde el cache.
+
+    - Vigente (menos de DASHBOARD_CACHE_TTL segundos): se sirve tal cual.
+    - Obsoleto: se sirve el valor anterior y solo el proceso que obtiene el
+      candado (cache.add) lo recalcula, en un hilo si
+      DASHBOARD_REFRESCO_ASINCRONO está activo.
+    - Sin valor (deploy, expiración): lo calcula en la misma petición solo
+      quien obtiene el candado; las demás esperan a que aparezca en cache
+      hasta DASHBOARD_CACHE_ESPERA segundos, y si no aparece lo calculan sin
+      guardarlo.
+    """
+    fuente = fuente or getattr(settings, 'DASHBOARD_FUENTE', 'rollups')
+    clave = _clave_dashboard(fuente, dias)
+    entrada = cache.get(clave)
+
+    if entrada is None:
+        _registrar('fallos')
+        if cache.add(f'{clave}:recalculando', 1, timeout=settings.DASHBOARD_CACHE_TTL):
+            return _recalcular(fuente, dias)
+        entrada = _esperar_entrada(clave)
+        if entrada is None:
+            return _calcular(fuente, dias)
+        return entrada
+
+    if reloj.time() - entrada['calculado_en'] <= settings.DASHBOARD_CACHE_TTL:
+        _registrar('aciertos')
+        return entrada
+
+    _registrar('obsoletos')
+    if cache.add(f'{clave}:recalculando', 1, timeout=settings.DASHBOARD_CACHE_TTL):
+        if settings.DASHBOARD_REFRESCO_ASINCRONO:
+            threading.Thread(
+                target=_recalcular_en_segundo_plano, args=(fuente, dias), daemon=True
+            ).start()
+        else:
+            return _recalcular(fuente, dias)
+    return entrada
+
+
+def datos_refrescables(datos):
+    """Gráficos e indicadores en tipos serializables a JSON."""
+    refrescables = {clave: datos[clave] for clave in CLAVES_GRAFICOS}
+    for clave in CLAVES_INDICADORES:
+        valor = datos[clave]
+        refrescables[clave] = float(valor) if isinstance(valor, Decimal) else valor
+    return refrescables
+
+
+def cambios_dashboard(dias=DIAS_POR_DEFECTO, version_cliente=None, fuente=None):
+    """
+    Retorna los datos del dashboard que cambiaron desde la versión que tiene
+    el navegador: {'version', 'completo', 'cambios'}. Si esa versión ya no
+    está en cache se envían todos los datos (completo=True).
+    """
+    fuente = fuente or getattr(settings, 'DASHBOARD_FUENTE', 'rollups')
+    entrada = obtener_dashboard(dias=dias, fuente=fuente)
+    actuales = datos_refrescables(entrada['datos'])
+
+    if version_cliente == entrada['version']:
+        return {'version': entrada['version'], 'completo': False, 'cambios': {}}
+
+    anteriores = None
+    if version_cliente is not None:
+        anteriores = cache.get(f'{_clave_dashboard(fuente, dias)}:v{version_cliente}')
+
+    if anteriores is None:
+        return {'version': entrada['version'], 'completo': True, 'cambios': actuales}
+
+    return {
+        'version': entrada['version'],
+        'completo': False,
+        'cambios': {clave: valor for clave, valor in actuales.items() if anteriores.get(clave) != valor},
+    }
+
+
+def estadisticas_cache_dashboard():
+    """Contadores del cache del dashboard para monitoreo (tasa de aciertos y tiempo de recálculo)."""
+    valores = cache.get_many([f'dashboard:estadisticas:{evento}' for evento in ESTADISTICAS_CACHE])
+    contadores = {evento: valores.get(f'dashboard:estadisticas:{evento}', 0) for evento in ESTADISTICAS_CACHE}
+    peticiones = contadores['aciertos'] + contadores['obsoletos'] + contadores['fallos']
+    recalculos = contadores['recalculos']
+    total_ms = cache.get('dashboard:estadisticas:recalculo_ms_total', 0)
+
+    return {
+        **contadores,
+        'peticiones': peticiones,
+        # Las respuestas obsoletas también se sirven desde el cache
+        'tasa_aciertos': round((contadores['aciertos'] + contadores['obsoletos']) / peticiones, 4) if peticiones else None,
+        'ultimo_recalculo_ms': cache.get('dashboard:estadisticas:ultimo_recalculo_ms'),
+        'promedio_recalculo_ms': round(total_ms / recalculos, 1) if recalculos else None,
+    }
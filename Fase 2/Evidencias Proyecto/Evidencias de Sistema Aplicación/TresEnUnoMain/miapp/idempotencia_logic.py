@@ -0,0 +1,91 @@
+# miapp/idempotencia_logic.py
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import ClaveIdempotencia
+from .reserva_logic import titular_de
+
+
+def titular_clave(request):
+    """
+    Dueño de las claves de idempotencia de la solicitud. Para un cliente
+    identificado es su id, así un doble envío desde dos pestañas o
+    dispositivos (sesiones distintas) se reconoce como el mismo. Un
+    invitado solo tiene su sesión: si la pierde (cookies borradas, otro
+    navegador) la misma clave se trata como una solicitud nueva.
+    """
+    cliente_id = request.session.get('cliente_id')
+    if cliente_id:
+        return f'cliente:{cliente_id}'
+    if request.user.is_authenticated:
+        return f'usuario:{request.user.pk}'
+    return titular_de(request)
+
+
+def huella_solicitud(datos):
+    """SHA-256 del cuerpo de la solicitud, para detectar una clave reutilizada con otros datos."""
+    return hashlib.sha256(json.dumps(datos, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def reclamar_clave(titular, clave, huella):
+    """
+    Registra la clave como 'en_proceso' en su propia transacción (visible de
+    inmediato para solicitudes concurrentes). Una clave 'en_proceso' más
+    antigua que CHECKOUT_IDEMPOTENCIA_ABANDONO se considera abandonada (el
+    proceso murió y su transacción se revirtió) y se vuelve a reclamar.
+    Retorna (registro, nueva):
+    `nueva` es False si la clave ya existía, y entonces `registro` es el
+    existente (en proceso o con la respuesta guardada).
+    """
+    ahora = timezone.now()
+    ClaveIdempotencia.objects.filter(titular=titular, clave=clave).filter(
+        Q(expira__lte=ahora) | Q(
+            estado='en_proceso',
+            fecha_creacion__lte=ahora - timedelta(seconds=settings.CHECKOUT_IDEMPOTENCIA_ABANDONO),
+        )
+    ).delete()
+
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return ClaveIdempotencia.objects.create(
+                    titular=titular,
+                    clave=clave,
+                    huella=huella,
+                    expira=ahora + timedelta(seconds=settings.CHECKOUT_IDEMPOTENCIA_TTL),
+                ), True
+        except IntegrityError:
+            existente = ClaveIdempotencia.objects.filter(titular=titular, clave=clave).first()
+            if existente is not None:
+                return existente, False
+            # La otra solicitud falló y liberó la clave entre medio: se reintenta
+    raise IntegrityError(f'No se pudo reclamar la clave de idempotencia {clave}')
+
+
+def completar_clave(registro, pedido, codigo_estado, datos):
+    """
+    Guarda la respuesta final (llamar dentro de la transacción del pedido,
+    así la clave completada y el pedido se confirman juntos).
+    """
+    registro.pedido = pedido
+    registro.codigo_estado = codigo_estado
+    registro.respuesta = json.loads(JSONRenderer().render(datos))
+    registro.estado = 'completado'
+    registro.save(update_fields=['pedido', 'codigo_estado', 'respuesta', 'estado'])
+
+
+def liberar_clave(registro):
+    """Elimina la clave de una solicitud fallida para que pueda reintentarse."""
+    ClaveIdempotencia.objects.filter(pk=registro.pk, estado='en_proceso').delete()
+
+
+def limpiar_claves_vencidas(ahora=None):
+    """Elimina las claves vencidas. Retorna la cantidad eliminada."""
+    return ClaveIdempotencia.objects.filter(expira__lte=ahora or timezone.now()).delete()[0]
@@ -0,0 +1,110 @@
+import json
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from miapp.almacen_carrito_logic import ALMACENES
+from miapp.models import Categoria, Producto
+
+
+DATOS_CHECKOUT = {
+    'nombre_cliente': 'Benchmark', 'correo_cliente': 'benchmark@test.com',
+    'telefono_cliente': '912345678', 'direccion': 'Calle 1',
+    'region': 'RM', 'comuna': 'Santiago',
+}
+
+
+class _Rollback(Exception):
+    """Se usa para deshacer los datos de prueba al terminar el benchmark."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara los almacenes del carrito (CARRITO_BACKEND) con un flujo '
+        'navegar -> agregar -> ver carrito -> checkout, midiendo requests por segundo '
+        'y escrituras a django_session. Los datos se descartan al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--almacenes', nargs='+', default=list(ALMACENES),
+            help=f"Almacenes a medir (por defecto: {' '.join(ALMACENES)})"
+        )
+        parser.add_argument('--flujos', type=int, default=20, help='Flujos completos por almacén')
+        parser.add_argument('--productos', type=int, default=5, help='Productos agregados por flujo')
+
+    def handle(self, *args, **options):
+        desconocidos = set(options['almacenes']) - set(ALMACENES)
+        if desconocidos:
+            raise CommandError(f"Almacenes desconocidos: {', '.join(sorted(desconocidos))}")
+
+        # El checkout registra cada paso en INFO; se silencia durante la medición
+        logging.disable(logging.INFO)
+        try:
+            with transaction.atomic():
+                ids = self._crear_datos(options['productos'])
+                self.stdout.write(f"{'almacén':>8} {'requests':>9} {'req/s':>9} {'consultas':>10} {'sesión':>8}")
+                for nombre in options['almacenes']:
+                    self._medir(nombre, ids, max(1, options['flujos']))
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            logging.disable(logging.NOTSET)
+
+    def _medir(self, nombre, ids, flujos):
+        requests = 0
+        with override_settings(CARRITO_BACKEND=nombre, ALLOWED_HOSTS=['*']), \
+                CaptureQueriesContext(connection) as contexto:
+            inicio = time.perf_counter()
+            for _ in range(flujos):
+                requests += self._flujo(Client(), ids)
+            segundos = time.perf_counter() - inicio
+
+        consultas = contexto.captured_queries
+        sesion = sum(
+            1 for consulta in consultas
+            if 'django_session' in consulta['sql'] and not consulta['sql'].lstrip().upper().startswith('SELECT')
+        )
+        self.stdout.write(
+            f'{nombre:>8} {requests:>9} {requests / segundos:>9.1f} {len(consultas):>10} {sesion:>8}'
+        )
+
+    def _flujo(self, cliente, ids):
+        """Un cliente recorre el catálogo, agrega productos, revisa el carrito y compra."""
+        respuestas = [cliente.get('/api/public/products/')]
+        for producto_id in ids:
+            respuestas.append(cliente.post(
+                '/api/cart/', data=json.dumps({'producto_id': producto_id, 'cantidad': 1}),
+                content_type='application/json'
+            ))
+            respuestas.append(cliente.get('/api/cart/summary/'))
+        respuestas.append(cliente.get('/api/cart/'))
+        respuestas.append(cliente.post(
+            '/api/checkout/', data=json.dumps(DATOS_CHECKOUT), content_type='application/json'
+        ))
+
+        fallidas = [r.status_code for r in respuestas if r.status_code >= 400]
+        if fallidas:
+            raise CommandError(f'El flujo falló con estados {fallidas}')
+        return len(respuestas)
+
+    def _crear_datos(self, cantidad):
+        """Crea productos de prueba con stock de sobra y retorna sus IDs."""
+        categoria = Categoria.objects.create(nombre=f'Benchmark {timezone.now().timestamp()}')
+        productos = Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Producto benchmark {i}',
+                descripcion='Producto temporal para benchmark',
+                precio_unitario=1000 + i,
+                stock_disponible=1_000_000,
+                categoria=categoria,
+            )
+            for i in range(cantidad)
+        ])
+        return [producto.id for producto in productos]
@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from miapp.autocompletado_logic import IndicePrefijos, version_nombres
+
+
+PALABRAS = [
+    'tomate', 'cherry', 'lechuga', 'escarola', 'plátano', 'manzana', 'roja', 'verde',
+    'palta', 'hass', 'cebolla', 'morada', 'zapallo', 'camote', 'apio', 'acelga',
+    'brócoli', 'coliflor', 'pimentón', 'ají', 'cilantro', 'perejil', 'orgánico',
+    'limón', 'naranja', 'frutilla', 'arándano', 'frambuesa', 'pera', 'durazno',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia de las sugerencias de autocompletado (p50, p99 y máximo) '
+        'sobre un índice con nombres sintéticos. No consulta la base de datos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nombres', type=int, default=50_000, help='Nombres en el índice')
+        parser.add_argument('--consultas', type=int, default=20_000, help='Búsquedas a medir')
+        parser.add_argument('--semilla', type=int, default=1, help='Semilla de los datos sintéticos')
+
+    def handle(self, *args, **options):
+        azar = random.Random(options['semilla'])
+        nombres = [
+            ' '.join(azar.sample(PALABRAS, azar.randint(1, 3))) + f' {numero}'
+            for numero in range(options['nombres'])
+        ]
+
+        indice = IndicePrefijos()
+        inicio = time.perf_counter()
+        indice.cargar([('producto', numero, nombre) for numero, nombre in enumerate(nombres)], version_nombres())
+        self.stdout.write(f"Índice de {len(nombres)} nombres construido en {time.perf_counter() - inicio:.2f} s")
+
+        # Prefijos de 1 a 6 letras de nombres reales, como al escribir
+        prefijos = []
+        for _ in range(options['consultas']):
+            palabra = azar.choice(azar.choice(nombres).split())
+            prefijos.append(palabra[:azar.randint(1, 6)])
+
+        tiempos = []
+        for prefijo in prefijos:
+            inicio = time.perf_counter()
+            indice.buscar(prefijo)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+
+        p50 = tiempos[len(tiempos) // 2]
+        p99 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.99))]
+        self.stdout.write(f'{len(tiempos)} búsquedas: p50 {p50:.3f} ms, p99 {p99:.3f} ms, máximo {tiempos[-1]:.3f} ms')
+        if p99 < 2:
+            self.stdout.write(self.style.SUCCESS('p99 bajo 2 ms'))
+        else:
+            self.stdout.write(self.style.WARNING('p99 sobre 2 ms'))
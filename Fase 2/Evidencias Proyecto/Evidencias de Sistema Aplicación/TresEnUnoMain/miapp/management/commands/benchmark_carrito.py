@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from datetime import timedelta
+
+from miapp.carrito_logic import calcular_carrito_completo
+from miapp.models import Categoria, Producto, Oferta
+
+
+class _Rollback(Exception):
+    """Se usa para deshacer los datos de prueba al terminar el benchmark."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide consultas SQL y latencia de calcular_carrito_completo para carritos '
+        'de distinto tamaño. Los datos de prueba se crean y se descartan en una transacción.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanos', nargs='+', type=int, default=[1, 10, 50, 100, 200],
+            help='Cantidades de líneas de carrito a medir (por defecto: 1 10 50 100 200)'
+        )
+        parser.add_argument(
+            '--repeticiones', type=int, default=20,
+            help='Repeticiones por tamaño para promediar la latencia'
+        )
+
+    def handle(self, *args, **options):
+        tamanos = sorted(options['tamanos'])
+        repeticiones = max(1, options['repeticiones'])
+
+        try:
+            with transaction.atomic():
+                ids = self._crear_datos(max(tamanos))
+                self.stdout.write(f"{'líneas':>8} {'consultas':>10} {'ms/carrito':>12}")
+
+                for tamano in tamanos:
+                    carrito = {'items': {str(producto_id): 1 for producto_id in ids[:tamano]}}
+
+                    with CaptureQueriesContext(connection) as contexto:
+                        calcular_carrito_completo(carrito)
+                    consultas = len(contexto.captured_queries)
+
+                    inicio = time.perf_counter()
+                    for _ in range(repeticiones):
+                        calcular_carrito_completo(carrito)
+                    ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+
+                    self.stdout.write(f'{tamano:>8} {consultas:>10} {ms:>12.2f}')
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _crear_datos(self, cantidad):
+        """Crea productos de prueba (la mitad con oferta vigente) y retorna sus IDs."""
+        categoria = Categoria.objects.create(nombre=f'Benchmark {timezone.now().timestamp()}')
+        productos = Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Producto benchmark {i}',
+                descripcion='Producto temporal para benchmark',
+                precio_unitario=1000 + i,
+                stock_disponible=100,
+                categoria=categoria,
+            )
+            for i in range(cantidad)
+        ])
+
+        now = timezone.now()
+        Oferta.objects.bulk_create([
+            Oferta(
+                producto=producto,
+                precio_oferta=500,
+                fecha_inicio=now - timedelta(days=1),
+                fecha_fin=now + timedelta(days=1),
+            )
+            for producto in productos[::2]
+        ])
+        return [producto.id for producto in productos]
@@ -0,0 +1,129 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+
+from miapp.models import Categoria, Producto
+
+
+def _reservar_con_f(producto_id, cantidad):
+    """Estrategia actual: UPDATE condicional con F() (sin bloqueo previo)."""
+    return not Producto.objects.reservar({producto_id: cantidad})
+
+
+def _reservar_leyendo(producto_id, cantidad):
+    """Estrategia anterior: leer, restar en Python y guardar (pierde actualizaciones)."""
+    producto = Producto.objects.get(pk=producto_id)
+    if producto.stock_disponible < cantidad:
+        return False
+    producto.stock_disponible -= cantidad
+    producto.save(update_fields=['stock_disponible'])
+    return True
+
+
+ESTRATEGIAS = {
+    'f': _reservar_con_f,
+    'lectura': _reservar_leyendo,
+}
+
+
+def _trabajador(estrategia, producto_id, operaciones, cola):
+    """Proceso hijo: intenta `operaciones` reservas de 1 unidad y reporta el resultado."""
+    connections.close_all()  # cada proceso abre su propia conexión
+    reservar = ESTRATEGIAS[estrategia]
+    exitosas = rechazadas = errores = 0
+    for _ in range(operaciones):
+        try:
+            if reservar(producto_id, 1):
+                exitosas += 1
+            else:
+                rechazadas += 1
+        except Exception:
+            # p. ej. "database is locked" en SQLite
+            errores += 1
+    connections.close_all()
+    cola.put((exitosas, rechazadas, errores))
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de contención de stock: varios procesos reservan unidades del mismo '
+        'producto en paralelo. Compara Producto.objects.reservar (F()) con la lectura + save '
+        'anterior y verifica que el stock final sea consistente. Usa datos temporales.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=8, help='Procesos concurrentes')
+        parser.add_argument('--operaciones', type=int, default=200, help='Reservas por proceso')
+        parser.add_argument('--stock', type=int, default=1000, help='Stock inicial del producto')
+        parser.add_argument(
+            '--estrategias', nargs='+', choices=sorted(ESTRATEGIAS), default=['f', 'lectura'],
+            help='Estrategias a comparar'
+        )
+
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('Este benchmark requiere procesos con fork (Linux/macOS).')
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite serializa las escrituras: los resultados solo son representativos en PostgreSQL.'
+            ))
+
+        categoria = Categoria.objects.create(nombre=f'Benchmark stock {timezone.now().timestamp()}')
+        try:
+            self.stdout.write(
+                f"{'estrategia':>10} {'ops/s':>10} {'exitosas':>9} {'rechazadas':>11} "
+                f"{'errores':>8} {'stock final':>12} {'esperado':>9}"
+            )
+            for estrategia in options['estrategias']:
+                self._medir(estrategia, categoria, options)
+        finally:
+            categoria.productos.all().delete()
+            categoria.delete()
+
+    def _medir(self, estrategia, categoria, options):
+        producto = Producto.objects.create(
+            nombre=f'Producto benchmark stock {estrategia}',
+            descripcion='Producto temporal para benchmark',
+            precio_unitario=1000,
+            stock_disponible=options['stock'],
+            categoria=categoria,
+        )
+
+        contexto = multiprocessing.get_context('fork')
+        cola = contexto.Queue()
+        connections.close_all()  # no compartir la conexión del padre con los hijos
+        procesos = [
+            contexto.Process(
+                target=_trabajador,
+                args=(estrategia, producto.id, options['operaciones'], cola)
+            )
+            for _ in range(options['procesos'])
+        ]
+
+        inicio = time.perf_counter()
+        for proceso in procesos:
+            proceso.start()
+        resultados = [cola.get() for _ in procesos]
+        for proceso in procesos:
+            proceso.join()
+        segundos = time.perf_counter() - inicio
+
+        exitosas = sum(r[0] for r in resultados)
+        rechazadas = sum(r[1] for r in resultados)
+        errores = sum(r[2] for r in resultados)
+        producto.refresh_from_db(fields=['stock_disponible'])
+        esperado = options['stock'] - exitosas
+        total = options['procesos'] * options['operaciones']
+
+        linea = (
+            f"{estrategia:>10} {total / segundos:>10.0f} {exitosas:>9} {rechazadas:>11} "
+            f"{errores:>8} {producto.stock_disponible:>12} {esperado:>9}"
+        )
+        if producto.stock_disponible == esperado:
+            self.stdout.write(linea)
+        else:
+            # Actualizaciones perdidas: se vendió más de lo que se descontó
+            self.stdout.write(self.style.ERROR(linea + '  <- actualizaciones perdidas'))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from miapp.conciliacion_logic import MOTIVOS, CartolaInvalidaError, conciliar_transferencias
+
+
+class Command(BaseCommand):
+    help = (
+        'Concilia una cartola bancaria (CSV) con los pedidos pendientes de pago: '
+        'las filas cuya glosa menciona el número del pedido y cuyo monto es igual '
+        'al total marcan el pedido como pagado. Las filas sin calce se informan '
+        'y, con --reporte, se escriben en un CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('cartola', help='Ruta del CSV de la cartola')
+        parser.add_argument('--reporte', help='CSV donde escribir las filas no conciliadas')
+        parser.add_argument('--simular', action='store_true', help='Solo informa, no marca pedidos')
+        parser.add_argument('--columna-monto', help='Columna del monto abonado (por defecto se detecta)')
+        parser.add_argument('--columna-glosa', help='Columna de la glosa o descripción (por defecto se detecta)')
+        parser.add_argument('--delimitador', help='Separador del CSV (por defecto se detecta)')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificación del archivo (ej: latin-1)')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        reporte = None
+        try:
+            if options['reporte']:
+                reporte = open(options['reporte'], 'w', encoding='utf-8', newline='')
+            with open(options['cartola'], encoding=options['encoding'], newline='') as cartola:
+                resumen = conciliar_transferencias(
+                    cartola,
+                    columna_monto=options['columna_monto'],
+                    columna_glosa=options['columna_glosa'],
+                    delimitador=options['delimitador'],
+                    simular=options['simular'],
+                    reporte=reporte,
+                )
+        except (OSError, UnicodeDecodeError, CartolaInvalidaError) as error:
+            raise CommandError(f'No se pudo conciliar la cartola: {error}')
+        finally:
+            if reporte:
+                reporte.close()
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(f"Filas leídas: {resumen['filas']} ({segundos:.2f} s)")
+        self.stdout.write(f"Conciliadas: {resumen['conciliados']}")
+        if options['simular']:
+            self.stdout.write('Simulación: no se marcó ningún pedido')
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Pedidos marcados como pagados: {resumen['pagados']}"))
+        self.stdout.write(f"No conciliadas: {resumen['no_conciliadas']}")
+        for motivo, cantidad in resumen['motivos'].most_common():
+            self.stdout.write(f'  {MOTIVOS[motivo]}: {cantidad}')
+        if options['reporte'] and resumen['no_conciliadas']:
+            self.stdout.write(f"Detalle en {options['reporte']}")
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from miapp.idempotencia_logic import limpiar_claves_vencidas
+from miapp.reserva_logic import limpiar_vencidas
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina las reservas de stock del carrito y las claves de idempotencia '
+        'del checkout que ya vencieron. '
+        'Pensado para ejecutarse periódicamente (cron) o en bucle con --intervalo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=int, default=0,
+            help='Segundos entre barridos; 0 ejecuta un solo barrido y termina'
+        )
+
+    def handle(self, *args, **options):
+        intervalo = options['intervalo']
+        while True:
+            eliminadas = limpiar_vencidas()
+            claves = limpiar_claves_vencidas()
+            self.stdout.write(f'Reservas vencidas eliminadas: {eliminadas}; claves de idempotencia: {claves}')
+            if intervalo <= 0:
+                break
+            time.sleep(intervalo)
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from miapp.catalogo_logic import fronteras_ofertas, next_price_change_at
+
+
+class Command(BaseCommand):
+    help = (
+        'Muestra los próximos inicios y fines de ofertas activas, que son los '
+        'instantes en que cambian los precios y vencen los caches que dependen de ellos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=20, help='Cantidad máxima de cambios a mostrar')
+        parser.add_argument('--dias', type=int, help='Solo cambios dentro de los próximos N días')
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        hasta = ahora + timedelta(days=options['dias']) if options['dias'] else None
+
+        proximo = next_price_change_at(ahora)
+        if proximo is None:
+            self.stdout.write('No hay cambios de precio programados.')
+            return
+        self.stdout.write(
+            f'Próximo cambio de precio: {timezone.localtime(proximo):%Y-%m-%d %H:%M:%S} '
+            f'(en {int((proximo - ahora).total_seconds())} s)'
+        )
+
+        self.stdout.write(f"{'instante':>19}  {'tipo':<6} {'oferta':>6}  {'precio':>10}  producto")
+        for frontera in fronteras_ofertas(desde=ahora, hasta=hasta, limite=max(1, options['limite'])):
+            oferta = frontera['oferta']
+            self.stdout.write(
+                f"{timezone.localtime(frontera['instante']):%Y-%m-%d %H:%M:%S}  "
+                f"{frontera['tipo']:<6} {oferta.id:>6}  {oferta.precio_oferta:>10,.0f}  {oferta.producto.nombre}"
+            )
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from miapp.rollup_logic import reconstruir_rollups
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (formato AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye los rollups de ventas diarias (VentaDiaria y VentaDiariaProducto) '
+        'a partir de los pedidos. Sin opciones procesa todo el historial.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help='Primer día a reconstruir (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, help='Último día a reconstruir (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta')
+
+        dias = reconstruir_rollups(desde=desde, hasta=hasta)
+        self.stdout.write(self.style.SUCCESS(f'Rollups reconstruidos para {dias} día(s) con pedidos.'))
@@ -0,0 +1,114 @@
+import json
+import logging
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from miapp.models import Categoria, Producto
+from miapp.sesion_logic import estadisticas_sesion, middleware_con_contador, reiniciar_estadisticas_sesion
+
+
+class _Rollback(Exception):
+    """Se usa para deshacer los datos de prueba al terminar la reproducción."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Reproduce tráfico grabado (JSONL con cliente, metodo, ruta y datos opcionales) '
+        'y muestra cuántas escrituras de sesión se hicieron y cuántas se evitaron. '
+        'Sin --archivo genera tráfico sintético de navegación y carrito. '
+        'Los cambios en la base de datos se descartan al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', help='Tráfico grabado, una petición JSON por línea')
+        parser.add_argument('--clientes', type=int, default=20, help='Clientes del tráfico sintético')
+        parser.add_argument('--semilla', type=int, default=1, help='Semilla del tráfico sintético')
+
+    def handle(self, *args, **options):
+        logging.disable(logging.INFO)
+        try:
+            # El contador de sesión solo se instala durante la reproducción
+            with transaction.atomic(), override_settings(
+                ALLOWED_HOSTS=['*'], MIDDLEWARE=middleware_con_contador(settings.MIDDLEWARE)
+            ):
+                if options['archivo']:
+                    peticiones = self._leer(options['archivo'])
+                else:
+                    peticiones = self._sintetico(options['clientes'], random.Random(options['semilla']))
+
+                reiniciar_estadisticas_sesion()
+                clientes = {}
+                for peticion in peticiones:
+                    cliente = clientes.setdefault(peticion['cliente'], Client())
+                    metodo = getattr(cliente, peticion['metodo'].lower())
+                    if 'datos' in peticion:
+                        metodo(peticion['ruta'], data=json.dumps(peticion['datos']), content_type='application/json')
+                    else:
+                        metodo(peticion['ruta'])
+                estadisticas = estadisticas_sesion()
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.stdout.write(f'Motor de sesión: {settings.SESSION_ENGINE}')
+        for clave, valor in estadisticas.items():
+            self.stdout.write(f'{clave:>24}: {valor}')
+
+    def _leer(self, ruta):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                return [json.loads(linea) for linea in archivo if linea.strip()]
+        except (OSError, ValueError) as error:
+            raise CommandError(f'No se pudo leer el tráfico grabado: {error}')
+
+    def _sintetico(self, clientes, azar):
+        """
+        Cada cliente navega el catálogo, consulta el contador del carrito,
+        agrega productos y reenvía cantidades (a veces iguales a la actual,
+        como al salir del campo de cantidad sin cambiarla).
+        """
+        categoria = Categoria.objects.create(nombre=f'Tráfico {timezone.now().timestamp()}')
+        ids = [
+            producto.id for producto in Producto.objects.bulk_create([
+                Producto(
+                    nombre=f'Producto tráfico {i}', descripcion='Producto temporal',
+                    precio_unitario=1000, stock_disponible=1_000, categoria=categoria,
+                )
+                for i in range(5)
+            ])
+        ]
+
+        peticiones = []
+        for numero in range(clientes):
+            cliente = f'cliente-{numero}'
+            en_carrito = {}
+            for _ in range(azar.randint(5, 15)):
+                accion = azar.choice(['catalogo', 'resumen', 'agregar', 'cantidad', 'carrito'])
+                if accion == 'catalogo':
+                    peticiones.append({'cliente': cliente, 'metodo': 'GET', 'ruta': '/api/public/products/'})
+                elif accion == 'resumen':
+                    peticiones.append({'cliente': cliente, 'metodo': 'GET', 'ruta': '/api/cart/summary/'})
+                elif accion == 'carrito':
+                    peticiones.append({'cliente': cliente, 'metodo': 'GET', 'ruta': '/api/cart/'})
+                elif accion == 'agregar' or not en_carrito:
+                    producto_id = azar.choice(ids)
+                    en_carrito[producto_id] = en_carrito.get(producto_id, 0) + 1
+                    peticiones.append({
+                        'cliente': cliente, 'metodo': 'POST', 'ruta': '/api/cart/',
+                        'datos': {'producto_id': producto_id, 'cantidad': 1},
+                    })
+                else:
+                    producto_id = azar.choice(list(en_carrito))
+                    en_carrito[producto_id] = azar.choice([en_carrito[producto_id], en_carrito[producto_id] + 1])
+                    peticiones.append({
+                        'cliente': cliente, 'metodo': 'PUT', 'ruta': f'/api/cart/{producto_id}/',
+                        'datos': {'cantidad': en_carrito[producto_id]},
+                    })
+        return peticiones
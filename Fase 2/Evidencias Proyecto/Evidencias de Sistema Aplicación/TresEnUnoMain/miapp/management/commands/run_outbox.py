@@ -0,0 +1,60 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from miapp.correo_logic import obtener_remitente, procesar_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker que envía los correos de la cola de salida (CorreoPendiente) por lotes, '
+        'con reintentos y backoff exponencial. Pensado para correr como proceso aparte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.OUTBOX_LOTE,
+                            help='Cantidad máxima de correos por lote')
+        parser.add_argument('--intervalo', type=float, default=settings.OUTBOX_INTERVALO,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa hasta vaciar los correos listos y termina')
+
+    def handle(self, *args, **options):
+        self._detener = False
+        anteriores = {
+            senal: signal.signal(senal, self._solicitar_detencion)
+            for senal in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            self._drenar(options)
+        finally:
+            for senal, manejador in anteriores.items():
+                signal.signal(senal, manejador)
+        self.stdout.write('Outbox detenido')
+
+    def _drenar(self, options):
+        remitente = obtener_remitente()
+        self.stdout.write(f'Outbox iniciado (remitente: {type(remitente).__name__})')
+
+        while not self._detener:
+            close_old_connections()
+            resultado = procesar_outbox(lote=options['lote'], remitente=remitente)
+            procesados = sum(resultado.values())
+
+            if procesados:
+                self.stdout.write(
+                    f"enviados={resultado['enviados']} reintentos={resultado['reintentos']} "
+                    f"fallidos={resultado['fallidos']}"
+                )
+            if procesados < options['lote']:
+                # Lote incompleto: no quedan correos listos por ahora
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+
+    def _solicitar_detencion(self, *args):
+        # Termina el lote en curso antes de salir
+        self._detener = True
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:23
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+INDICE = django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='productos_search_vector_gin')
+
+
+# Configuración de búsqueda en español que además ignora tildes
+CREAR_CONFIGURACION = """
+CREATE EXTENSION IF NOT EXISTS unaccent;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'spanish_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = pg_catalog.spanish);
+        ALTER TEXT SEARCH CONFIGURATION spanish_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+"""
+
+# El vector se recalcula solo cuando cambian nombre, descripción o categoría,
+# por lo que las actualizaciones de stock no pagan el costo del trigger.
+CREAR_TRIGGERS = """
+CREATE OR REPLACE FUNCTION productos_search_vector_actualizar() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('spanish_unaccent', coalesce(NEW.nombre, '')), 'A') ||
+        setweight(to_tsvector('spanish_unaccent', coalesce(
+            (SELECT nombre FROM categorias WHERE id = NEW.categoria_id), ''
+        )), 'B') ||
+        setweight(to_tsvector('spanish_unaccent', coalesce(NEW.descripcion, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS productos_search_vector_trigger ON productos;
+CREATE TRIGGER productos_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF nombre, descripcion, categoria_id ON productos
+    FOR EACH ROW EXECUTE FUNCTION productos_search_vector_actualizar();
+
+CREATE OR REPLACE FUNCTION categorias_search_vector_actualizar() RETURNS trigger AS $$
+BEGIN
+    IF NEW.nombre IS DISTINCT FROM OLD.nombre THEN
+        UPDATE productos SET nombre = nombre WHERE categoria_id = NEW.id;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS categorias_search_vector_trigger ON categorias;
+CREATE TRIGGER categorias_search_vector_trigger
+    AFTER UPDATE OF nombre ON categorias
+    FOR EACH ROW EXECUTE FUNCTION categorias_search_vector_actualizar();
+
+-- Poblar el vector de los productos existentes
+UPDATE productos SET nombre = nombre;
+"""
+
+ELIMINAR_TRIGGERS = """
+DROP TRIGGER IF EXISTS categorias_search_vector_trigger ON categorias;
+DROP FUNCTION IF EXISTS categorias_search_vector_actualizar();
+DROP TRIGGER IF EXISTS productos_search_vector_trigger ON productos;
+DROP FUNCTION IF EXISTS productos_search_vector_actualizar();
+"""
+
+
+def crear_busqueda(apps, schema_editor):
+    """Solo PostgreSQL soporta tsvector y triggers plpgsql."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREAR_CONFIGURACION)
+    schema_editor.execute(CREAR_TRIGGERS)
+
+
+def eliminar_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(ELIMINAR_TRIGGERS)
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('miapp', 'Producto'), INDICE)
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('miapp', 'Producto'), INDICE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0003_alter_producto_imagen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_busqueda, eliminar_busqueda),
+        # El índice GIN queda en el estado del modelo (Producto.Meta.indexes),
+        # pero solo se crea en PostgreSQL
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='producto', index=INDICE),
+            ],
+            database_operations=[
+                migrations.RunPython(crear_indice, eliminar_indice),
+            ],
+        ),
+    ]
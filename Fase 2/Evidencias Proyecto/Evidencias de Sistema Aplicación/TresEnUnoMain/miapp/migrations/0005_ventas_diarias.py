@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0004_producto_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('estado_pedido', models.CharField(choices=[('pendiente_pago', 'Pendiente de Pago'), ('pagado', 'Pagado'), ('preparando', 'Preparando Envío'), ('enviado', 'Enviado'), ('completado', 'Completado'), ('cancelado', 'Cancelado')], max_length=50, verbose_name='Estado del pedido')),
+                ('pedidos', models.PositiveIntegerField(default=0, verbose_name='Cantidad de pedidos')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total vendido')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria',
+                'verbose_name_plural': 'Ventas diarias',
+                'db_table': 'ventas_diarias',
+                'ordering': ['-fecha'],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado_pedido'), name='venta_diaria_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('estado_pedido', models.CharField(choices=[('pendiente_pago', 'Pendiente de Pago'), ('pagado', 'Pagado'), ('preparando', 'Preparando Envío'), ('enviado', 'Enviado'), ('completado', 'Completado'), ('cancelado', 'Cancelado')], max_length=50, verbose_name='Estado del pedido')),
+                ('unidades', models.PositiveIntegerField(default=0, verbose_name='Unidades vendidas')),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Monto vendido')),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventas_diarias', to='miapp.categoria', verbose_name='Categoría')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='miapp.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria por producto',
+                'verbose_name_plural': 'Ventas diarias por producto',
+                'db_table': 'ventas_diarias_productos',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha', 'estado_pedido'], name='ventas_diar_fecha_af38ef_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado_pedido', 'producto'), name='venta_diaria_producto_unica')],
+            },
+        ),
+    ]
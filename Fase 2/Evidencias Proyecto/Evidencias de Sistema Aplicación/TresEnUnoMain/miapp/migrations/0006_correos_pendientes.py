@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0005_ventas_diarias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorreoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('confirmacion_pedido', 'Confirmación de pedido'), ('admin_nuevo_pedido', 'Aviso de nuevo pedido (admin)')], max_length=50, verbose_name='Tipo')),
+                ('destinatarios', models.JSONField(default=list, verbose_name='Destinatarios')),
+                ('asunto', models.CharField(max_length=255, verbose_name='Asunto')),
+                ('html', models.TextField(blank=True, verbose_name='Contenido HTML')),
+                ('texto', models.TextField(blank=True, verbose_name='Contenido en texto')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('fallido', 'Fallido')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('intentos', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('proximo_intento', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento')),
+                ('ultimo_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de envío')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='correos', to='miapp.pedido', verbose_name='Pedido')),
+            ],
+            options={
+                'verbose_name': 'Correo pendiente',
+                'verbose_name_plural': 'Correos pendientes',
+                'db_table': 'correos_pendientes',
+                'ordering': ['proximo_intento'],
+                'indexes': [models.Index(fields=['estado', 'proximo_intento'], name='correos_pen_estado_4c8145_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0006_correos_pendientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titular', models.CharField(help_text='Clave de la sesión dueña del carrito', max_length=64, verbose_name='Titular')),
+                ('cantidad', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('expira', models.DateTimeField(verbose_name='Expira')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='miapp.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Reserva de stock',
+                'verbose_name_plural': 'Reservas de stock',
+                'db_table': 'reservas_stock',
+                'indexes': [models.Index(fields=['producto', 'expira'], name='reservas_st_product_6c1067_idx'), models.Index(fields=['expira'], name='reservas_st_expira_cc7146_idx')],
+                'constraints': [models.UniqueConstraint(fields=('titular', 'producto'), name='reserva_unica_por_titular')],
+            },
+        ),
+    ]
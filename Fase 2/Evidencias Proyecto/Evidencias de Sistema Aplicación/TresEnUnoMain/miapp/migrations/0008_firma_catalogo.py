@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0007_reservastock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='oferta',
+            name='fecha_modificacion',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última modificación'),
+        ),
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['fecha_modificacion'], name='categorias_fecha_m_a1f5a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='oferta',
+            index=models.Index(fields=['fecha_modificacion'], name='ofertas_fecha_m_e1702f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='oferta',
+            index=models.Index(fields=['fecha_inicio'], name='ofertas_fecha_i_3c6606_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='oferta',
+            index=models.Index(fields=['fecha_fin'], name='ofertas_fecha_f_0df9b5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_modificacion'], name='productos_fecha_m_11bbe7_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0008_firma_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titular', models.CharField(help_text='Clave de la sesión que envió la solicitud', max_length=64, verbose_name='Titular')),
+                ('clave', models.CharField(max_length=100, verbose_name='Idempotency-Key')),
+                ('huella', models.CharField(help_text='SHA-256 del cuerpo de la solicitud', max_length=64, verbose_name='Huella')),
+                ('estado', models.CharField(choices=[('en_proceso', 'En proceso'), ('completado', 'Completado')], default='en_proceso', max_length=20, verbose_name='Estado')),
+                ('codigo_estado', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Código HTTP')),
+                ('respuesta', models.JSONField(blank=True, null=True, verbose_name='Respuesta')),
+                ('expira', models.DateTimeField(verbose_name='Expira')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creación')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claves_idempotencia', to='miapp.pedido', verbose_name='Pedido')),
+            ],
+            options={
+                'verbose_name': 'Clave de idempotencia',
+                'verbose_name_plural': 'Claves de idempotencia',
+                'db_table': 'claves_idempotencia',
+                'indexes': [models.Index(fields=['expira'], name='claves_idem_expira_541695_idx')],
+                'constraints': [models.UniqueConstraint(fields=('titular', 'clave'), name='clave_idempotencia_unica')],
+            },
+        ),
+    ]
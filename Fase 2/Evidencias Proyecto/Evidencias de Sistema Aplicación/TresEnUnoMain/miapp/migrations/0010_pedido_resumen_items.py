@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:53
+
+from django.db import migrations, models
+
+
+def completar_resumenes(apps, schema_editor):
+    """
+    Llena cantidad_items y resumen_items de los pedidos existentes a partir
+    de sus detalles, en lotes de 500 pedidos.
+    """
+    Pedido = apps.get_model('miapp', 'Pedido')
+    DetallePedido = apps.get_model('miapp', 'DetallePedido')
+
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Pedido.objects.filter(id__gt=ultimo_id).order_by('id')
+            .only('id').prefetch_related(
+                models.Prefetch(
+                    'detalles',
+                    queryset=DetallePedido.objects.select_related('producto').order_by('id'),
+                )
+            )[:500]
+        )
+        if not lote:
+            break
+        for pedido in lote:
+            detalles = list(pedido.detalles.all())
+            pedido.cantidad_items = sum(detalle.cantidad for detalle in detalles)
+            pedido.resumen_items = [
+                {
+                    'producto_id': detalle.producto_id,
+                    'nombre': detalle.producto.nombre,
+                    'cantidad': detalle.cantidad,
+                    'precio': str(detalle.precio_compra),
+                    'subtotal': str(detalle.cantidad * detalle.precio_compra),
+                    'imagen': detalle.producto.imagen,
+                }
+                for detalle in detalles
+            ]
+        Pedido.objects.bulk_update(lote, ['cantidad_items', 'resumen_items'])
+        ultimo_id = lote[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0009_claveidempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='cantidad_items',
+            field=models.PositiveIntegerField(default=0, verbose_name='Cantidad de items'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='resumen_items',
+            field=models.JSONField(blank=True, default=list, help_text='Snapshot de las líneas: producto_id, nombre, cantidad, precio, subtotal e imagen', verbose_name='Resumen de productos'),
+        ),
+        migrations.RunPython(completar_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0010_pedido_resumen_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionPedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado_anterior', models.CharField(choices=[('pendiente_pago', 'Pendiente de Pago'), ('pagado', 'Pagado'), ('preparando', 'Preparando Envío'), ('enviado', 'Enviado'), ('completado', 'Completado'), ('cancelado', 'Cancelado')], max_length=50, verbose_name='Estado anterior')),
+                ('estado_nuevo', models.CharField(choices=[('pendiente_pago', 'Pendiente de Pago'), ('pagado', 'Pagado'), ('preparando', 'Preparando Envío'), ('enviado', 'Enviado'), ('completado', 'Completado'), ('cancelado', 'Cancelado')], max_length=50, verbose_name='Estado nuevo')),
+                ('origen', models.CharField(default='admin', max_length=30, verbose_name='Origen')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transiciones', to='miapp.pedido', verbose_name='Pedido')),
+                ('usuario', models.ForeignKey(blank=True, help_text='Miembro del staff que hizo el cambio', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transiciones_pedidos', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Transición de pedido',
+                'verbose_name_plural': 'Transiciones de pedidos',
+                'db_table': 'transiciones_pedidos',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['pedido', '-fecha'], name='transicione_pedido__478314_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('miapp', '0011_transicionpedido'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='claveidempotencia',
+            name='titular',
+            field=models.CharField(help_text='Cliente (cliente:<id>) o, para invitados, clave de la sesión que envió la solicitud', max_length=64, verbose_name='Titular'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -97,6 +100,9 @@ class Categoria(models.Model):
         verbose_name = 'Categoría'
         verbose_name_plural = 'Categorías'
         ordering = ['nombre']
+        indexes = [
+            models.Index(fields=['fecha_modificacion']),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -132,6 +138,101 @@ class Categoria(models.Model):
         return self.productos.filter(stock_disponible__gt=0).count()
 
 
+# ------------------------------------------------
+# QUERYSET PRODUCTO
+# ------------------------------------------------
+class ProductoQuerySet(models.QuerySet):
+
+    def con_precio_vigente(self, now=None):
+        """
+        Anota en la misma consulta la mejor oferta vigente de cada producto:
+        - oferta_vigente_id: ID de la oferta activa con menor precio (o None)
+        - precio_oferta_vigente: precio de esa oferta (o None)
+
+        Como se calcula al momento de la consulta, siempre respeta las fechas
+        de inicio y fin de las ofertas, sin consultas extra por producto.
+        """
+        now = now or timezone.now()
+
+        mejor_oferta = Oferta.objects.filter(
+            producto=models.OuterRef('pk'),
+            fecha_inicio__lte=now,
+            fecha_fin__gte=now,
+            activa=True
+        ).order_by('precio_oferta', '-fecha_inicio')
+
+        return self.annotate(
+            oferta_vigente_id=models.Subquery(mejor_oferta.values('id')[:1]),
+            precio_oferta_vigente=models.Subquery(mejor_oferta.values('precio_oferta')[:1]),
+        )
+
+    # ===== OPERACIONES ATÓMICAS DE STOCK =====
+
+    def reservar(self, cantidades, parcial=False):
+        """
+        Descuenta stock para {producto_id: cantidad} con UPDATEs condicionales
+        (stock = stock - cantidad WHERE stock >= cantidad), sin leer ni
+        bloquear antes: la base de datos resuelve la concurrencia y nunca
+        se pierden actualizaciones ni queda stock negativo.
+
+        Retorna la lista de IDs que no se pudieron reservar (sin stock
+        suficiente o inexistentes). Por defecto es todo o nada: si alguno
+        falla no se descuenta ninguno; con parcial=True se mantienen los que
+        sí alcanzaron.
+        """
+        from django.db import transaction
+        from django.utils import timezone
+        from .catalogo_logic import invalidar_catalogo
+
+        fallidos = []
+        ahora = timezone.now()
+        with transaction.atomic():
+            # Orden fijo por ID para que dos reservas concurrentes no se bloqueen mutuamente
+            for producto_id, cantidad in sorted(cantidades.items()):
+                if cantidad <= 0:
+                    raise ValueError('La cantidad a reservar debe ser mayor a 0.')
+                actualizados = self.filter(pk=producto_id, stock_disponible__gte=cantidad).update(
+                    stock_disponible=models.F('stock_disponible') - cantidad,
+                    fecha_modificacion=ahora,
+                )
+                if not actualizados:
+                    fallidos.append(producto_id)
+
+            if fallidos and not parcial:
+                transaction.set_rollback(True)
+
+        if len(fallidos) < len(cantidades) and (parcial or not fallidos):
+            invalidar_catalogo()
+        return fallidos
+
+    def liberar(self, cantidades):
+        """
+        Devuelve stock para {producto_id: cantidad} en un solo UPDATE
+        (stock = stock + cantidad). Retorna los IDs que no existen.
+        """
+        from django.utils import timezone
+        from .catalogo_logic import invalidar_catalogo
+
+        if not cantidades:
+            return []
+        if any(cantidad <= 0 for cantidad in cantidades.values()):
+            raise ValueError('La cantidad a liberar debe ser mayor a 0.')
+
+        productos = self.filter(pk__in=cantidades)
+        existentes = set(productos.values_list('pk', flat=True))
+        productos.update(
+            stock_disponible=models.Case(
+                *[models.When(pk=producto_id, then=models.F('stock_disponible') + cantidad)
+                  for producto_id, cantidad in cantidades.items()],
+                default=models.F('stock_disponible'),
+            ),
+            fecha_modificacion=timezone.now(),
+        )
+        if existentes:
+            invalidar_catalogo()
+        return [producto_id for producto_id in cantidades if producto_id not in existentes]
+
+
 # ------------------------------------------------
 # MODELO PRODUCTO
 # ------------------------------------------------
@@ -197,6 +298,12 @@ class Producto(models.Model):
     )
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
     fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Última modificación")
+    
+    # Búsqueda de texto completo (PostgreSQL): nombre, categoría y descripción.
+    # Lo mantiene un trigger de la base de datos (ver migración 0004).
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductoQuerySet.as_manager()
 
     class Meta:
         db_table = 'productos'
@@ -207,6 +314,9 @@ class Producto(models.Model):
             models.Index(fields=['nombre']),
             models.Index(fields=['categoria', 'activo']),
             models.Index(fields=['-fecha_creacion']),
+            models.Index(fields=['fecha_modificacion']),
+            # Solo PostgreSQL (ver migración 0004)
+            GinIndex(fields=['search_vector'], name='productos_search_vector_gin'),
         ]
 
     def __str__(self):
@@ -250,19 +360,76 @@ class Producto(models.Model):
             fecha_fin__gte=now
         ).exists()
 
+    def _cargar_precio_vigente(self):
+        """
+        Retorna el precio de la oferta vigente. Usa la anotación de
+        con_precio_vigente() si existe; si no, la consulta una sola vez.
+        """
+        if not hasattr(self, 'precio_oferta_vigente'):
+            fila = Producto.objects.con_precio_vigente().filter(pk=self.pk).values(
+                'oferta_vigente_id', 'precio_oferta_vigente'
+            ).first() or {}
+            self.oferta_vigente_id = fila.get('oferta_vigente_id')
+            self.precio_oferta_vigente = fila.get('precio_oferta_vigente')
+        return self.precio_oferta_vigente
+
+    @property
+    def tiene_oferta_vigente(self):
+        """Retorna True si el producto tiene una oferta activa en este momento"""
+        return self._cargar_precio_vigente() is not None
+
+    @property
+    def precio_vigente(self):
+        """Precio final del producto (precio de oferta si existe)"""
+        precio_oferta = self._cargar_precio_vigente()
+        return precio_oferta if precio_oferta is not None else self.precio_unitario
+
+    @property
+    def ahorro_vigente(self):
+        """Ahorro en pesos respecto al precio normal"""
+        return self.precio_unitario - self.precio_vigente
+
+    @property
+    def descuento_vigente(self):
+        """Porcentaje de descuento de la oferta vigente"""
+        if not self.tiene_oferta_vigente or not self.precio_unitario:
+            return 0
+        return round((self.ahorro_vigente / self.precio_unitario) * 100, 2)
+
     def reducir_stock(self, cantidad):
-        """Reduce el stock del producto"""
-        if cantidad > self.stock_disponible:
+        """Reduce el stock del producto (UPDATE atómico, sin save() ni full_clean())"""
+        fallidos = Producto.objects.reservar({self.pk: cantidad})
+        self.refresh_from_db(fields=['stock_disponible'])
+        if fallidos:
             raise ValidationError(
                 f'No hay suficiente stock. Disponible: {self.stock_disponible}'
             )
-        self.stock_disponible -= cantidad
-        self.save(update_fields=['stock_disponible'])
 
     def aumentar_stock(self, cantidad):
-        """Aumenta el stock del producto"""
-        self.stock_disponible += cantidad
-        self.save(update_fields=['stock_disponible'])
+        """Aumenta el stock del producto (UPDATE atómico, sin save() ni full_clean())"""
+        Producto.objects.liberar({self.pk: cantidad})
+        self.refresh_from_db(fields=['stock_disponible'])
+
+
+# ------------------------------------------------
+# QUERYSET PEDIDO
+# ------------------------------------------------
+class PedidoQuerySet(models.QuerySet):
+
+    def con_detalles(self):
+        """
+        Precarga los detalles con su producto (una consulta para todos los
+        pedidos), trayendo del producto solo lo que muestran los serializers.
+        """
+        return self.prefetch_related(
+            models.Prefetch(
+                'detalles',
+                queryset=DetallePedido.objects.select_related('producto').only(
+                    'id', 'pedido_id', 'cantidad', 'precio_compra',
+                    'producto__id', 'producto__nombre', 'producto__imagen',
+                ).order_by('id'),
+            )
+        )
 
 
 # ------------------------------------------------
@@ -353,6 +520,18 @@ class Pedido(models.Model):
         verbose_name="Número de seguimiento",
         help_text="Número de seguimiento del envío"
     )
+    
+    # Resumen desnormalizado de los detalles (se escribe en el checkout) para
+    # listar el historial sin joins con detalle_pedidos ni productos
+    cantidad_items = models.PositiveIntegerField(default=0, verbose_name="Cantidad de items")
+    resumen_items = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name="Resumen de productos",
+        help_text="Snapshot de las líneas: producto_id, nombre, cantidad, precio, subtotal e imagen"
+    )
+
+    objects = PedidoQuerySet.as_manager()
 
     class Meta:
         db_table = 'pedidos'
@@ -473,6 +652,7 @@ class Oferta(models.Model):
         verbose_name="Activa",
         help_text="Indica si la oferta está activa"
     )
+    fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Última modificación")
 
     class Meta:
         db_table = 'ofertas'
@@ -481,6 +661,10 @@ class Oferta(models.Model):
         ordering = ['-fecha_inicio']
         indexes = [
             models.Index(fields=['producto', 'fecha_inicio', 'fecha_fin']),
+            # Firma del catálogo (ETag): máximos por índice
+            models.Index(fields=['fecha_modificacion']),
+            models.Index(fields=['fecha_inicio']),
+            models.Index(fields=['fecha_fin']),
         ]
 
     def __str__(self):
@@ -519,4 +703,252 @@ class Oferta(models.Model):
             descuento = ((self.producto.precio_unitario - self.precio_oferta) / 
                         self.producto.precio_unitario) * 100
             return round(descuento, 2)
-        return 0
\ No newline at end of file
+        return 0
+
+# ------------------------------------------------
+# ROLLUPS DE VENTAS (DASHBOARD)
+# ------------------------------------------------
+class VentaDiaria(models.Model):
+    """
+    Resumen de pedidos por día (hora de Chile) y estado actual del pedido.
+    Se mantiene desde rollup_logic al crear o cambiar pedidos; no se edita a mano.
+    """
+    fecha = models.DateField(verbose_name="Fecha")
+    estado_pedido = models.CharField(max_length=50, choices=Pedido.ESTADOS, verbose_name="Estado del pedido")
+    pedidos = models.PositiveIntegerField(default=0, verbose_name="Cantidad de pedidos")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total vendido")
+
+    class Meta:
+        db_table = 'ventas_diarias'
+        verbose_name = 'Venta diaria'
+        verbose_name_plural = 'Ventas diarias'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'estado_pedido'], name='venta_diaria_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.get_estado_pedido_display()}: {self.pedidos} pedidos"
+
+
+class VentaDiariaProducto(models.Model):
+    """Unidades y monto vendidos por día, estado del pedido y producto."""
+    fecha = models.DateField(verbose_name="Fecha")
+    estado_pedido = models.CharField(max_length=50, choices=Pedido.ESTADOS, verbose_name="Estado del pedido")
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='ventas_diarias',
+        verbose_name="Producto"
+    )
+    categoria = models.ForeignKey(
+        Categoria,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ventas_diarias',
+        verbose_name="Categoría"
+    )
+    unidades = models.PositiveIntegerField(default=0, verbose_name="Unidades vendidas")
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Monto vendido")
+
+    class Meta:
+        db_table = 'ventas_diarias_productos'
+        verbose_name = 'Venta diaria por producto'
+        verbose_name_plural = 'Ventas diarias por producto'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'estado_pedido', 'producto'],
+                name='venta_diaria_producto_unica'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['fecha', 'estado_pedido']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_id}: {self.unidades} unidades"
+
+
+# ------------------------------------------------
+# MODELO CORREO PENDIENTE (OUTBOX)
+# ------------------------------------------------
+class CorreoPendiente(models.Model):
+    """
+    Correo en cola de salida. Se escribe dentro de la misma transacción que
+    lo origina (p. ej. el checkout) y lo envía el proceso `manage.py run_outbox`.
+    """
+
+    TIPOS = [
+        ('confirmacion_pedido', 'Confirmación de pedido'),
+        ('admin_nuevo_pedido', 'Aviso de nuevo pedido (admin)'),
+    ]
+
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('enviado', 'Enviado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    tipo = models.CharField(max_length=50, choices=TIPOS, verbose_name="Tipo")
+    pedido = models.ForeignKey(
+        Pedido,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='correos',
+        verbose_name="Pedido"
+    )
+    destinatarios = models.JSONField(default=list, verbose_name="Destinatarios")
+    asunto = models.CharField(max_length=255, verbose_name="Asunto")
+    html = models.TextField(blank=True, verbose_name="Contenido HTML")
+    texto = models.TextField(blank=True, verbose_name="Contenido en texto")
+
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente', verbose_name="Estado")
+    intentos = models.PositiveIntegerField(default=0, verbose_name="Intentos")
+    proximo_intento = models.DateTimeField(default=timezone.now, verbose_name="Próximo intento")
+    ultimo_error = models.TextField(blank=True, verbose_name="Último error")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+    fecha_envio = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de envío")
+
+    class Meta:
+        db_table = 'correos_pendientes'
+        verbose_name = 'Correo pendiente'
+        verbose_name_plural = 'Correos pendientes'
+        ordering = ['proximo_intento']
+        indexes = [
+            models.Index(fields=['estado', 'proximo_intento']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {', '.join(self.destinatarios)} ({self.get_estado_display()})"
+
+
+# ------------------------------------------------
+# MODELO RESERVA DE STOCK (CARRITO)
+# ------------------------------------------------
+class ReservaStock(models.Model):
+    """
+    Unidades apartadas temporalmente por un carrito (modo opcional
+    CARRITO_RESERVAS_ACTIVAS). No descuentan stock_disponible: el stock
+    disponible para otros es stock_disponible menos las reservas vigentes.
+    Las vencidas se ignoran y las elimina `manage.py limpiar_reservas`.
+    """
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='reservas',
+        verbose_name="Producto"
+    )
+    titular = models.CharField(
+        max_length=64,
+        verbose_name="Titular",
+        help_text="Clave de la sesión dueña del carrito"
+    )
+    cantidad = models.PositiveIntegerField(verbose_name="Cantidad")
+    expira = models.DateTimeField(verbose_name="Expira")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+
+    class Meta:
+        db_table = 'reservas_stock'
+        verbose_name = 'Reserva de stock'
+        verbose_name_plural = 'Reservas de stock'
+        constraints = [
+            models.UniqueConstraint(fields=['titular', 'producto'], name='reserva_unica_por_titular'),
+        ]
+        indexes = [
+            models.Index(fields=['producto', 'expira']),
+            models.Index(fields=['expira']),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} ({self.titular[:8]}…) hasta {self.expira:%H:%M}"
+
+
+# ------------------------------------------------
+# MODELO CLAVE DE IDEMPOTENCIA (CHECKOUT)
+# ------------------------------------------------
+class ClaveIdempotencia(models.Model):
+    """
+    Idempotency-Key recibida en el checkout. Mientras el pedido se procesa
+    queda 'en_proceso'; al terminar guarda la respuesta 201 para repetirla
+    ante reintentos o doble envío sin volver a tocar productos ni stock.
+    """
+    ESTADOS = [
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+    ]
+
+    titular = models.CharField(max_length=64, verbose_name="Titular", help_text="Cliente (cliente:<id>) o, para invitados, clave de la sesión que envió la solicitud")
+    clave = models.CharField(max_length=100, verbose_name="Idempotency-Key")
+    huella = models.CharField(max_length=64, verbose_name="Huella", help_text="SHA-256 del cuerpo de la solicitud")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='en_proceso', verbose_name="Estado")
+    codigo_estado = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Código HTTP")
+    respuesta = models.JSONField(null=True, blank=True, verbose_name="Respuesta")
+    pedido = models.ForeignKey(
+        'Pedido',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='claves_idempotencia',
+        verbose_name="Pedido"
+    )
+    expira = models.DateTimeField(verbose_name="Expira")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creación")
+
+    class Meta:
+        db_table = 'claves_idempotencia'
+        verbose_name = 'Clave de idempotencia'
+        verbose_name_plural = 'Claves de idempotencia'
+        constraints = [
+            models.UniqueConstraint(fields=['titular', 'clave'], name='clave_idempotencia_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['expira']),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.get_estado_display()})"
+
+
+# ------------------------------------------------
+# MODELO TRANSICIÓN DE PEDIDO (AUDITORÍA)
+# ------------------------------------------------
+class TransicionPedido(models.Model):
+    """
+    Registro de cada cambio de estado de un pedido hecho en lote (acciones
+    del admin, conciliación de transferencias). Se escribe con bulk_create
+    en la misma transacción que el UPDATE de los pedidos.
+    """
+    pedido = models.ForeignKey(
+        'Pedido',
+        on_delete=models.CASCADE,
+        related_name='transiciones',
+        verbose_name="Pedido"
+    )
+    estado_anterior = models.CharField(max_length=50, choices=Pedido.ESTADOS, verbose_name="Estado anterior")
+    estado_nuevo = models.CharField(max_length=50, choices=Pedido.ESTADOS, verbose_name="Estado nuevo")
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='transiciones_pedidos',
+        verbose_name="Usuario",
+        help_text="Miembro del staff que hizo el cambio"
+    )
+    origen = models.CharField(max_length=30, default='admin', verbose_name="Origen")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+
+    class Meta:
+        db_table = 'transiciones_pedidos'
+        verbose_name = 'Transición de pedido'
+        verbose_name_plural = 'Transiciones de pedidos'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['pedido', '-fecha']),
+        ]
+
+    def __str__(self):
+        return f"Pedido #{self.pedido_id}: {self.estado_anterior} → {self.estado_nuevo}"
@@ -0,0 +1,29 @@
+# miapp/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class ProductoCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) para el catálogo público.
+    Ordena por fecha de creación descendente (índice -fecha_creacion) y usa
+    el id como desempate, por lo que cada página cuesta lo mismo sin
+    importar qué tan profundo se navegue.
+    Ejemplo: /api/public/products/?page_size=24&cursor=<cursor>
+    """
+    ordering = ('-fecha_creacion', 'id')
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class PedidoCursorPagination(CursorPagination):
+    """
+    Paginación por cursor para el historial de pedidos del cliente.
+    Recorre el índice (usuario, -fecha_pedido) con el id como desempate y,
+    al no usar COUNT, el costo por página no depende del total de pedidos.
+    Ejemplo: /api/mis-pedidos/?page_size=20&cursor=<cursor>
+    """
+    ordering = ('-fecha_pedido', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,86 @@
+# miapp/pedido_logic.py
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DetallePedido, Pedido, Producto, TransicionPedido
+from .rollup_logic import fecha_local, programar_movimientos
+
+
+# ===== TRANSICIONES DE ESTADO =====
+#
+# Estado destino -> (estados desde los que se puede llegar, campo de fecha
+# que se marca al llegar). Es la misma regla que aplican los métodos
+# marcar_como_* de Pedido, pero para lotes de pedidos.
+TRANSICIONES = {
+    'pagado': (('pendiente_pago',), 'fecha_pago'),
+    'enviado': (('pagado', 'preparando'), 'fecha_envio'),
+    'completado': (('enviado',), 'fecha_entrega'),
+    'cancelado': (('pendiente_pago', 'pagado'), None),
+}
+
+
+def transicionar_pedidos(pedidos, estado_nuevo, usuario=None, origen='admin'):
+    """
+    Cambia de estado un conjunto de pedidos con operaciones por conjunto:
+
+    1. Bloquea (SELECT ... FOR UPDATE, orden por id) los pedidos del
+       queryset que están en un estado de origen válido.
+    2. Un único UPDATE con el estado nuevo y su fecha, repitiendo la
+       condición de estado como guarda.
+    3. Registra las transiciones con bulk_create.
+    4. Al cancelar, devuelve el stock de todas las líneas en un solo UPDATE
+       agrupado por producto (Producto.objects.liberar).
+
+    Retorna un Counter {estado_anterior: pedidos cambiados}; los pedidos en
+    otros estados se omiten sin error.
+    """
+    origenes, campo_fecha = TRANSICIONES[estado_nuevo]
+
+    with transaction.atomic():
+        # Se bloquea por id: el queryset recibido puede traer DISTINCT o joins
+        # (filtros del admin) que no admiten FOR UPDATE
+        bloqueados = list(
+            Pedido.objects.filter(id__in=pedidos.values('id'), estado_pedido__in=origenes)
+            .select_for_update()
+            .order_by('id')
+            .values_list('id', 'estado_pedido', 'fecha_pedido', 'total_pedido')
+        )
+        anteriores = {pedido_id: estado for pedido_id, estado, _, _ in bloqueados}
+        if not anteriores:
+            return Counter()
+
+        cambios = {'estado_pedido': estado_nuevo}
+        if campo_fecha:
+            cambios[campo_fecha] = timezone.now()
+        Pedido.objects.filter(id__in=anteriores, estado_pedido__in=origenes).update(**cambios)
+
+        TransicionPedido.objects.bulk_create([
+            TransicionPedido(
+                pedido_id=pedido_id,
+                estado_anterior=estado_anterior,
+                estado_nuevo=estado_nuevo,
+                usuario=usuario,
+                origen=origen,
+            )
+            for pedido_id, estado_anterior in anteriores.items()
+        ])
+
+        if estado_nuevo == 'cancelado':
+            devolver = dict(
+                DetallePedido.objects.filter(pedido_id__in=anteriores)
+                .values('producto_id')
+                .annotate(total=Sum('cantidad'))
+                .values_list('producto_id', 'total')
+            )
+            Producto.objects.liberar(devolver)
+
+        # update() no dispara señales: se mueve el aporte a los rollups explícitamente
+        programar_movimientos([
+            (pedido_id, (fecha_local(fecha), estado, total), (fecha_local(fecha), estado_nuevo, total))
+            for pedido_id, estado, fecha, total in bloqueados
+        ])
+
+    return Counter(anteriores.values())
@@ -0,0 +1,122 @@
+# miapp/reserva_logic.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Producto, ReservaStock
+
+
+def reservas_activas():
+    """El modo de reservas del carrito es opcional (settings.CARRITO_RESERVAS_ACTIVAS)."""
+    return settings.CARRITO_RESERVAS_ACTIVAS
+
+
+def titular_de(request):
+    """Las reservas pertenecen a la sesión; se crea la sesión si aún no existe."""
+    if not request.session.session_key:
+        request.session.save()
+    return request.session.session_key
+
+
+def con_stock_disponible(queryset, titular=None, ahora=None):
+    """
+    Anota `stock_libre` = stock_disponible - reservas vigentes de otros
+    titulares (las del propio titular no le restan).
+    """
+    ahora = ahora or timezone.now()
+    reservas = ReservaStock.objects.filter(producto=OuterRef('pk'), expira__gt=ahora)
+    if titular:
+        reservas = reservas.exclude(titular=titular)
+    retenido = (
+        reservas.order_by()
+        .values('producto')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+    return queryset.annotate(
+        retenido=Coalesce(Subquery(retenido, output_field=IntegerField()), Value(0))
+    ).annotate(stock_libre=F('stock_disponible') - F('retenido'))
+
+
+def retener(titular, producto_id, cantidad):
+    """
+    Aparta `cantidad` unidades (total, no incremental) del producto para el
+    titular durante CARRITO_RESERVA_TTL segundos.
+
+    Bloquea solo la fila del producto mientras compara con las reservas de
+    los demás, así dos carritos no pueden apartar la misma última unidad.
+    Retorna (ok, stock_libre).
+    """
+    with transaction.atomic():
+        producto = (
+            con_stock_disponible(
+                Producto.objects.select_for_update().filter(pk=producto_id, activo=True),
+                titular=titular,
+            )
+            .only('id', 'stock_disponible')
+            .first()
+        )
+        if producto is None:
+            return False, 0
+        if cantidad > producto.stock_libre:
+            return False, max(producto.stock_libre, 0)
+
+        if cantidad <= 0:
+            ReservaStock.objects.filter(titular=titular, producto_id=producto_id).delete()
+        else:
+            ReservaStock.objects.update_or_create(
+                titular=titular,
+                producto_id=producto_id,
+                defaults={'cantidad': cantidad, 'expira': _vencimiento()},
+            )
+        return True, producto.stock_libre
+
+
+def guardar_reservas(titular, cantidades):
+    """
+    Fija las reservas del titular para varios productos de una vez
+    ({producto_id: cantidad}; 0 elimina la reserva). No valida stock: se
+    llama con las filas de los productos ya bloqueadas y validadas.
+    """
+    quitar = [producto_id for producto_id, cantidad in cantidades.items() if cantidad <= 0]
+    if quitar:
+        soltar(titular, quitar)
+
+    expira = _vencimiento()
+    ReservaStock.objects.bulk_create(
+        [
+            ReservaStock(titular=titular, producto_id=producto_id, cantidad=cantidad, expira=expira)
+            for producto_id, cantidad in cantidades.items() if cantidad > 0
+        ],
+        update_conflicts=True,
+        unique_fields=['titular', 'producto'],
+        update_fields=['cantidad', 'expira'],
+    )
+
+
+def soltar(titular, producto_ids=None):
+    """Libera las reservas del titular (todas o solo las de ciertos productos)."""
+    reservas = ReservaStock.objects.filter(titular=titular)
+    if producto_ids is not None:
+        reservas = reservas.filter(producto_id__in=producto_ids)
+    return reservas.delete()[0]
+
+
+def renovar(titular):
+    """Extiende el vencimiento de todas las reservas del titular (el carrito sigue en uso)."""
+    return ReservaStock.objects.filter(titular=titular, expira__gt=timezone.now()).update(
+        expira=_vencimiento()
+    )
+
+
+def limpiar_vencidas(ahora=None):
+    """Elimina las reservas vencidas. Retorna la cantidad eliminada."""
+    return ReservaStock.objects.filter(expira__lte=ahora or timezone.now()).delete()[0]
+
+
+def _vencimiento():
+    return timezone.now() + timedelta(seconds=settings.CARRITO_RESERVA_TTL)
@@ -0,0 +1,286 @@
+# miapp/rollup_logic.py
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DetallePedido, Pedido, VentaDiaria, VentaDiariaProducto
+
+logger = logging.getLogger(__name__)
+
+# Campos del pedido que afectan los rollups (si un save no los toca, no se recalcula)
+CAMPOS_ROLLUP = {'estado_pedido', 'total_pedido', 'fecha_pedido'}
+
+
+def fecha_local(fecha_hora):
+    """Día (en la zona horaria del proyecto) al que pertenece una fecha/hora."""
+    return timezone.localdate(fecha_hora)
+
+
+def rango_del_dia(fecha):
+    """Retorna (inicio, fin) del día local como datetimes con zona horaria."""
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    fin = timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+    return inicio, fin
+
+
+def recalcular_dia(fecha):
+    """
+    Reconstruye los rollups de un día a partir de sus pedidos.
+
+    Solo lee los pedidos de ese día (rango sobre fecha_pedido, usa el
+    índice), por lo que el costo no depende del historial total. Es
+    idempotente: las filas se insertan o actualizan y se eliminan las
+    combinaciones que ya no existen.
+    """
+    inicio, fin = rango_del_dia(fecha)
+
+    resumen = (
+        Pedido.objects
+        .filter(fecha_pedido__gte=inicio, fecha_pedido__lt=fin)
+        .values('estado_pedido')
+        .annotate(pedidos=Count('id'), total=Sum('total_pedido'))
+        .order_by()
+    )
+    por_producto = (
+        DetallePedido.objects
+        .filter(pedido__fecha_pedido__gte=inicio, pedido__fecha_pedido__lt=fin)
+        .values('pedido__estado_pedido', 'producto_id', 'producto__categoria_id')
+        .annotate(
+            unidades=Sum('cantidad'),
+            monto=Sum(ExpressionWrapper(
+                F('cantidad') * F('precio_compra'),
+                output_field=DecimalField(max_digits=14, decimal_places=2)
+            ))
+        )
+        .order_by()
+    )
+
+    ventas = [
+        VentaDiaria(
+            fecha=fecha,
+            estado_pedido=fila['estado_pedido'],
+            pedidos=fila['pedidos'],
+            total=fila['total'] or 0,
+        )
+        for fila in resumen
+    ]
+    ventas_productos = [
+        VentaDiariaProducto(
+            fecha=fecha,
+            estado_pedido=fila['pedido__estado_pedido'],
+            producto_id=fila['producto_id'],
+            categoria_id=fila['producto__categoria_id'],
+            unidades=fila['unidades'] or 0,
+            monto=fila['monto'] or 0,
+        )
+        for fila in por_producto
+    ]
+
+    with transaction.atomic():
+        VentaDiaria.objects.filter(fecha=fecha).exclude(
+            estado_pedido__in=[venta.estado_pedido for venta in ventas]
+        ).delete()
+        VentaDiaria.objects.bulk_create(
+            ventas,
+            update_conflicts=True,
+            unique_fields=['fecha', 'estado_pedido'],
+            update_fields=['pedidos', 'total'],
+        )
+
+        vigentes = {(venta.estado_pedido, venta.producto_id) for venta in ventas_productos}
+        obsoletas = [
+            fila_id
+            for fila_id, estado, producto_id in VentaDiariaProducto.objects
+            .filter(fecha=fecha)
+            .values_list('id', 'estado_pedido', 'producto_id')
+            if (estado, producto_id) not in vigentes
+        ]
+        if obsoletas:
+            VentaDiariaProducto.objects.filter(id__in=obsoletas).delete()
+        VentaDiariaProducto.objects.bulk_create(
+            ventas_productos,
+            update_conflicts=True,
+            unique_fields=['fecha', 'estado_pedido', 'producto'],
+            update_fields=['categoria', 'unidades', 'monto'],
+        )
+
+
+# ===== ACTUALIZACIÓN INCREMENTAL =====
+#
+# Cada cambio de un pedido se registra como un movimiento
+# (pedido_id, antes, despues), donde antes/despues son la tupla
+# (fecha, estado, total) del pedido o None (no existía / se eliminó).
+# Al confirmar la transacción se resta el aporte de `antes` y se suma el de
+# `despues` con UPDATE ... SET campo = campo + delta, sin releer el día:
+# el costo depende de las líneas de los pedidos movidos, no de cuántos
+# pedidos tenga el día. reconstruir_rollups sigue siendo la reparación.
+
+def datos_rollup(pedido):
+    """
+    (fecha, estado, total) del pedido tal como está cargado, o None si
+    falta algún campo (instancia nueva o cargada con only()/defer()).
+    """
+    datos = pedido.__dict__
+    fecha_pedido, estado, total = (datos.get('fecha_pedido'), datos.get('estado_pedido'), datos.get('total_pedido'))
+    if fecha_pedido is None or estado is None or total is None:
+        return None
+    return (fecha_local(fecha_pedido), estado, total)
+
+
+def lineas_de_pedidos(pedidos_ids):
+    """{pedido_id: [(producto_id, categoria_id, unidades, monto), ...]} en una consulta."""
+    lineas = defaultdict(list)
+    filas = (
+        DetallePedido.objects.filter(pedido_id__in=pedidos_ids)
+        .order_by()
+        .values_list('pedido_id', 'producto_id', 'producto__categoria_id', 'cantidad', 'precio_compra')
+    )
+    for pedido_id, producto_id, categoria_id, cantidad, precio in filas:
+        lineas[pedido_id].append((producto_id, categoria_id, cantidad, cantidad * precio))
+    return lineas
+
+
+def _sumar(modelo, claves, deltas, extra=None):
+    """
+    Suma `deltas` a la fila de `claves` con expresiones F (atómico en la
+    base, sin leer antes). Crea la fila si no existe y el aporte es
+    positivo; elimina la fila que queda en cero.
+    """
+    cambios = {campo: F(campo) + delta for campo, delta in deltas.items()}
+    cambios.update(extra or {})
+    if modelo.objects.filter(**claves).update(**cambios):
+        primer_campo = next(iter(deltas))
+        if deltas[primer_campo] < 0:
+            modelo.objects.filter(**claves, **{primer_campo: 0}).delete()
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        # Restar de una fila inexistente: el rollup ya estaba desfasado
+        logger.warning(f'{modelo.__name__} sin fila para {claves}; ejecute reconstruir_rollups')
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **deltas, **(extra or {}))
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        modelo.objects.filter(**claves).update(**cambios)
+
+
+def aplicar_movimientos(movimientos, lineas=None):
+    """
+    Aplica los movimientos a VentaDiaria y VentaDiariaProducto. `lineas`
+    ({pedido_id: [...]}) se consulta si no se entrega. Agrupa los deltas por
+    fila, de modo que N pedidos del mismo día y estado son un solo UPDATE.
+    """
+    if lineas is None:
+        lineas = lineas_de_pedidos({pedido_id for pedido_id, _, _ in movimientos})
+
+    ventas = defaultdict(lambda: [0, 0])
+    productos = defaultdict(lambda: [None, 0, 0])
+    for pedido_id, antes, despues in movimientos:
+        for signo, datos in ((-1, antes), (1, despues)):
+            if datos is None:
+                continue
+            fecha, estado, total = datos
+            venta = ventas[(fecha, estado)]
+            venta[0] += signo
+            venta[1] += signo * total
+            for producto_id, categoria_id, unidades, monto in lineas.get(pedido_id, ()):
+                producto = productos[(fecha, estado, producto_id)]
+                producto[0] = categoria_id
+                producto[1] += signo * unidades
+                producto[2] += signo * monto
+
+    # Orden fijo de las filas entre procesos concurrentes (sin deadlocks)
+    with transaction.atomic():
+        for (fecha, estado), (pedidos, total) in sorted(ventas.items()):
+            if pedidos or total:
+                _sumar(VentaDiaria, {'fecha': fecha, 'estado_pedido': estado},
+                       {'pedidos': pedidos, 'total': total})
+        for (fecha, estado, producto_id), (categoria_id, unidades, monto) in sorted(productos.items()):
+            if unidades or monto:
+                _sumar(VentaDiariaProducto,
+                       {'fecha': fecha, 'estado_pedido': estado, 'producto_id': producto_id},
+                       {'unidades': unidades, 'monto': monto}, extra={'categoria_id': categoria_id})
+
+
+def programar_movimientos(movimientos, lineas=None):
+    """
+    Aplica los movimientos cuando la transacción actual confirme (los
+    detalles del pedido ya existen y un rollback no deja rollups falsos).
+    Un error aquí no afecta al pedido ya confirmado: se registra y el día
+    se repara con reconstruir_rollups.
+    """
+    movimientos = [movimiento for movimiento in movimientos if movimiento[1] != movimiento[2]]
+    if not movimientos:
+        return
+
+    def aplicar():
+        try:
+            aplicar_movimientos(movimientos, lineas)
+        except DatabaseError as error:
+            logger.error(f'No se pudieron actualizar los rollups: {error}; ejecute reconstruir_rollups')
+
+    transaction.on_commit(aplicar)
+
+
+def programar_recalculo(*fechas):
+    """
+    Recalcula los días indicados cuando la transacción actual confirme
+    (los detalles del pedido ya existen y un rollback no deja rollups falsos).
+    """
+    pendientes = sorted(set(fechas))
+    transaction.on_commit(lambda: [recalcular_dia(fecha) for fecha in pendientes])
+
+
+def recalcular_dias_de_pedidos(pedidos):
+    """
+    Programa el recálculo completo de los días de un conjunto de pedidos.
+    Se usa cuando cambian los detalles de pedidos existentes (admin) o tras
+    un queryset.update() arbitrario, que no dispara las señales de Pedido.
+    """
+    fechas = {fecha_local(fecha_pedido) for fecha_pedido in pedidos.values_list('fecha_pedido', flat=True)}
+    if fechas:
+        programar_recalculo(*fechas)
+
+
+def reconstruir_rollups(desde=None, hasta=None):
+    """
+    Reconstruye los rollups de todos los días con pedidos (o del rango
+    indicado). Retorna la cantidad de días procesados.
+    """
+    pedidos = Pedido.objects.all()
+    if desde:
+        pedidos = pedidos.filter(fecha_pedido__gte=rango_del_dia(desde)[0])
+    if hasta:
+        pedidos = pedidos.filter(fecha_pedido__lt=rango_del_dia(hasta)[1])
+
+    fechas = list(
+        pedidos
+        .annotate(dia=TruncDate('fecha_pedido', tzinfo=timezone.get_current_timezone()))
+        .values_list('dia', flat=True)
+        .order_by('dia')
+        .distinct()
+    )
+
+    # Días del rango que ya no tienen pedidos
+    rollups = VentaDiaria.objects.all()
+    if desde:
+        rollups = rollups.filter(fecha__gte=desde)
+    if hasta:
+        rollups = rollups.filter(fecha__lte=hasta)
+    rollups.exclude(fecha__in=fechas).delete()
+    productos = VentaDiariaProducto.objects.all()
+    if desde:
+        productos = productos.filter(fecha__gte=desde)
+    if hasta:
+        productos = productos.filter(fecha__lte=hasta)
+    productos.exclude(fecha__in=fechas).delete()
+
+    for fecha in fechas:
+        recalcular_dia(fecha)
+    return len(fechas)
@@ -227,31 +227,27 @@ class ProductoSerializer(serializers.ModelSerializer):
             return None
     
     def get_ofertas_activas(self, obj):
-        """Obtiene las ofertas activas del producto"""
-        now = timezone.now()
-        ofertas = obj.ofertas.filter(
-            fecha_inicio__lte=now,
-            fecha_fin__gte=now,
-            activa=True
-        )
+        """
+        Obtiene las ofertas activas del producto.
+        Usa el Prefetch 'ofertas_vigentes' de la vista si está disponible.
+        """
+        ofertas = getattr(obj, 'ofertas_vigentes', None)
+        if ofertas is None:
+            now = timezone.now()
+            ofertas = obj.ofertas.filter(
+                fecha_inicio__lte=now,
+                fecha_fin__gte=now,
+                activa=True
+            )
         return OfertaSerializer(ofertas, many=True, context=self.context).data
     
     def get_precio_final(self, obj):
-        """Calcula el precio final (con oferta si existe)"""
-        now = timezone.now()
-        oferta = obj.ofertas.filter(
-            fecha_inicio__lte=now,
-            fecha_fin__gte=now,
-            activa=True
-        ).first()
-        
-        if oferta:
-            return float(oferta.precio_oferta)
-        return float(obj.precio_unitario)
+        """Precio final (con oferta si existe), leído de con_precio_vigente()"""
+        return float(obj.precio_vigente)
     
     def get_tiene_oferta(self, obj):
         """Verifica si el producto tiene ofertas activas"""
-        return obj.tiene_oferta_activa
+        return obj.tiene_oferta_vigente
 
 
 class ProductoListSerializer(serializers.ModelSerializer):
@@ -308,48 +304,45 @@ class ProductoListSerializer(serializers.ModelSerializer):
             return None
     
     def get_precio_final(self, obj):
-        """Calcula el precio final (con oferta si existe)"""
-        now = timezone.now()
-        oferta = obj.ofertas.filter(
-            fecha_inicio__lte=now,
-            fecha_fin__gte=now,
-            activa=True
-        ).first()
-        
-        if oferta:
-            return float(oferta.precio_oferta)
-        return float(obj.precio_unitario)
+        """Precio final (con oferta si existe), leído de con_precio_vigente()"""
+        return float(obj.precio_vigente)
     
     def get_tiene_oferta(self, obj):
         """Verifica si el producto tiene ofertas activas"""
-        return obj.tiene_oferta_activa
+        return obj.tiene_oferta_vigente
     
     def get_descuento_porcentaje(self, obj):
         """Retorna el porcentaje de descuento"""
-        now = timezone.now()
-        oferta = obj.ofertas.filter(
-            fecha_inicio__lte=now,
-            fecha_fin__gte=now,
-            activa=True
-        ).first()
-        
-        if oferta and obj.precio_unitario > 0:
-            descuento = ((obj.precio_unitario - oferta.precio_oferta) / obj.precio_unitario) * 100
-            return round(descuento, 0)
-        return 0
+        return round(obj.descuento_vigente, 0)
     
     def get_ahorro(self, obj):
         """Retorna el ahorro en pesos"""
-        now = timezone.now()
-        oferta = obj.ofertas.filter(
-            fecha_inicio__lte=now,
-            fecha_fin__gte=now,
-            activa=True
-        ).first()
-        
-        if oferta:
-            return float(obj.precio_unitario - oferta.precio_oferta)
-        return 0
+        return float(obj.ahorro_vigente)
+
+
+class ProductoFiltroSerializer(serializers.Serializer):
+    """Valida los filtros (query string) del listado público de productos"""
+    categoria_id = serializers.IntegerField(required=False, min_value=1)
+    precio_min = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0)
+    precio_max = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0)
+    en_stock = serializers.BooleanField(required=False, default=False)
+    en_oferta = serializers.BooleanField(required=False, default=False)
+    
+    def validate(self, data):
+        """Valida que el rango de precios sea coherente"""
+        precio_min = data.get('precio_min')
+        precio_max = data.get('precio_max')
+        if precio_min is not None and precio_max is not None and precio_min > precio_max:
+            raise serializers.ValidationError({
+                'precio_max': 'El precio máximo debe ser mayor o igual al precio mínimo.'
+            })
+        return data
+
+
+class ProductoBusquedaSerializer(serializers.Serializer):
+    """Valida los parámetros de la búsqueda de productos"""
+    q = serializers.CharField(max_length=100, trim_whitespace=True)
+    limite = serializers.IntegerField(required=False, min_value=1, max_value=50, default=20)
 
 
 # ===== SERIALIZERS PARA CARRITO =====
@@ -399,6 +392,26 @@ class CarritoSerializer(serializers.Serializer):
     cantidad_items = serializers.IntegerField(read_only=True)
 
 
+class CarritoOperacionSerializer(serializers.Serializer):
+    """Una operación del lote: set (fija la cantidad), add (suma) o remove (quita)"""
+    op = serializers.ChoiceField(choices=['set', 'add', 'remove'])
+    producto_id = serializers.IntegerField()
+    cantidad = serializers.IntegerField(required=False, min_value=0)
+    
+    def validate(self, data):
+        """set y add requieren cantidad (add al menos 1)"""
+        if data['op'] == 'set' and 'cantidad' not in data:
+            raise serializers.ValidationError({'cantidad': 'Requerida para set.'})
+        if data['op'] == 'add' and data.get('cantidad', 0) < 1:
+            raise serializers.ValidationError({'cantidad': 'Debe ser al menos 1 para add.'})
+        return data
+
+
+class CarritoLoteSerializer(serializers.Serializer):
+    """Lote de operaciones para PATCH /api/cart/ (se aplican en orden)"""
+    operaciones = CarritoOperacionSerializer(many=True, allow_empty=False, max_length=100)
+
+
 class CheckoutSerializer(serializers.Serializer):
     """Serializer para procesar el checkout"""
     
@@ -475,7 +488,11 @@ class DetallePedidoSerializer(serializers.ModelSerializer):
 
 
 class PedidoSerializer(serializers.ModelSerializer):
-    """Serializer completo para mostrar un pedido"""
+    """
+    Serializer completo para mostrar un pedido.
+    Usar con Pedido.objects.con_detalles() para que los detalles y sus
+    productos lleguen precargados (sin una consulta por línea).
+    """
     detalles = DetallePedidoSerializer(many=True, read_only=True)
     estado_display = serializers.CharField(source='get_estado_pedido_display', read_only=True)
     metodo_pago_display = serializers.CharField(source='get_metodo_pago_display', read_only=True)
@@ -515,7 +532,6 @@ class PedidoSerializer(serializers.ModelSerializer):
 class PedidoListSerializer(serializers.ModelSerializer):
     """Serializer simplificado para listar pedidos"""
     estado_display = serializers.CharField(source='get_estado_pedido_display', read_only=True)
-    cantidad_items = serializers.SerializerMethodField()
     
     class Meta:
         model = Pedido
@@ -525,12 +541,9 @@ class PedidoListSerializer(serializers.ModelSerializer):
             'total_pedido',
             'estado_pedido',
             'estado_display',
-            'cantidad_items'
+            'cantidad_items',
+            'resumen_items'
         ]
-    
-    def get_cantidad_items(self, obj):
-        """Cuenta la cantidad total de items en el pedido"""
-        return sum(detalle.cantidad for detalle in obj.detalles.all())
 
 
 # ===== SERIALIZER PARA ACTUALIZAR PERFIL =====
@@ -0,0 +1,71 @@
+# miapp/sesion_logic.py
+import threading
+from collections import Counter
+
+
+# ===== CONTADORES DE ESCRITURAS DE SESIÓN =====
+#
+# Contadores en memoria del proceso (sin consultas ni cache extra por request).
+# Los usa `manage.py reproducir_trafico` para comparar escrituras de sesión
+# realizadas y evitadas sobre un tráfico grabado. El middleware no está en
+# settings.MIDDLEWARE: el comando lo instala con middleware_con_contador().
+
+EVENTOS_SESION = ('peticiones', 'sesion_leida', 'sesion_escrita', 'escrituras_evitadas')
+
+_contadores = Counter()
+_candado = threading.Lock()
+
+
+def registrar_escritura_evitada(request):
+    """Marca que el request no escribió la sesión porque el carrito no cambió."""
+    request = getattr(request, '_request', request)
+    request._escrituras_sesion_evitadas = getattr(request, '_escrituras_sesion_evitadas', 0) + 1
+
+
+def estadisticas_sesion():
+    """Totales y promedios por request de lecturas, escrituras y escrituras evitadas."""
+    with _candado:
+        contadores = {evento: _contadores[evento] for evento in EVENTOS_SESION}
+    peticiones = contadores['peticiones']
+    return {
+        **contadores,
+        'escrituras_por_peticion': round(contadores['sesion_escrita'] / peticiones, 4) if peticiones else None,
+        'evitadas_por_peticion': round(contadores['escrituras_evitadas'] / peticiones, 4) if peticiones else None,
+    }
+
+
+def reiniciar_estadisticas_sesion():
+    with _candado:
+        _contadores.clear()
+
+
+def middleware_con_contador(middleware):
+    """Copia de la lista de middleware con ContadorSesionMiddleware antes de SessionMiddleware."""
+    middleware = [nombre for nombre in middleware if nombre != 'miapp.sesion_logic.ContadorSesionMiddleware']
+    posicion = middleware.index('django.contrib.sessions.middleware.SessionMiddleware')
+    return middleware[:posicion] + ['miapp.sesion_logic.ContadorSesionMiddleware'] + middleware[posicion:]
+
+
+class ContadorSesionMiddleware:
+    """
+    Cuenta por request si la sesión se leyó, si se escribió y cuántas
+    escrituras se evitaron. Va antes de SessionMiddleware para observar la
+    sesión después de que esta decidió guardarla.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        sesion = getattr(request, 'session', None)
+        eventos = Counter(peticiones=1)
+        if sesion is not None:
+            eventos['sesion_leida'] += int(sesion.accessed)
+            eventos['sesion_escrita'] += int(sesion.modified)
+        eventos['escrituras_evitadas'] += getattr(request, '_escrituras_sesion_evitadas', 0)
+
+        with _candado:
+            _contadores.update(eventos)
+        return response
@@ -0,0 +1,100 @@
+# miapp/signals.py
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .autocompletado_logic import indice_autocompletado
+from .catalogo_logic import invalidar_catalogo
+from .models import Producto, Oferta, Categoria, Pedido
+from .rollup_logic import (
+    CAMPOS_ROLLUP, datos_rollup, fecha_local, lineas_de_pedidos, programar_movimientos, programar_recalculo,
+)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Oferta)
+@receiver(post_delete, sender=Oferta)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_catalogo_al_cambiar(sender, **kwargs):
+    """Cualquier cambio de precio, stock, oferta o categoría invalida los snapshots del catálogo."""
+    invalidar_catalogo()
+
+
+def _datos_indexados(instance):
+    """
+    Nombre, estado activo y categoría tal como están cargados en la instancia.
+    Se lee __dict__ para no disparar consultas por campos diferidos (only()).
+    """
+    datos = instance.__dict__
+    if isinstance(instance, Producto):
+        return (datos.get('nombre'), datos.get('activo'), datos.get('categoria_id'))
+    return (datos.get('nombre'), datos.get('activa'))
+
+
+@receiver(post_init, sender=Producto)
+@receiver(post_init, sender=Categoria)
+def recordar_datos_indexados(sender, instance, **kwargs):
+    """Guarda los datos indexados al cargar la instancia para comparar al guardar."""
+    instance._datos_indexados = _datos_indexados(instance)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Categoria)
+def actualizar_autocompletado(sender, instance, created, **kwargs):
+    """
+    Agrega o actualiza el nombre en el índice de autocompletado. Los guardados
+    que no cambian nombre, estado ni categoría (stock, precio) no lo tocan.
+    """
+    actuales = _datos_indexados(instance)
+    if not created and actuales == getattr(instance, '_datos_indexados', None):
+        return
+    instance._datos_indexados = actuales
+
+    tipo = 'producto' if sender is Producto else 'categoria'
+    objeto_id, nombre = instance.pk, instance.nombre
+    activo = instance.activo if sender is Producto else instance.activa
+    transaction.on_commit(
+        lambda: indice_autocompletado.actualizar(tipo, objeto_id, nombre, activo)
+    )
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Categoria)
+def quitar_de_autocompletado(sender, instance, **kwargs):
+    """Elimina el nombre del índice de autocompletado del proceso."""
+    tipo = 'producto' if sender is Producto else 'categoria'
+    objeto_id = instance.pk
+    transaction.on_commit(lambda: indice_autocompletado.actualizar(tipo, objeto_id, activo=False))
+
+
+@receiver(post_init, sender=Pedido)
+def recordar_datos_rollup(sender, instance, **kwargs):
+    """Guarda fecha, estado y total al cargar el pedido para calcular el delta al guardar."""
+    instance._datos_rollup = datos_rollup(instance)
+
+
+@receiver(post_save, sender=Pedido)
+def actualizar_rollups_pedido(sender, instance, created, update_fields=None, **kwargs):
+    """Mueve el aporte del pedido en los rollups al crearlo o cambiar su estado/total."""
+    if not created and update_fields is not None and not CAMPOS_ROLLUP & set(update_fields):
+        return
+    antes = None if created else getattr(instance, '_datos_rollup', None)
+    despues = datos_rollup(instance)
+    instance._datos_rollup = despues
+    if not created and antes is None:
+        # Instancia cargada sin esos campos: no hay delta confiable
+        programar_recalculo(fecha_local(instance.fecha_pedido))
+        return
+    programar_movimientos([(instance.pk, antes, despues)])
+
+
+@receiver(pre_delete, sender=Pedido)
+def quitar_pedido_de_rollups(sender, instance, **kwargs):
+    """Resta el aporte de un pedido eliminado (las líneas se leen antes de borrarlas)."""
+    antes = datos_rollup(instance)
+    if antes is None:
+        programar_recalculo(fecha_local(instance.fecha_pedido))
+        return
+    programar_movimientos([(instance.pk, antes, None)], lineas_de_pedidos([instance.pk]))
@@ -1,8 +1,10 @@
 # tests.py - COMPLETO Y CORREGIDO
 
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from .models import Producto, Categoria, Pedido, DetallePedido
+from .sesion_logic import middleware_con_contador
 import json
 
 User = get_user_model()
@@ -112,4 +114,1773 @@ class TestsCriticos(TestCase):
         )
         
         # Debe fallar (400 o 404)
-        self.assertIn(response.status_code, [400, 404, 422])
\ No newline at end of file
+        self.assertIn(response.status_code, [400, 404, 422])
+
+class TestsCarritoLogic(TestCase):
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Carrito', activa=True)
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Producto {i}',
+                descripcion='Producto de prueba',
+                precio_unitario=1000,
+                stock_disponible=10,
+                categoria=self.categoria
+            )
+            for i in range(20)
+        ]
+
+    # TEST 6: El carrito se calcula con un número constante de consultas
+    def test_consultas_constantes(self):
+        """Verifica que el cálculo no hace consultas por cada línea del carrito"""
+        from .carrito_logic import calcular_carrito_completo
+
+        carrito_chico = {'items': {str(self.productos[0].id): 1}}
+        carrito_grande = {'items': {str(p.id): 2 for p in self.productos}}
+
+        with self.assertNumQueries(1):
+            calcular_carrito_completo(carrito_chico)
+        with self.assertNumQueries(1):
+            resultado = calcular_carrito_completo(carrito_grande)
+
+        self.assertEqual(resultado['cantidad_items'], 40)
+        self.assertEqual(resultado['total'], 40000)
+
+    # TEST 7: Se aplica la mejor oferta vigente
+    def test_mejor_oferta_vigente(self):
+        """Verifica que se usa el menor precio entre las ofertas vigentes"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .carrito_logic import calcular_carrito_completo
+        from .models import Oferta
+
+        producto = self.productos[0]
+        ahora = timezone.now()
+        for precio in (800, 700):
+            Oferta.objects.create(
+                producto=producto,
+                precio_oferta=precio,
+                fecha_inicio=ahora - timedelta(days=1),
+                fecha_fin=ahora + timedelta(days=1)
+            )
+        Oferta.objects.create(
+            producto=producto,
+            precio_oferta=100,
+            fecha_inicio=ahora - timedelta(days=1),
+            fecha_fin=ahora + timedelta(days=1),
+            activa=False
+        )
+
+        resultado = calcular_carrito_completo({'items': {str(producto.id): 3, 'x': 1, '999999': 1}})
+
+        self.assertEqual(len(resultado['items']), 1)
+        self.assertEqual(resultado['items'][0]['precio_unitario'], 700)
+        self.assertEqual(resultado['total'], 2100)
+
+
+class TestsResumenCarrito(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = Client()
+        self.categoria = Categoria.objects.create(nombre='Resumen', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Lechuga',
+            descripcion='Lechuga de prueba',
+            precio_unitario=1000,
+            stock_disponible=10,
+            categoria=self.categoria
+        )
+        self.client.post('/api/cart/',
+            data=json.dumps({'producto_id': self.producto.id, 'cantidad': 2}),
+            content_type='application/json'
+        )
+
+    def _consultas_catalogo(self):
+        """Ejecuta el resumen y retorna (datos, consultas a productos/ofertas)"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get('/api/cart/summary/')
+        consultas = [
+            q['sql'] for q in contexto.captured_queries
+            if '"productos"' in q['sql'] or '"ofertas"' in q['sql']
+        ]
+        return response.json(), consultas
+
+    # TEST 8: El resumen se sirve desde cache
+    def test_resumen_cacheado(self):
+        """Verifica que el segundo resumen no consulta productos ni ofertas"""
+        datos, consultas = self._consultas_catalogo()
+        self.assertEqual(datos['cantidad_items'], 2)
+        self.assertTrue(consultas)
+
+        datos, consultas = self._consultas_catalogo()
+        self.assertEqual(datos['cantidad_items'], 2)
+        self.assertEqual(float(datos['total']), 2000)
+        self.assertEqual(consultas, [])
+
+    # TEST 9: El resumen se invalida al cambiar el carrito o el precio
+    def test_resumen_invalidado(self):
+        """Verifica que el snapshot se recalcula cuando cambia el carrito o el catálogo"""
+        self._consultas_catalogo()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.precio_unitario = 1500
+            self.producto.save()
+        datos, consultas = self._consultas_catalogo()
+        self.assertEqual(float(datos['total']), 3000)
+        self.assertTrue(consultas)
+
+        self.client.put(f'/api/cart/{self.producto.id}/',
+            data=json.dumps({'cantidad': 3}),
+            content_type='application/json'
+        )
+        datos, _ = self._consultas_catalogo()
+        self.assertEqual(datos['cantidad_items'], 3)
+
+
+class TestsPrecioVigente(TestCase):
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Oferta
+
+        self.client = Client()
+        self.categoria = Categoria.objects.create(nombre='Precios', activa=True)
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Producto {i}',
+                descripcion='Producto de prueba',
+                precio_unitario=1000,
+                stock_disponible=5,
+                categoria=self.categoria
+            )
+            for i in range(10)
+        ]
+        ahora = timezone.now()
+        Oferta.objects.create(
+            producto=self.productos[0],
+            precio_oferta=750,
+            fecha_inicio=ahora - timedelta(hours=1),
+            fecha_fin=ahora + timedelta(hours=1)
+        )
+        # Oferta programada (todavía no empieza)
+        Oferta.objects.create(
+            producto=self.productos[1],
+            precio_oferta=500,
+            fecha_inicio=ahora + timedelta(days=1),
+            fecha_fin=ahora + timedelta(days=2)
+        )
+
+    # TEST 10: El listado público no consulta ofertas por producto
+    def test_listado_sin_consultas_por_fila(self):
+        """Verifica que el listado usa una cantidad fija de consultas"""
+        # Firma del catálogo (ETag) + listado con el precio vigente anotado
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/public/products/')
+
+        datos = {p['id']: p for p in response.json()['results']}
+        con_oferta = datos[self.productos[0].id]
+        self.assertTrue(con_oferta['tiene_oferta'])
+        self.assertEqual(con_oferta['precio_final'], 750)
+        self.assertEqual(con_oferta['descuento_porcentaje'], 25)
+        self.assertEqual(con_oferta['ahorro'], 250)
+
+        programada = datos[self.productos[1].id]
+        self.assertFalse(programada['tiene_oferta'])
+        self.assertEqual(programada['precio_final'], 1000)
+
+    # TEST 11: El detalle usa el precio vigente
+    def test_detalle_precio_vigente(self):
+        """Verifica precio final y ofertas activas en el detalle del producto"""
+        response = self.client.get(f'/api/public/products/{self.productos[0].id}/')
+        datos = response.json()
+        self.assertEqual(datos['precio_final'], 750)
+        self.assertEqual(len(datos['ofertas_activas']), 1)
+
+
+class TestsListadoPaginado(TestCase):
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import Oferta
+
+        self.client = Client()
+        self.verduras = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.frutas = Categoria.objects.create(nombre='Frutas', activa=True)
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Verdura {i}',
+                descripcion='Producto de prueba',
+                precio_unitario=1000 + i * 100,
+                stock_disponible=i % 2,
+                categoria=self.verduras
+            )
+            for i in range(7)
+        ]
+        self.fruta = Producto.objects.create(
+            nombre='Manzana',
+            descripcion='Producto de prueba',
+            precio_unitario=5000,
+            stock_disponible=3,
+            categoria=self.frutas
+        )
+        ahora = timezone.now()
+        Oferta.objects.create(
+            producto=self.fruta,
+            precio_oferta=900,
+            fecha_inicio=ahora - timedelta(hours=1),
+            fecha_fin=ahora + timedelta(hours=1)
+        )
+
+    def _ids(self, url):
+        return [p['id'] for p in self.client.get(url).json()['results']]
+
+    # TEST 12: El cursor recorre todo el catálogo sin repetir productos
+    def test_paginacion_por_cursor(self):
+        """Verifica que las páginas se encadenan con el cursor y respetan page_size"""
+        vistos = []
+        url = '/api/public/products/?page_size=3'
+        while url:
+            datos = self.client.get(url).json()
+            self.assertLessEqual(len(datos['results']), 3)
+            vistos.extend(p['id'] for p in datos['results'])
+            url = datos['next']
+
+        self.assertEqual(len(vistos), 8)
+        self.assertEqual(len(set(vistos)), 8)
+
+    # TEST 13: Los filtros se resuelven en SQL
+    def test_filtros(self):
+        """Verifica filtros por categoría, precio final, stock y oferta"""
+        self.assertEqual(
+            set(self._ids(f'/api/public/products/?categoria_id={self.frutas.id}')),
+            {self.fruta.id}
+        )
+        # La manzana cuesta 5000 pero su precio final con oferta es 900
+        self.assertEqual(
+            set(self._ids('/api/public/products/?precio_max=1000')),
+            {self.fruta.id, self.productos[0].id}
+        )
+        self.assertEqual(
+            len(self._ids('/api/public/products/?en_stock=true')),
+            4
+        )
+        self.assertEqual(
+            self._ids('/api/public/products/?en_oferta=true'),
+            [self.fruta.id]
+        )
+        response = self.client.get('/api/public/products/?precio_min=500&precio_max=100')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestsBusquedaProductos(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        verduras = Categoria.objects.create(nombre='Verduras', activa=True)
+        frutas = Categoria.objects.create(nombre='Frutas', activa=True)
+        self.tomate = Producto.objects.create(
+            nombre='Tomate Cherry', descripcion='Tomate pequeño y dulce',
+            precio_unitario=1500, stock_disponible=10, categoria=verduras
+        )
+        self.cebolla = Producto.objects.create(
+            nombre='Cebolla Morada', descripcion='Ideal para ensaladas con tomate',
+            precio_unitario=900, stock_disponible=10, categoria=verduras
+        )
+        self.manzana = Producto.objects.create(
+            nombre='Manzana Roja', descripcion='Fruta fresca',
+            precio_unitario=1200, stock_disponible=10, categoria=frutas
+        )
+
+    # TEST 14: La búsqueda combina palabras y busca también por categoría
+    def test_busqueda_por_texto(self):
+        """Verifica que todas las palabras deben coincidir (nombre, descripción o categoría)"""
+        response = self.client.get('/api/public/products/search/?q=tomate')
+        self.assertEqual(response.status_code, 200)
+        ids = {p['id'] for p in response.json()['resultados']}
+        self.assertEqual(ids, {self.tomate.id, self.cebolla.id})
+
+        response = self.client.get('/api/public/products/search/?q=tomate cherry')
+        self.assertEqual([p['id'] for p in response.json()['resultados']], [self.tomate.id])
+
+        response = self.client.get('/api/public/products/search/?q=frutas')
+        self.assertEqual([p['id'] for p in response.json()['resultados']], [self.manzana.id])
+
+    # TEST 15: Sugerencias por prefijo y validación del parámetro q
+    def test_sugerencias_y_validacion(self):
+        """Verifica las sugerencias mientras se escribe y que q sea obligatorio"""
+        response = self.client.get('/api/public/products/search/?q=manz')
+        self.assertEqual(response.json()['sugerencias'], ['Manzana Roja'])
+
+        response = self.client.get('/api/public/products/search/')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestsAutocompletado(TestCase):
+
+    def setUp(self):
+        from .autocompletado_logic import indice_autocompletado
+
+        self.client = Client()
+        self.indice = indice_autocompletado
+        self.indice.reiniciar()
+        self.verduras = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.tomate = Producto.objects.create(
+            nombre='Tomate Cherry', descripcion='Tomate pequeño',
+            precio_unitario=1500, stock_disponible=10, categoria=self.verduras
+        )
+        Producto.objects.create(
+            nombre='Plátano', descripcion='Plátano de Ecuador',
+            precio_unitario=900, stock_disponible=10, categoria=self.verduras
+        )
+
+    def _textos(self, q):
+        response = self.client.get('/api/public/products/suggest/', {'q': q})
+        return [s['texto'] for s in response.json()['sugerencias']]
+
+    # TEST 16: Prefijos normalizados y sin consultas una vez construido el índice
+    def test_sugerencias_sin_consultas(self):
+        """Verifica la búsqueda sin tildes/mayúsculas, por palabra interna y sin tocar la BD"""
+        self.assertEqual(self._textos('PLATA'), ['Plátano'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self._textos('cher'), ['Tomate Cherry'])
+            self.assertEqual(self._textos('ver'), ['Verduras'])
+            self.assertEqual(self._textos(''), [])
+
+    # TEST 17: El índice se actualiza con las señales al guardar o eliminar
+    def test_actualizacion_incremental(self):
+        """Verifica que productos nuevos, renombrados o inactivos se reflejan sin reconstruir"""
+        self._textos('tom')
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(
+                nombre='Tomate Larga Vida', descripcion='Tomate',
+                precio_unitario=1200, stock_disponible=5, categoria=self.verduras
+            )
+            self.tomate.activo = False
+            self.tomate.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._textos('tom'), ['Tomate Larga Vida'])
+
+    # TEST 55: Los cambios de stock no reconstruyen el índice; los de otro proceso sí
+    @override_settings(AUTOCOMPLETADO_REVISION_VERSION=0)
+    def test_version_propia_del_indice(self):
+        """Verifica que reservas y guardados de stock no invalidan, y que no se omiten cambios ajenos"""
+        from .autocompletado_logic import invalidar_nombres
+
+        self._textos('tom')
+        Producto.objects.reservar({self.tomate.id: 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            tomate = Producto.objects.get(pk=self.tomate.pk)
+            tomate.stock_disponible = 3
+            tomate.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._textos('tom'), ['Tomate Cherry'])
+
+        # Otro proceso renombra un producto (solo sube la versión compartida)
+        Producto.objects.filter(pk=self.tomate.pk).update(nombre='Tomate Perita')
+        invalidar_nombres()
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(
+                nombre='Tomatillo', descripcion='Tomate', precio_unitario=800,
+                stock_disponible=5, categoria=self.verduras
+            )
+        with self.assertNumQueries(2):
+            self.assertEqual(self._textos('tom'), ['Tomate Perita', 'Tomatillo'])
+
+    # TEST 62: Con DatabaseCache la versión compartida se revisa solo cada N segundos
+    def test_revision_espaciada_con_cache_en_bd(self):
+        """Verifica cero consultas por tecla dentro del intervalo y una sola revisión al vencer"""
+        from unittest import mock
+        from django.core.management import call_command
+
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_tests_autocompletado',
+        }}
+        with override_settings(CACHES=caches, AUTOCOMPLETADO_REVISION_VERSION=5):
+            call_command('createcachetable', verbosity=0)
+            with mock.patch('miapp.autocompletado_logic.time.monotonic', return_value=1000.0):
+                self.assertEqual(self._textos('tom'), ['Tomate Cherry'])
+                with self.assertNumQueries(0):
+                    for texto in ('p', 'pl', 'pla', 'plat'):
+                        self.assertEqual(self._textos(texto), ['Plátano'])
+            with mock.patch('miapp.autocompletado_logic.time.monotonic', return_value=1006.0):
+                # Vencido el intervalo: un cache.get (una consulta) y el índice sigue vigente
+                with self.assertNumQueries(1):
+                    self._textos('ver')
+                    self._textos('verd')
+
+
+class TestsRollupsVentas(TestCase):
+
+    def setUp(self):
+        from decimal import Decimal
+
+        self.client = Client()
+        self.admin = User.objects.create_superuser(
+            correo='admin@test.com', password='admin123', nombre='Admin'
+        )
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Lechuga', descripcion='Lechuga fresca',
+            precio_unitario=1000, stock_disponible=100, categoria=categoria
+        )
+        self.datos_pedido = {
+            'nombre_cliente': 'Cliente', 'correo_cliente': 'c@test.com',
+            'telefono_cliente': '912345678', 'direccion': 'Calle 1',
+            'region': 'RM', 'comuna': 'Santiago',
+        }
+        self.precio = Decimal('1000')
+
+    def _crear_pedido(self, cantidad):
+        from django.db import transaction
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                pedido = Pedido.objects.create(total_pedido=self.precio * cantidad, **self.datos_pedido)
+                DetallePedido.objects.create(
+                    pedido=pedido, producto=self.producto,
+                    cantidad=cantidad, precio_compra=self.precio
+                )
+        return pedido
+
+    # TEST 18: Los rollups siguen al pedido al crearse y al cambiar de estado
+    def test_rollups_incrementales(self):
+        """Verifica creación, cambio de estado y cancelación masiva (update)"""
+        from django.utils import timezone
+        from .models import VentaDiaria, VentaDiariaProducto
+        from .rollup_logic import recalcular_dias_de_pedidos
+
+        hoy = timezone.localdate()
+        pedido = self._crear_pedido(3)
+        self._crear_pedido(2)
+        venta = VentaDiaria.objects.get(fecha=hoy, estado_pedido='pendiente_pago')
+        self.assertEqual((venta.pedidos, venta.total), (2, 5000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.marcar_como_pagado()
+        pagado = VentaDiariaProducto.objects.get(fecha=hoy, estado_pedido='pagado')
+        self.assertEqual((pagado.unidades, pagado.monto), (3, 3000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pedido.objects.update(estado_pedido='cancelado')
+            recalcular_dias_de_pedidos(Pedido.objects.all())
+        self.assertEqual(
+            list(VentaDiaria.objects.values_list('estado_pedido', 'pedidos')),
+            [('cancelado', 2)]
+        )
+
+    # TEST 19: El dashboard se arma desde los rollups con pocas consultas
+    def test_dashboard_desde_rollups(self):
+        """Verifica las métricas y que el número de consultas no depende de los días"""
+        from django.core.management import call_command
+        from .dashboard_logic import metricas_dashboard
+        from .models import VentaDiaria
+
+        pedido = self._crear_pedido(4)
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.marcar_como_pagado()
+
+        VentaDiaria.objects.all().delete()
+        call_command('reconstruir_rollups', stdout=open('/dev/null', 'w'))
+
+        with self.assertNumQueries(7):
+            metricas = metricas_dashboard()
+            self.assertEqual(metricas['ventas_mes'], 4000)
+            self.assertEqual(metricas['ventas_data'][-1], 4000.0)
+            self.assertEqual(metricas['productos_vendidos'][0]['nombre'], 'Lechuga')
+
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/dashboard/')
+        self.assertEqual(response.status_code, 200)
+
+    # TEST 20: La agregación directa sobre pedidos coincide con los rollups
+    def test_buckets_desde_pedidos(self):
+        """Verifica que ambas fuentes entregan las mismas métricas y la de pedidos usa una sola consulta"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .dashboard_logic import buckets_desde_pedidos, metricas_dashboard
+
+        pagado = self._crear_pedido(4)
+        self._crear_pedido(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            pagado.marcar_como_pagado()
+
+        hoy = timezone.localdate()
+        with self.assertNumQueries(1):
+            buckets = buckets_desde_pedidos(hoy - timedelta(days=89), hoy)
+        self.assertEqual(buckets[hoy]['estados'], {'pagado': 1, 'pendiente_pago': 1})
+        self.assertEqual(buckets[hoy]['total'], 4000)
+
+        desde_pedidos = metricas_dashboard(dias=90, fuente='pedidos')
+        desde_rollups = metricas_dashboard(dias=90, fuente='rollups')
+        for clave in ('ventas_mes', 'pedidos_mes', 'ventas_data', 'estados_data', 'categorias_data'):
+            self.assertEqual(desde_pedidos[clave], desde_rollups[clave])
+        self.assertEqual(len(desde_pedidos['ventas_data']), 90)
+
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/dashboard/?dias=999')
+        self.assertEqual(response.context['dias'], 30)
+
+    # TEST 56: Los deltas incrementales coinciden con la reconstrucción y no releen el día
+    def test_deltas_coinciden_con_reconstruccion(self):
+        """Verifica creación, transición masiva, cambio de total y eliminación contra reconstruir_rollups"""
+        from django.test.utils import CaptureQueriesContext
+        from django.db import connection
+        from .models import VentaDiaria, VentaDiariaProducto
+        from .pedido_logic import transicionar_pedidos
+        from .rollup_logic import reconstruir_rollups
+
+        pedidos = [self._crear_pedido(cantidad) for cantidad in (1, 2, 3, 4, 5)]
+
+        with CaptureQueriesContext(connection) as consultas:
+            with self.captureOnCommitCallbacks(execute=True):
+                transicionar_pedidos(Pedido.objects.filter(id__in=[p.id for p in pedidos[:3]]), 'pagado')
+        # Después del UPDATE de estados, el rollup no vuelve a leer los pedidos del día
+        ultimo_update = max(i for i, q in enumerate(consultas.captured_queries) if 'UPDATE "pedidos"' in q['sql'])
+        self.assertFalse([
+            q['sql'] for q in consultas.captured_queries[ultimo_update + 1:] if 'FROM "pedidos"' in q['sql']
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transicionar_pedidos(Pedido.objects.filter(id=pedidos[0].id), 'cancelado')
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = Pedido.objects.get(pk=pedidos[3].pk)
+            pedido.total_pedido = 9999
+            pedido.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Pedido.objects.get(pk=pedidos[4].pk).delete()
+
+        def estado_rollups():
+            return (
+                sorted(VentaDiaria.objects.values_list('fecha', 'estado_pedido', 'pedidos', 'total')),
+                sorted(VentaDiariaProducto.objects.values_list('fecha', 'estado_pedido', 'producto_id', 'unidades', 'monto')),
+            )
+
+        incremental = estado_rollups()
+        reconstruir_rollups()
+        self.assertEqual(incremental, estado_rollups())
+        self.assertEqual(
+            [(estado, pedidos) for _, estado, pedidos, _ in incremental[0]],
+            [('cancelado', 1), ('pagado', 2), ('pendiente_pago', 1)]
+        )
+
+
+@override_settings(DASHBOARD_CACHE_TTL=30, DASHBOARD_REFRESCO_ASINCRONO=False)
+class TestsCacheDashboard(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(User.objects.create_superuser(
+            correo='admin@test.com', password='admin123', nombre='Admin'
+        ))
+
+    # TEST 21: Vigente se sirve del cache; obsoleto lo recalcula un solo proceso
+    def test_stale_while_revalidate(self):
+        """Verifica aciertos sin consultas, recálculo con candado y estadísticas"""
+        from unittest import mock
+        from django.core.cache import cache
+        from .dashboard_logic import obtener_dashboard
+
+        primera = obtener_dashboard(dias=7)
+        with self.assertNumQueries(0):
+            self.assertEqual(obtener_dashboard(dias=7)['version'], primera['version'])
+
+        # Con el candado tomado por otro proceso se sirve el valor obsoleto
+        with mock.patch('miapp.dashboard_logic.reloj.time', return_value=primera['calculado_en'] + 60):
+            cache.add('dashboard:rollups:7:recalculando', 1)
+            with self.assertNumQueries(0):
+                self.assertEqual(obtener_dashboard(dias=7)['version'], primera['version'])
+            cache.delete('dashboard:rollups:7:recalculando')
+            recalculada = obtener_dashboard(dias=7)
+        self.assertGreater(recalculada['calculado_en'], primera['calculado_en'])
+
+        estadisticas = self.client.get('/admin/dashboard/metrics/').json()
+        self.assertEqual(
+            (estadisticas['aciertos'], estadisticas['obsoletos'], estadisticas['fallos'], estadisticas['recalculos']),
+            (1, 2, 1, 2)
+        )
+        self.assertEqual(estadisticas['tasa_aciertos'], 0.75)
+
+    # TEST 22: El endpoint JSON solo envía lo que cambió desde la versión del navegador
+    def test_datos_por_delta(self):
+        """Verifica respuesta completa, vacía y parcial según la versión enviada"""
+        from unittest import mock
+        from .dashboard_logic import obtener_dashboard
+
+        completo = self.client.get('/admin/dashboard/data/?dias=7').json()
+        self.assertTrue(completo['completo'])
+        self.assertEqual(completo['cambios']['total_productos'], 0)
+
+        sin_cambios = self.client.get(f"/admin/dashboard/data/?dias=7&version={completo['version']}").json()
+        self.assertEqual(sin_cambios['cambios'], {})
+
+        Categoria.objects.create(nombre='Frutas', activa=True).productos.create(
+            nombre='Pera', descripcion='Pera', precio_unitario=800, stock_disponible=3
+        )
+        entrada = obtener_dashboard(dias=7)
+        with mock.patch('miapp.dashboard_logic.reloj.time', return_value=entrada['calculado_en'] + 60), \
+                mock.patch('miapp.dashboard_logic.reloj.time_ns', return_value=(entrada['version'] + 1) * 1_000_000):
+            obtener_dashboard(dias=7)
+        delta = self.client.get(f"/admin/dashboard/data/?dias=7&version={completo['version']}").json()
+        self.assertFalse(delta['completo'])
+        self.assertEqual(delta['cambios'], {'total_productos': 1})
+
+    # TEST 63: Sin valor en cache solo el dueño del candado calcula; los demás esperan
+    def test_fallo_con_candado(self):
+        """Verifica que sin entrada y con el candado tomado se espera el valor ajeno sin consultas"""
+        from unittest import mock
+        from django.core.cache import cache
+        from .dashboard_logic import obtener_dashboard
+
+        ajena = {'datos': {}, 'version': 1, 'calculado_en': 0, 'duracion_ms': 0}
+        cache.add('dashboard:rollups:7:recalculando', 1)
+
+        def otro_proceso_termina(segundos):
+            cache.set('dashboard:rollups:7', ajena)
+
+        with mock.patch('miapp.dashboard_logic.reloj.sleep', side_effect=otro_proceso_termina):
+            with self.assertNumQueries(0):
+                self.assertEqual(obtener_dashboard(dias=7), ajena)
+
+        # Si el otro proceso no termina a tiempo se calcula sin guardar ni liberar su candado
+        cache.delete('dashboard:rollups:7')
+        with override_settings(DASHBOARD_CACHE_ESPERA=0):
+            self.assertIn('ventas_data', obtener_dashboard(dias=7)['datos'])
+        self.assertIsNone(cache.get('dashboard:rollups:7'))
+        self.assertTrue(cache.get('dashboard:rollups:7:recalculando'))
+
+
+@override_settings(
+    CORREO_REMITENTE='miapp.correo_logic.RemitenteMemoria',
+    OUTBOX_MAX_INTENTOS=3, OUTBOX_REINTENTO_BASE=30, OUTBOX_REINTENTO_MAXIMO=3600,
+)
+class TestsOutboxCorreos(TestCase):
+
+    def setUp(self):
+        from .correo_logic import RemitenteMemoria
+
+        RemitenteMemoria.enviados = []
+        RemitenteMemoria.fallar = False
+        self.client = Client()
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Zapallo', descripcion='Zapallo camote',
+            precio_unitario=2000, stock_disponible=10, categoria=categoria
+        )
+
+    def _checkout(self):
+        self.client.post('/api/cart/', data=json.dumps({
+            'producto_id': self.producto.id, 'cantidad': 2
+        }), content_type='application/json')
+        return self.client.post('/api/checkout/', data=json.dumps({
+            'nombre_cliente': 'Ana', 'correo_cliente': 'ana@test.com',
+            'telefono_cliente': '912345678', 'direccion': 'Calle 1',
+            'region': 'RM', 'comuna': 'Santiago',
+        }), content_type='application/json')
+
+    # TEST 23: El checkout solo encola los correos y el worker los envía
+    def test_checkout_encola_correos(self):
+        """Verifica que el checkout escribe el outbox y run_outbox lo drena"""
+        from django.core.management import call_command
+        from .correo_logic import RemitenteMemoria
+        from .models import CorreoPendiente
+
+        response = self._checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(RemitenteMemoria.enviados, [])
+        correos = CorreoPendiente.objects.filter(estado='pendiente')
+        self.assertEqual(sorted(correos.values_list('tipo', flat=True)), ['admin_nuevo_pedido', 'confirmacion_pedido'])
+        self.assertIn('2 x Zapallo', correos.get(tipo='confirmacion_pedido').html)
+
+        call_command('run_outbox', '--una-vez', stdout=open('/dev/null', 'w'))
+        self.assertEqual(len(RemitenteMemoria.enviados), 2)
+        self.assertFalse(CorreoPendiente.objects.exclude(estado='enviado').exists())
+
+    # TEST 24: Reintentos con backoff exponencial hasta marcar como fallido
+    def test_reintentos_con_backoff(self):
+        """Verifica que un error reprograma el correo y tras el máximo queda fallido"""
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .correo_logic import RemitenteMemoria, procesar_outbox
+        from .models import CorreoPendiente
+
+        correo = CorreoPendiente.objects.create(
+            tipo='admin_nuevo_pedido', destinatarios=['admin@test.com'], asunto='Prueba', texto='Hola'
+        )
+        RemitenteMemoria.fallar = True
+        ahora = timezone.now()
+        esperas = []
+        for _ in range(3):
+            with mock.patch('miapp.correo_logic.timezone.now', return_value=ahora):
+                procesar_outbox()
+            correo.refresh_from_db()
+            esperas.append(correo.proximo_intento - ahora)
+            ahora = correo.proximo_intento
+
+        self.assertEqual(esperas[:2], [timedelta(seconds=30), timedelta(seconds=60)])
+        self.assertEqual((correo.estado, correo.intentos), ('fallido', 3))
+        self.assertIn('Fallo simulado', correo.ultimo_error)
+        self.assertEqual(procesar_outbox(), {'enviados': 0, 'reintentos': 0, 'fallidos': 0})
+
+    # TEST 57: El envío ocurre con el lote ya reservado, fuera de la transacción de toma
+    def test_envio_con_lote_reservado(self):
+        """Verifica que durante el envío otro worker no toma el correo y que el resultado se guarda"""
+        from .correo_logic import procesar_outbox
+        from .models import CorreoPendiente
+
+        correo = CorreoPendiente.objects.create(
+            tipo='admin_nuevo_pedido', destinatarios=['admin@test.com'], asunto='Prueba', texto='Hola'
+        )
+        vistos = []
+
+        class RemitenteConcurrente:
+            def enviar(self, pendiente):
+                # Un segundo worker que drena en medio del envío no encuentra nada
+                vistos.append(procesar_outbox(remitente=self))
+
+        self.assertEqual(procesar_outbox(remitente=RemitenteConcurrente())['enviados'], 1)
+        self.assertEqual(vistos, [{'enviados': 0, 'reintentos': 0, 'fallidos': 0}])
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.intentos), ('enviado', 1))
+
+    # TEST 58: La respuesta del checkout no consulta por cada línea del pedido
+    def test_respuesta_checkout_sin_n_mas_uno(self):
+        """Verifica que un checkout de 1 y de 4 productos usan las mismas consultas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def consultas_checkout(cantidad_productos):
+            productos = [
+                Producto.objects.create(
+                    nombre=f'Papa {cantidad_productos}-{i}', descripcion='Papa',
+                    precio_unitario=500, stock_disponible=10, categoria=self.producto.categoria
+                )
+                for i in range(cantidad_productos)
+            ]
+            for producto in productos:
+                self.client.post('/api/cart/', data=json.dumps({
+                    'producto_id': producto.id, 'cantidad': 1
+                }), content_type='application/json')
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.post('/api/checkout/', data=json.dumps({
+                    'nombre_cliente': 'Ana', 'correo_cliente': 'ana@test.com',
+                    'telefono_cliente': '912345678', 'direccion': 'Calle 1',
+                    'region': 'RM', 'comuna': 'Santiago',
+                }), content_type='application/json')
+            self.assertEqual(len(response.json()['pedido']['detalles']), cantidad_productos)
+            return len(consultas)
+
+        self.assertEqual(consultas_checkout(1), consultas_checkout(4))
+
+
+class TestsCheckoutPorConjunto(TestCase):
+
+    def setUp(self):
+        from decimal import Decimal
+
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.productos = [
+            Producto.objects.create(
+                nombre=f'Producto {i}', descripcion='Prueba',
+                precio_unitario=1000, stock_disponible=5, categoria=categoria
+            )
+            for i in range(6)
+        ]
+        self.pedido = Pedido.objects.create(
+            total_pedido=0, nombre_cliente='Ana', correo_cliente='ana@test.com',
+            telefono_cliente='912345678', direccion='Calle 1', region='RM', comuna='Santiago'
+        )
+        self.precio = Decimal('1000')
+
+    def _items(self, cantidades):
+        return [
+            {'producto_id': producto.id, 'nombre': producto.nombre,
+             'cantidad': cantidad, 'precio_unitario': self.precio}
+            for producto, cantidad in zip(self.productos, cantidades)
+        ]
+
+    # TEST 25: Descuento de stock con consultas constantes sin importar las líneas
+    def test_descuento_en_consultas_constantes(self):
+        """Verifica bloqueo, UPDATE y bulk_create únicos para 6 líneas"""
+        from .checkout_logic import descontar_stock_pedido
+
+        with self.assertNumQueries(3):
+            descontar_stock_pedido(self.pedido, self._items([1, 2, 3, 4, 5, 1]))
+
+        stock = dict(Producto.objects.values_list('id', 'stock_disponible'))
+        self.assertEqual([stock[p.id] for p in self.productos], [4, 3, 2, 1, 0, 4])
+        self.assertEqual(self.pedido.detalles.count(), 6)
+
+    # TEST 26: Se informan todas las líneas sin stock y no se descuenta nada
+    def test_reporta_todos_los_faltantes(self):
+        """Verifica que el error lista cada producto faltante y no modifica el stock"""
+        from .checkout_logic import StockInsuficienteError, descontar_stock_pedido
+
+        with self.assertRaises(StockInsuficienteError) as contexto:
+            descontar_stock_pedido(self.pedido, self._items([6, 1, 9]))
+
+        self.assertEqual(
+            [(f['producto_id'], f['solicitado'], f['disponible']) for f in contexto.exception.faltantes],
+            [(self.productos[0].id, 6, 5), (self.productos[2].id, 9, 5)]
+        )
+        self.assertFalse(Producto.objects.exclude(stock_disponible=5).exists())
+        self.assertFalse(DetallePedido.objects.exists())
+
+
+class TestsStockAtomico(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.a, self.b = [
+            Producto.objects.create(
+                nombre=nombre, descripcion='Prueba',
+                precio_unitario=1000, stock_disponible=3, categoria=categoria
+            )
+            for nombre in ('Ajo', 'Betarraga')
+        ]
+
+    def _stock(self):
+        return list(Producto.objects.order_by('id').values_list('stock_disponible', flat=True))
+
+    # TEST 27: reservar es todo o nada (o parcial) y retorna los que fallaron
+    def test_reservar_y_liberar(self):
+        """Verifica reserva guardada por stock, reserva parcial y liberación en un UPDATE"""
+        self.assertEqual(Producto.objects.reservar({self.a.id: 2, self.b.id: 5}), [self.b.id])
+        self.assertEqual(self._stock(), [3, 3])
+
+        self.assertEqual(Producto.objects.reservar({self.a.id: 2, self.b.id: 5}, parcial=True), [self.b.id])
+        self.assertEqual(self._stock(), [1, 3])
+
+        with self.assertNumQueries(2):
+            self.assertEqual(Producto.objects.liberar({self.a.id: 2, self.b.id: 1, 999: 1}), [999])
+        self.assertEqual(self._stock(), [3, 4])
+
+    # TEST 28: reducir_stock usa el UPDATE atómico y no pisa cambios concurrentes
+    def test_reducir_stock_sin_perder_actualizaciones(self):
+        """Verifica que una instancia desactualizada no sobrescribe el stock real"""
+        from django.core.exceptions import ValidationError
+
+        copia_vieja = Producto.objects.get(pk=self.a.pk)
+        self.a.reducir_stock(2)
+        copia_vieja.reducir_stock(1)
+        self.assertEqual(copia_vieja.stock_disponible, 0)
+
+        with self.assertRaises(ValidationError):
+            self.a.reducir_stock(1)
+        self.a.aumentar_stock(4)
+        self.assertEqual(self.a.stock_disponible, 4)
+
+
+@override_settings(CARRITO_RESERVAS_ACTIVAS=True, CARRITO_RESERVA_TTL=900)
+class TestsReservasCarrito(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Palta', descripcion='Prueba',
+            precio_unitario=1000, stock_disponible=3, categoria=categoria
+        )
+        self.otro_cliente = Client()
+
+    def _agregar(self, cliente, cantidad):
+        return cliente.post('/api/cart/', data=json.dumps({
+            'producto_id': self.producto.id, 'cantidad': cantidad
+        }), content_type='application/json')
+
+    # TEST 29: Las reservas vigentes de otro carrito descuentan el stock disponible
+    def test_reserva_aparta_stock(self):
+        """Verifica que un segundo carrito no puede tomar unidades reservadas"""
+        from .models import ReservaStock
+
+        self.assertEqual(self._agregar(self.client, 2).status_code, 200)
+        response = self._agregar(self.otro_cliente, 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Solo hay 1', response.json()['error'])
+        self.assertEqual(self._agregar(self.otro_cliente, 1).status_code, 200)
+
+        # Quitar el producto del carrito libera la reserva
+        self.client.delete(f'/api/cart/{self.producto.id}/')
+        self.assertEqual(ReservaStock.objects.get().cantidad, 1)
+        self.assertEqual(self._agregar(self.otro_cliente, 2).status_code, 200)
+        self.assertEqual(ReservaStock.objects.get().cantidad, 3)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_disponible, 3)
+
+    # TEST 30: El checkout convierte las reservas y las vencidas se barren
+    def test_checkout_convierte_y_barrido(self):
+        """Verifica que el checkout consume la reserva propia e ignora las vencidas"""
+        from datetime import timedelta
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import ReservaStock
+
+        self._agregar(self.client, 2)
+        self._agregar(self.otro_cliente, 1)
+        ReservaStock.objects.exclude(titular=self.client.session.session_key).update(
+            expira=timezone.now() - timedelta(seconds=1)
+        )
+
+        response = self.client.post('/api/checkout/', data=json.dumps({
+            'nombre_cliente': 'Ana', 'correo_cliente': 'ana@test.com',
+            'telefono_cliente': '912345678', 'direccion': 'Calle 1',
+            'region': 'RM', 'comuna': 'Santiago',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_disponible, 1)
+        self.assertEqual(ReservaStock.objects.count(), 1)
+
+        call_command('limpiar_reservas', stdout=open('/dev/null', 'w'))
+        self.assertFalse(ReservaStock.objects.exists())
+
+
+class TestsAlmacenCarrito(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Lechuga', descripcion='Prueba',
+            precio_unitario=1000, stock_disponible=10, categoria=categoria
+        )
+
+    def _agregar(self, cantidad=1):
+        return self.client.post('/api/cart/', data=json.dumps({
+            'producto_id': self.producto.id, 'cantidad': cantidad
+        }), content_type='application/json')
+
+    # TEST 31: El carrito en cookie firmada sobrevive entre requests y rechaza cambios
+    @override_settings(CARRITO_BACKEND='cookie')
+    def test_cookie_firmada(self):
+        """Verifica ida y vuelta por la cookie y que una cookie alterada se descarta"""
+        from django.conf import settings
+
+        self._agregar(2)
+        self._agregar(1)
+        self.assertEqual(self.client.get('/api/cart/').json()['cantidad_items'], 3)
+        self.assertNotIn('carrito_guest', self.client.session)
+
+        cookie = self.client.cookies[settings.CARRITO_COOKIE_NOMBRE]
+        cookie.set(cookie.key, cookie.value[:-2] + 'xx', cookie.value[:-2] + 'xx')
+        self.assertEqual(self.client.get('/api/cart/').json()['cantidad_items'], 0)
+
+        self._agregar(1)
+        self.client.delete('/api/cart/clear/')
+        self.assertEqual(self.client.cookies[settings.CARRITO_COOKIE_NOMBRE].value, '')
+
+    # TEST 32: Con el almacén en cache, modificar el carrito no reescribe la sesión
+    @override_settings(CARRITO_BACKEND='cache')
+    def test_cache_no_escribe_sesion(self):
+        """Verifica que solo el primer agregado crea la sesión y los siguientes no la tocan"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self._agregar()
+        with CaptureQueriesContext(connection) as contexto:
+            self._agregar()
+            self.client.put(f'/api/cart/{self.producto.id}/', data=json.dumps({'cantidad': 5}),
+                            content_type='application/json')
+        escrituras = [
+            q['sql'] for q in contexto.captured_queries
+            if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(escrituras, [])
+        self.assertEqual(self.client.get('/api/cart/').json()['cantidad_items'], 5)
+
+
+# Los contadores de sesión no están en MIDDLEWARE; se instalan como en reproducir_trafico
+@override_settings(MIDDLEWARE=middleware_con_contador(settings.MIDDLEWARE))
+class TestsEscriturasSesion(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .sesion_logic import reiniciar_estadisticas_sesion
+        cache.clear()
+        reiniciar_estadisticas_sesion()
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Zapallo', descripcion='Prueba',
+            precio_unitario=1000, stock_disponible=10, categoria=categoria
+        )
+        self.client.post('/api/cart/', data=json.dumps({
+            'producto_id': self.producto.id, 'cantidad': 2
+        }), content_type='application/json')
+
+    def _cambiar_cantidad(self, cantidad):
+        return self.client.put(f'/api/cart/{self.producto.id}/', data=json.dumps({
+            'cantidad': cantidad
+        }), content_type='application/json')
+
+    # TEST 33: Reenviar la misma cantidad no escribe la sesión ni cambia la versión
+    def test_escritura_omitida_si_no_cambia(self):
+        """Verifica que el contador registra la escritura evitada"""
+        from .sesion_logic import estadisticas_sesion, reiniciar_estadisticas_sesion
+
+        version = self.client.get('/api/cart/summary/').json()['version']
+        reiniciar_estadisticas_sesion()
+
+        self.assertEqual(self._cambiar_cantidad(2).status_code, 200)
+        self.assertEqual(self.client.get('/api/cart/summary/').json()['version'], version)
+        estadisticas = estadisticas_sesion()
+        self.assertEqual(
+            (estadisticas['peticiones'], estadisticas['sesion_escrita'], estadisticas['escrituras_evitadas']),
+            (2, 0, 1)
+        )
+
+        self._cambiar_cantidad(3)
+        self.assertEqual(estadisticas_sesion()['sesion_escrita'], 1)
+
+    # TEST 34: Con cached_db la sesión se lee desde el cache y no desde django_session
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_sesion_cached_db(self):
+        """Verifica que el carrito persiste y leerlo no consulta la tabla de sesiones"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # Cliente nuevo: SessionMiddleware toma el motor al cargarse
+        cliente = Client()
+        cliente.post('/api/cart/', data=json.dumps({
+            'producto_id': self.producto.id, 'cantidad': 1
+        }), content_type='application/json')
+
+        with CaptureQueriesContext(connection) as contexto:
+            response = cliente.get('/api/cart/')
+        self.assertEqual(response.json()['cantidad_items'], 1)
+        self.assertFalse(any('django_session' in q['sql'] for q in contexto.captured_queries))
+
+
+class TestsFusionCarritoLogin(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.cliente = User.objects.create_user(correo='ana@test.com', nombre='Ana', password='test123')
+        self.a, self.b, self.c = [
+            Producto.objects.create(
+                nombre=nombre, descripcion='Prueba',
+                precio_unitario=1000, stock_disponible=stock, categoria=categoria
+            )
+            for nombre, stock in (('Acelga', 10), ('Brócoli', 3), ('Cebolla', 10))
+        ]
+
+    # TEST 35: La fusión valida todas las líneas con una sola consulta
+    def test_fusion_en_una_consulta(self):
+        """Verifica suma de cantidades, tope por stock y descarte de inactivos"""
+        from .carrito_logic import fusionar_carritos
+
+        Producto.objects.filter(pk=self.c.pk).update(activo=False)
+        invitado = {'items': {str(self.a.id): 2, str(self.b.id): 2, str(self.c.id): 1}, 'version': 3}
+        usuario = {'items': {str(self.a.id): 1, str(self.b.id): 2}, 'version': 7}
+
+        with self.assertNumQueries(1):
+            carrito, completo, ajustes = fusionar_carritos(invitado, usuario)
+
+        self.assertEqual(carrito['items'], {str(self.a.id): 3, str(self.b.id): 3})
+        self.assertEqual(completo['cantidad_items'], 6)
+        self.assertEqual(
+            [(ajuste['producto_id'], ajuste['solicitado'], ajuste['cantidad']) for ajuste in ajustes],
+            [(self.b.id, 4, 3), (self.c.id, 1, 0)]
+        )
+
+    # TEST 36: El login conserva el carrito de invitado y lo retorna en la respuesta
+    def test_login_retorna_carrito_fusionado(self):
+        """Verifica que el carrito de invitado pasa al usuario sin otra llamada a /api/cart/"""
+        sesion = self.client.session
+        sesion[f'carrito_user_{self.cliente.id}'] = {'items': {str(self.a.id): 1}, 'version': 1}
+        sesion.save()
+        self.client.post('/api/cart/', data=json.dumps({
+            'producto_id': self.a.id, 'cantidad': 2
+        }), content_type='application/json')
+
+        response = self.client.post('/api/auth/login', data=json.dumps({
+            'correo': 'ana@test.com', 'password': 'test123'
+        }), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['carrito']['cantidad_items'], 3)
+        self.assertNotIn('carrito_guest', self.client.session)
+        self.assertEqual(self.client.get('/api/cart/').json()['cantidad_items'], 3)
+
+
+class TestsCarritoLote(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.a, self.b, self.c = [
+            Producto.objects.create(
+                nombre=nombre, descripcion='Prueba',
+                precio_unitario=1000, stock_disponible=stock, categoria=categoria
+            )
+            for nombre, stock in (('Apio', 10), ('Berenjena', 2), ('Coliflor', 10))
+        ]
+        for producto in (self.a, self.c):
+            self.client.post('/api/cart/', data=json.dumps({
+                'producto_id': producto.id, 'cantidad': 1
+            }), content_type='application/json')
+
+    def _lote(self, operaciones):
+        return self.client.patch('/api/cart/', data=json.dumps({'operaciones': operaciones}),
+                                 content_type='application/json')
+
+    def _cantidades(self):
+        return {item['producto_id']: item['cantidad'] for item in self.client.get('/api/cart/').json()['items']}
+
+    # TEST 37: Un lote de operaciones se aplica con una sola consulta de productos
+    def test_lote_aplica_operaciones(self):
+        """Verifica set, add y remove en una petición y un recálculo"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as contexto:
+            response = self._lote([
+                {'op': 'set', 'producto_id': self.a.id, 'cantidad': 4},
+                {'op': 'add', 'producto_id': self.b.id, 'cantidad': 2},
+                {'op': 'add', 'producto_id': self.a.id, 'cantidad': 1},
+                {'op': 'remove', 'producto_id': self.c.id},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['carrito']['cantidad_items'], 7)
+        consultas_productos = [q for q in contexto.captured_queries if 'FROM "productos"' in q['sql']]
+        self.assertEqual(len(consultas_productos), 1)
+        self.assertEqual(self._cantidades(), {self.a.id: 5, self.b.id: 2})
+
+    # TEST 38: Si una línea no tiene stock el lote completo se rechaza
+    def test_lote_todo_o_nada(self):
+        """Verifica que un faltante deja el carrito intacto y se informa"""
+        response = self._lote([
+            {'op': 'set', 'producto_id': self.a.id, 'cantidad': 3},
+            {'op': 'add', 'producto_id': self.b.id, 'cantidad': 5},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(f['producto_id'], f['disponible']) for f in response.json()['faltantes']],
+            [(self.b.id, 2)]
+        )
+        self.assertEqual(self._cantidades(), {self.a.id: 1, self.c.id: 1})
+        self.assertEqual(self._lote([{'op': 'add', 'producto_id': self.a.id}]).status_code, 400)
+
+
+class TestsCatalogoCondicional(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Pepino', descripcion='Prueba',
+            precio_unitario=1000, stock_disponible=10, categoria=self.categoria
+        )
+
+    # TEST 39: Un catálogo sin cambios responde 304 con una sola consulta
+    def test_etag_304(self):
+        """Verifica ETag, Cache-Control y 304 en productos, detalle y categorías"""
+        for url in ('/api/public/products/', f'/api/public/products/{self.producto.id}/',
+                    '/api/public/categories/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('public', response['Cache-Control'])
+
+            with self.assertNumQueries(1):
+                revalidacion = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidacion.status_code, 304)
+            self.assertEqual(revalidacion['ETag'], response['ETag'])
+
+    # TEST 40: El ETag cambia con ediciones, eliminaciones y límites de oferta
+    def test_etag_cambia(self):
+        """Verifica que editar, eliminar o cruzar el inicio de una oferta cambia la firma"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .catalogo_logic import firma_catalogo
+        from .models import Oferta
+
+        ahora = timezone.now()
+        oferta = Oferta.objects.create(
+            producto=self.producto, precio_oferta=500,
+            fecha_inicio=ahora + timedelta(hours=1), fecha_fin=ahora + timedelta(days=1)
+        )
+        antes = firma_catalogo(ahora)
+        self.assertEqual(firma_catalogo(ahora), antes)
+        self.assertNotEqual(firma_catalogo(ahora + timedelta(hours=2)), antes)
+
+        self.producto.stock_disponible = 9
+        self.producto.save()
+        editado = firma_catalogo(ahora)
+        self.assertNotEqual(editado, antes)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            oferta.delete()
+        self.assertNotEqual(firma_catalogo(ahora), editado)
+
+
+@override_settings(PAGINAS_CATALOGO_CACHE=True)
+class TestsCachePaginasCatalogo(TestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Rabanito', descripcion='Prueba',
+            precio_unitario=1000, stock_disponible=10, categoria=categoria
+        )
+
+    # TEST 41: Las visitas anónimas repetidas no consultan la base de datos
+    def test_pagina_anonima_desde_cache(self):
+        """Verifica HIT sin consultas y que editar un producto invalida la página"""
+        url = f'/producto/{self.producto.id}/'
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.nombre = 'Rabanito rojo'
+            self.producto.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Rabanito rojo')
+
+    # TEST 42: Con sesión no se usa el cache y la duración respeta las ofertas
+    def test_sesion_y_fronteras_de_oferta(self):
+        """Verifica que un visitante con carrito no recibe páginas compartidas"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .catalogo_logic import duracion_pagina
+        from .models import Oferta
+
+        self.client.post('/api/cart/', data=json.dumps({
+            'producto_id': self.producto.id, 'cantidad': 1
+        }), content_type='application/json')
+        self.client.get('/productos/')
+        self.assertNotIn('X-Cache', self.client.get('/productos/'))
+
+        ahora = timezone.now()
+        self.assertEqual(duracion_pagina(ahora), 300)
+        with self.captureOnCommitCallbacks(execute=True):
+            Oferta.objects.create(
+                producto=self.producto, precio_oferta=500,
+                fecha_inicio=ahora + timedelta(seconds=30), fecha_fin=ahora + timedelta(days=1)
+            )
+        self.assertEqual(duracion_pagina(ahora), 31)
+
+    # TEST 60: La versión del catálogo sube al confirmar, no con un cambio revertido
+    def test_version_al_confirmar(self):
+        """Verifica que un rollback no invalida y que el commit sí, después de escribir"""
+        from django.db import transaction
+        from .catalogo_logic import version_catalogo
+
+        inicial = version_catalogo()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.producto.precio_unitario = 1
+                    self.producto.save()
+                    # Dentro de la transacción la versión aún no cambia
+                    self.assertEqual(version_catalogo(), inicial)
+                    raise ValueError('rollback')
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(version_catalogo(), inicial)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.reservar({self.producto.id: 1})
+            self.assertEqual(version_catalogo(), inicial)
+        self.assertGreater(version_catalogo(), inicial)
+
+
+class TestsLineaTiempoOfertas(TestCase):
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.core.cache import cache
+        from django.utils import timezone
+        from .models import Oferta
+
+        cache.clear()
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Espinaca', descripcion='Prueba',
+            precio_unitario=1000, stock_disponible=10, categoria=categoria
+        )
+        self.ahora = timezone.now()
+        self.oferta = Oferta.objects.create(
+            producto=self.producto, precio_oferta=600,
+            fecha_inicio=self.ahora + timedelta(minutes=10), fecha_fin=self.ahora + timedelta(hours=2)
+        )
+
+    # TEST 43: El próximo cambio se guarda en cache y avanza al cruzar cada frontera
+    def test_next_price_change_at(self):
+        """Verifica inicio, luego fin, luego None, consultando solo al cambiar"""
+        from datetime import timedelta
+        from .catalogo_logic import next_price_change_at
+
+        self.assertEqual(next_price_change_at(self.ahora), self.oferta.fecha_inicio)
+        with self.assertNumQueries(0):
+            self.assertEqual(next_price_change_at(self.ahora + timedelta(minutes=5)), self.oferta.fecha_inicio)
+
+        self.assertEqual(next_price_change_at(self.ahora + timedelta(minutes=11)), self.oferta.fecha_fin)
+        self.assertIsNone(next_price_change_at(self.ahora + timedelta(hours=3)))
+
+        # Editar la oferta invalida el instante guardado
+        self.oferta.fecha_inicio = self.ahora + timedelta(minutes=1)
+        self.oferta.save()
+        self.assertEqual(next_price_change_at(self.ahora), self.oferta.fecha_inicio)
+
+    # TEST 44: El resumen del carrito vence cuando empieza una oferta
+    def test_resumen_vence_en_frontera(self):
+        """Verifica que el TTL del snapshot del resumen se acorta hasta el cambio de precio"""
+        from unittest import mock
+        from .carrito_logic import resumen_carrito
+
+        with mock.patch('miapp.carrito_logic.cache.set') as guardar:
+            resumen_carrito('sesion', 'carrito_guest', {'items': {str(self.producto.id): 1}, 'version': 1})
+        self.assertLessEqual(guardar.call_args.kwargs['timeout'], 601)
+
+
+class TestsCheckoutIdempotente(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Cilantro', descripcion='Prueba',
+            precio_unitario=1000, stock_disponible=10, categoria=categoria
+        )
+        self.client.post('/api/cart/', data=json.dumps({
+            'producto_id': self.producto.id, 'cantidad': 2
+        }), content_type='application/json')
+        self.datos = {
+            'nombre_cliente': 'Ana', 'correo_cliente': 'ana@test.com',
+            'telefono_cliente': '912345678', 'direccion': 'Calle 1',
+            'region': 'RM', 'comuna': 'Santiago',
+        }
+
+    def _checkout(self, clave, datos=None):
+        return self.client.post('/api/checkout/', data=json.dumps(datos or self.datos),
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=clave)
+
+    # TEST 45: Un reintento con la misma clave repite el 201 sin tocar productos
+    def test_reintento_repite_respuesta(self):
+        """Verifica un solo pedido, un solo descuento de stock y la misma respuesta"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        primera = self._checkout('clave-1')
+        self.assertEqual(primera.status_code, 201)
+
+        with CaptureQueriesContext(connection) as contexto:
+            repetida = self._checkout('clave-1')
+        self.assertEqual(repetida.status_code, 201)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+        self.assertEqual(repetida.json(), primera.json())
+        self.assertFalse(any('"productos"' in q['sql'] for q in contexto.captured_queries))
+
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_disponible, 8)
+        self.assertEqual(self._checkout('clave-1', dict(self.datos, comuna='Ñuñoa')).status_code, 422)
+
+
+class TestsCheckoutIdempotenteConcurrente(TransactionTestCase):
+    """Solicitudes reales en paralelo: cada hilo usa su propia conexión a la base."""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.producto = Producto.objects.create(
+            nombre='Cilantro', descripcion='Prueba',
+            precio_unitario=1000, stock_disponible=10, categoria=categoria
+        )
+        self.user = User.objects.create_user(correo='ana@test.com', nombre='Ana', password='test123')
+        self.datos = {
+            'nombre_cliente': 'Ana', 'correo_cliente': 'ana@test.com',
+            'telefono_cliente': '912345678', 'direccion': 'Calle 1',
+            'region': 'RM', 'comuna': 'Santiago',
+        }
+
+    def _cliente_identificado(self):
+        """Un navegador (sesión propia) con el cliente identificado y el carrito cargado"""
+        cliente = Client()
+        sesion = cliente.session
+        sesion['cliente_id'] = self.user.id
+        sesion.save()
+        cliente.post('/api/cart/', data=json.dumps({
+            'producto_id': self.producto.id, 'cantidad': 2
+        }), content_type='application/json')
+        return cliente
+
+    def _checkout(self, cliente, clave):
+        return cliente.post('/api/checkout/', data=json.dumps(self.datos),
+                            content_type='application/json', HTTP_IDEMPOTENCY_KEY=clave)
+
+    # TEST 46: Un duplicado concurrente recibe 409 y se crea exactamente un pedido
+    def test_duplicado_concurrente(self):
+        """Verifica con dos hilos y dos sesiones del mismo cliente un solo pedido y un solo descuento"""
+        import threading
+        from unittest import mock
+        from django.db import connection
+        from . import views
+
+        primera_pestana = self._cliente_identificado()
+        segunda_pestana = self._cliente_identificado()
+        reclamada = threading.Event()
+        continuar = threading.Event()
+        respuestas = {}
+        obtener_carrito_original = views.obtener_carrito
+
+        def obtener_carrito_en_pausa(request):
+            # La primera solicitud ya reclamó la clave (confirmada) y espera aquí
+            reclamada.set()
+            continuar.wait(timeout=10)
+            return obtener_carrito_original(request)
+
+        def primera_solicitud():
+            try:
+                respuestas['primera'] = self._checkout(primera_pestana, 'clave-2')
+            finally:
+                connection.close()
+
+        with mock.patch.object(views, 'obtener_carrito', side_effect=obtener_carrito_en_pausa):
+            hilo = threading.Thread(target=primera_solicitud)
+            hilo.start()
+            self.assertTrue(reclamada.wait(timeout=10))
+            # Doble envío desde otra pestaña (otra sesión) mientras la primera está en curso
+            duplicado = self._checkout(segunda_pestana, 'clave-2')
+            continuar.set()
+            hilo.join(timeout=10)
+
+        self.assertEqual(duplicado.status_code, 409)
+        self.assertEqual(respuestas['primera'].status_code, 201)
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_disponible, 8)
+        repetida = self._checkout(segunda_pestana, 'clave-2')
+        self.assertEqual(repetida.json()['pedido']['id'], respuestas['primera'].json()['pedido']['id'])
+
+
+class TestsConsultasPedidos(TestCase):
+
+    def setUp(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.user = User.objects.create_user(correo='historial@test.com', nombre='Historial', password='test123')
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', descripcion='Prueba', precio_unitario=1000,
+                     stock_disponible=10, categoria=categoria)
+            for i in range(3)
+        ])
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    def _crear_pedidos(self, cantidad):
+        pedidos = Pedido.objects.bulk_create([
+            Pedido(usuario=self.user, total_pedido=6000, nombre_cliente='Historial',
+                   correo_cliente='historial@test.com', telefono_cliente='912345678',
+                   direccion='Calle 1', region='RM', comuna='Santiago', cantidad_items=6)
+            for _ in range(cantidad)
+        ])
+        DetallePedido.objects.bulk_create([
+            DetallePedido(pedido=pedido, producto=producto, cantidad=2, precio_compra=1000)
+            for pedido in pedidos for producto in self.productos
+        ])
+        return pedidos
+
+    def _consultas(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return len(contexto.captured_queries), response.json()
+
+    # TEST 47: El historial cuesta las mismas consultas con 1 o 500 pedidos
+    def test_historial_consultas_constantes(self):
+        """Verifica la paginación y que cantidad_items no genere consultas por pedido"""
+        self._crear_pedidos(1)
+        con_uno, datos = self._consultas('/api/mis-pedidos/')
+        self.assertEqual(datos['results'][0]['cantidad_items'], 6)
+
+        self._crear_pedidos(499)
+        con_quinientos, datos = self._consultas('/api/mis-pedidos/')
+        self.assertEqual(con_quinientos, con_uno)
+        self.assertEqual(len(datos['results']), 20)
+        self.assertIsNotNone(datos['next'])
+
+    # TEST 48: El detalle de un pedido precarga sus líneas y productos
+    def test_detalle_pedido_consultas_constantes(self):
+        """Verifica que el detalle no consulta el producto de cada línea"""
+        pedido = self._crear_pedidos(1)[0]
+        antes, _ = self._consultas(f'/api/pedidos/{pedido.id}/')
+
+        DetallePedido.objects.bulk_create([
+            DetallePedido(pedido=pedido, producto=producto, cantidad=1, precio_compra=900)
+            for producto in self.productos * 10
+        ])
+        despues, datos = self._consultas(f'/api/pedidos/{pedido.id}/')
+        self.assertEqual(despues, antes)
+        self.assertEqual(len(datos['detalles']), 33)
+        self.assertEqual(datos['detalles'][0]['producto_nombre'], 'Producto 0')
+
+
+class TestsResumenPedido(TestCase):
+
+    def setUp(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.user = User.objects.create_user(correo='resumen@test.com', nombre='Resumen', password='test123')
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.lechuga = Producto.objects.create(
+            nombre='Lechuga', descripcion='Prueba', precio_unitario=1000,
+            stock_disponible=10, categoria=categoria, imagen='lechuga.jpg'
+        )
+        self.apio = Producto.objects.create(
+            nombre='Apio', descripcion='Prueba', precio_unitario=1500,
+            stock_disponible=10, categoria=categoria
+        )
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    # TEST 49: El checkout guarda el resumen y el historial se lista sin joins
+    def test_checkout_guarda_resumen(self):
+        """Verifica cantidad_items y resumen_items del pedido y la consulta del historial"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        # El checkout identifica al cliente por la sesión
+        sesion = self.client.session
+        sesion['cliente_id'] = self.user.id
+        sesion.save()
+        for producto, cantidad in ((self.lechuga, 2), (self.apio, 1)):
+            self.client.post('/api/cart/', data=json.dumps({
+                'producto_id': producto.id, 'cantidad': cantidad
+            }), content_type='application/json')
+        response = self.client.post('/api/checkout/', data=json.dumps({
+            'nombre_cliente': 'Resumen', 'correo_cliente': 'resumen@test.com',
+            'telefono_cliente': '912345678', 'direccion': 'Calle 1',
+            'region': 'RM', 'comuna': 'Santiago',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        pedido = Pedido.objects.get()
+        self.assertEqual(pedido.cantidad_items, 3)
+        lechuga = next(linea for linea in pedido.resumen_items if linea['producto_id'] == self.lechuga.id)
+        self.assertEqual(lechuga, {
+            'producto_id': self.lechuga.id, 'nombre': 'Lechuga', 'cantidad': 2,
+            'precio': '1000.00', 'subtotal': '2000.00', 'imagen': 'lechuga.jpg',
+        })
+
+        with CaptureQueriesContext(connection) as contexto:
+            datos = self.client.get('/api/mis-pedidos/', **self.auth).json()
+        self.assertEqual(datos['results'][0]['cantidad_items'], 3)
+        consultas_pedidos = [q['sql'] for q in contexto.captured_queries if '"pedidos"' in q['sql']]
+        self.assertEqual(len(consultas_pedidos), 1)
+        self.assertNotIn('JOIN', consultas_pedidos[0])
+
+    # TEST 50: Editar los detalles después del checkout actualiza el resumen
+    def test_actualizar_resumen_desde_detalles(self):
+        """Verifica que actualizar_resumen_pedidos reconstruye el resumen desde los detalles"""
+        from .checkout_logic import actualizar_resumen_pedidos
+
+        pedido = Pedido.objects.create(
+            usuario=self.user, total_pedido=4000, nombre_cliente='Resumen',
+            correo_cliente='resumen@test.com', telefono_cliente='912345678',
+            direccion='Calle 1', region='RM', comuna='Santiago'
+        )
+        DetallePedido.objects.create(pedido=pedido, producto=self.lechuga, cantidad=1, precio_compra=1000)
+        DetallePedido.objects.create(pedido=pedido, producto=self.apio, cantidad=2, precio_compra=1500)
+
+        actualizar_resumen_pedidos([pedido.id])
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.cantidad_items, 3)
+        self.assertEqual([linea['nombre'] for linea in pedido.resumen_items], ['Lechuga', 'Apio'])
+        self.assertEqual(pedido.resumen_items[1]['subtotal'], '3000.00')
+
+
+class TestsTransicionesPedidos(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(correo='staff@test.com', nombre='Staff', password='admin123')
+        categoria = Categoria.objects.create(nombre='Verduras', activa=True)
+        self.productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', descripcion='Prueba', precio_unitario=1000,
+                     stock_disponible=5, categoria=categoria)
+            for i in range(2)
+        ])
+
+    def _pedidos(self, estado, cantidad):
+        pedidos = Pedido.objects.bulk_create([
+            Pedido(total_pedido=3000, nombre_cliente='Lote', correo_cliente='lote@test.com',
+                   telefono_cliente='912345678', direccion='Calle 1', region='RM',
+                   comuna='Santiago', estado_pedido=estado)
+            for _ in range(cantidad)
+        ])
+        DetallePedido.objects.bulk_create([
+            DetallePedido(pedido=pedido, producto=producto, cantidad=2, precio_compra=1000)
+            for pedido in pedidos for producto in self.productos
+        ])
+        return pedidos
+
+    # TEST 51: Marcar como pagado cambia todo el lote en una sola consulta UPDATE
+    def test_marcar_pagado_en_lote(self):
+        """Verifica la guarda de estado, la fecha de pago, la auditoría y los conteos"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .models import TransicionPedido
+        from .pedido_logic import transicionar_pedidos
+
+        pendientes = self._pedidos('pendiente_pago', 30)
+        enviado = self._pedidos('enviado', 1)[0]
+        seleccion = Pedido.objects.filter(id__in=[p.id for p in pendientes] + [enviado.id])
+
+        with self.captureOnCommitCallbacks(execute=True), \
+                CaptureQueriesContext(connection) as contexto:
+            conteo = transicionar_pedidos(seleccion, 'pagado', usuario=self.admin)
+
+        self.assertEqual(conteo, {'pendiente_pago': 30})
+        updates = [q for q in contexto.captured_queries if q['sql'].startswith('UPDATE "pedidos"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Pedido.objects.filter(estado_pedido='pagado', fecha_pago__isnull=False).count(), 30)
+        enviado.refresh_from_db()
+        self.assertEqual(enviado.estado_pedido, 'enviado')
+        self.assertEqual(TransicionPedido.objects.filter(usuario=self.admin, estado_nuevo='pagado').count(), 30)
+
+    # TEST 52: Cancelar desde el admin devuelve el stock agrupado por producto
+    def test_cancelar_devuelve_stock(self):
+        """Verifica el stock devuelto y el mensaje con los conteos por estado"""
+        self._pedidos('pendiente_pago', 2)
+        self._pedidos('pagado', 1)
+        completado = self._pedidos('completado', 1)[0]
+        self.client.force_login(self.admin)
+
+        response = self.client.post('/admin/miapp/pedido/', {
+            'action': 'cancelar_pedidos',
+            '_selected_action': list(Pedido.objects.values_list('id', flat=True)),
+        }, follow=True)
+
+        mensajes = [str(m) for m in response.context['messages']]
+        self.assertIn('3 pedido(s) cancelado(s). Desde Pagado: 1, Pendiente de Pago: 2. '
+                      '1 omitido(s) por su estado actual.', mensajes)
+        for producto in self.productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock_disponible, 11)
+        completado.refresh_from_db()
+        self.assertEqual(completado.estado_pedido, 'completado')
+        self.assertEqual(completado.transiciones.count(), 0)
+
+
+class TestsConciliacionTransferencias(TestCase):
+
+    def setUp(self):
+        self.pedidos = Pedido.objects.bulk_create([
+            Pedido(total_pedido=total, nombre_cliente='Cliente', correo_cliente='cliente@test.com',
+                   telefono_cliente='912345678', direccion='Calle 1', region='RM', comuna='Santiago')
+            for total in (12990, 5000, 7500)
+        ])
+
+    # TEST 53: El comando concilia por número y monto y reporta las filas sin calce
+    def test_comando_conciliar(self):
+        """Verifica pedidos pagados, filas repetidas o con monto distinto y el reporte CSV"""
+        import os
+        import tempfile
+        from django.core.management import call_command
+        from .models import TransicionPedido
+
+        primero, segundo, tercero = self.pedidos
+        with tempfile.TemporaryDirectory() as carpeta:
+            cartola = os.path.join(carpeta, 'cartola.csv')
+            reporte = os.path.join(carpeta, 'no_conciliadas.csv')
+            with open(cartola, 'w', encoding='utf-8') as archivo:
+                archivo.write(
+                    'Fecha;Descripción;Cargos;Abonos\n'
+                    f'01/10/2026;TRANSF DE JUAN PEDIDO {primero.id};;$12.990\n'
+                    f'01/10/2026;TRANSF PEDIDO #{primero.id};;12.990\n'
+                    f'02/10/2026;Pago pedido {segundo.id};;4.000\n'
+                    '02/10/2026;Transferencia sin glosa;;7.500\n'
+                    '03/10/2026;Comisión mantención;1.990;\n'
+                )
+            call_command('conciliar_transferencias', cartola, reporte=reporte, stdout=open(os.devnull, 'w'))
+            with open(reporte, encoding='utf-8') as archivo:
+                lineas = archivo.read().splitlines()
+
+        self.assertEqual(
+            dict(Pedido.objects.values_list('id', 'estado_pedido')),
+            {primero.id: 'pagado', segundo.id: 'pendiente_pago', tercero.id: 'pendiente_pago'}
+        )
+        self.assertEqual(TransicionPedido.objects.get().origen, 'conciliacion')
+        self.assertEqual(len(lineas), 5)
+        self.assertIn('ya se concilió', lineas[1])
+        self.assertIn('monto no coincide', lineas[2])
+
+    # TEST 54: La página del admin concilia la cartola subida (o solo simula)
+    def test_pagina_admin_conciliar(self):
+        """Verifica la simulación sin cambios y luego la conciliación desde el admin"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        admin = User.objects.create_superuser(correo='staff@test.com', nombre='Staff', password='admin123')
+        self.client.force_login(admin)
+        contenido = (
+            'fecha,glosa,monto\n'
+            + ''.join(f'2026-10-01,Pedido {p.id},{p.total_pedido}\n' for p in self.pedidos)
+            + '2026-10-01,Otro abono,100\n'
+        ).encode('utf-8')
+
+        response = self.client.post('/admin/conciliar-transferencias/', {
+            'cartola': SimpleUploadedFile('cartola.csv', contenido), 'simular': '1',
+        })
+        self.assertEqual(response.context['resumen']['conciliados'], 3)
+        self.assertEqual(Pedido.objects.filter(estado_pedido='pagado').count(), 0)
+
+        response = self.client.post('/admin/conciliar-transferencias/', {
+            'cartola': SimpleUploadedFile('cartola.csv', contenido),
+        })
+        self.assertEqual(response.context['resumen']['pagados'], 3)
+        self.assertEqual(response.context['resumen']['muestra'][0]['glosa'], 'Otro abono')
+        self.assertEqual(Pedido.objects.filter(estado_pedido='pagado').count(), 3)
+
+    # TEST 59: Un archivo que no es CSV muestra el error en la página en lugar de un 500
+    def test_cartola_ilegible(self):
+        """Verifica que los errores del módulo csv llegan como CartolaInvalidaError"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        admin = User.objects.create_superuser(correo='staff@test.com', nombre='Staff', password='admin123')
+        self.client.force_login(admin)
+        basura = {
+            'encabezado.csv': b'"' + b'x' * 200000 + b'"\n',
+            'filas.csv': b'glosa,monto\n"' + b'x' * 200000 + b'",1\n',
+        }
+        for nombre, contenido in basura.items():
+            response = self.client.post('/admin/conciliar-transferencias/', {
+                'cartola': SimpleUploadedFile(nombre, contenido),
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no es un CSV válido', response.context['error'])
+        self.assertFalse(Pedido.objects.filter(estado_pedido='pagado').exists())
+
+    # TEST 61: Montos NaN o infinitos se informan como filas sin monto
+    def test_montos_no_finitos(self):
+        """Verifica que 'NaN' e 'Infinity' no rompen la conciliación"""
+        import io
+        from .conciliacion_logic import conciliar_transferencias, leer_monto
+
+        self.assertIsNone(leer_monto('NaN'))
+        self.assertIsNone(leer_monto('-Infinity'))
+        primero = self.pedidos[0]
+        cartola = io.StringIO(
+            'glosa,monto\n'
+            f'Pedido {primero.id},nan\n'
+            f'Pedido {primero.id},Infinity\n'
+            f'Pedido {primero.id},12990\n'
+        )
+        resumen = conciliar_transferencias(cartola)
+        self.assertEqual((resumen['pagados'], resumen['motivos']['sin_monto']), (1, 2))
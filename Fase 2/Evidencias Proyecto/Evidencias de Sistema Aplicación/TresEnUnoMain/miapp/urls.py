@@ -7,7 +7,10 @@ from .views import (
     CategoriaListAPIView,
     ProductoListAPIView,
     ProductoDetailAPIView,
+    ProductoBusquedaAPIView,
+    ProductoAutocompletadoAPIView,
     CarritoView,
+    CarritoResumenView,
     CarritoItemView,
     CarritoVaciarView,
     CheckoutAPIView,
@@ -46,10 +49,13 @@ urlpatterns = [
     
     # ===== API ENDPOINTS - PRODUCTOS (PÚBLICOS) =====
     path('api/public/products/', ProductoListAPIView.as_view(), name='productos-list'),
+    path('api/public/products/search/', ProductoBusquedaAPIView.as_view(), name='productos-busqueda'),
+    path('api/public/products/suggest/', ProductoAutocompletadoAPIView.as_view(), name='productos-autocompletado'),
     path('api/public/products/<int:pk>/', ProductoDetailAPIView.as_view(), name='producto-detail'),
     
     # ===== API ENDPOINTS - CARRITO =====
     path('api/cart/', CarritoView.as_view(), name='carrito'),
+    path('api/cart/summary/', CarritoResumenView.as_view(), name='carrito-resumen'),
     path('api/cart/<int:producto_id>/', CarritoItemView.as_view(), name='carrito-item'),
     path('api/cart/clear/', CarritoVaciarView.as_view(), name='carrito-vaciar'),
     
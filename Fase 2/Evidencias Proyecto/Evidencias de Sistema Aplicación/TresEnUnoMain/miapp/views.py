@@ -1,15 +1,39 @@
 from django.shortcuts import render, get_object_or_404
+from django.core.paginator import Paginator
 from django.db.models import Prefetch, Sum, Count
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from .models import Producto, Categoria, Oferta, Cliente, Pedido, DetallePedido
 from django.utils import timezone
 from django.utils.html import strip_tags 
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 
+import io
 import json
 import logging
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
 from .chatbot_logic import best_intent, RESPUESTAS, FALLBACK
+from .pagination import PedidoCursorPagination, ProductoCursorPagination
+from .autocompletado_logic import indice_autocompletado
+from .busqueda_logic import buscar_productos, sugerencias
+from .dashboard_logic import (
+    CLAVES_GRAFICOS,
+    cambios_dashboard,
+    dias_desde_parametro,
+    estadisticas_cache_dashboard,
+    obtener_dashboard,
+)
+from .correo_logic import encolar_correos_pedido
+from .checkout_logic import descontar_stock_pedido, resumir_items, StockInsuficienteError
+from .conciliacion_logic import CartolaInvalidaError, conciliar_transferencias
+from .idempotencia_logic import completar_clave, huella_solicitud, liberar_clave, reclamar_clave, titular_clave
+from .catalogo_logic import cache_pagina_catalogo, firma_catalogo, segundos_hasta_cambio_precio
+from .almacen_carrito_logic import obtener_almacen
+from .sesion_logic import registrar_escritura_evitada
+from .reserva_logic import reservas_activas, titular_de, retener, soltar, renovar
+from .carrito_logic import aplicar_operaciones, calcular_carrito_completo, fusionar_carritos, resumen_carrito, invalidar_resumen_carrito
 
 from rest_framework import generics, status
 from rest_framework.response import Response
@@ -17,7 +41,6 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated 
 
 from rest_framework_simplejwt.tokens import RefreshToken 
-from decimal import Decimal
 
 from rest_framework.decorators import api_view
 
@@ -28,7 +51,10 @@ from .serializers import (
     CategoriaSerializer,
     ProductoSerializer,
     ProductoListSerializer,
+    ProductoFiltroSerializer,
+    ProductoBusquedaSerializer,
     CarritoItemSerializer,
+    CarritoLoteSerializer,
     CarritoSerializer,
     CheckoutSerializer,
     PedidoSerializer,
@@ -63,6 +89,7 @@ logger = logging.getLogger(__name__)
 
 
 # ===== VISTAS HTML =====
+@cache_pagina_catalogo
 def inicio(request):
     ofertas_activas = Oferta.objects.filter(
         fecha_fin__gte=timezone.now(), 
@@ -108,6 +135,7 @@ def nosotros(request):
     return render(request, 'miapp/nosotros.html')
 
 
+@cache_pagina_catalogo
 def listar_productos(request):
     ofertas_activas = Oferta.objects.filter(
         fecha_fin__gte=timezone.now(), 
@@ -126,6 +154,7 @@ def listar_productos(request):
     return render(request, 'miapp/productos.html', contexto)
 
 
+@cache_pagina_catalogo
 def detalle_producto(request, producto_id):
     """
     Vista que renderiza la página HTML del detalle del producto
@@ -221,17 +250,29 @@ class ClienteLoginAPIView(generics.GenericAPIView):
             cliente = serializer.validated_data['cliente']
             tokens = get_tokens_for_user(cliente)
             
+            # El carrito de invitado se lee antes de cambiar la clave del carrito
+            carrito_invitado = obtener_carrito(request)
+            
             request.session['cliente_id'] = cliente.id
             request.session['cliente_correo'] = cliente.correo
             request.session['cliente_nombre'] = cliente.nombre
             
+            # Fusionar con el carrito del usuario validando todo en una consulta
+            carrito, carrito_completo, ajustes = fusionar_carritos(
+                carrito_invitado,
+                obtener_carrito(request),
+                titular=request.session.session_key if reservas_activas() else None
+            )
+            guardar_carrito(request, carrito)
             limpiar_carrito_invitado(request)
             
             return Response({
                 "message": "Login exitoso.",
                 "tokens": tokens,
                 "cliente_id": cliente.id,
-                "correo": cliente.correo
+                "correo": cliente.correo,
+                "carrito": CarritoSerializer(carrito_completo).data,
+                "ajustes_carrito": ajustes
             }, status=status.HTTP_200_OK)
 
 
@@ -263,37 +304,140 @@ class ClienteDetailAPIView(generics.RetrieveAPIView):
 
 # ===== API VIEWS - PRODUCTOS =====
 
-class ProductoListAPIView(generics.ListAPIView):
+class CatalogoCondicionalMixin:
+    """
+    GET condicional para las APIs públicas del catálogo.
+    Responde con ETag = firma_catalogo() (una consulta pequeña por índices)
+    y, si coincide con If-None-Match, retorna 304 sin consultar productos.
+    Cache-Control permite que navegadores y CDN guarden y revaliden.
+    """
+    
+    def get(self, request, *args, **kwargs):
+        etag = f'"{firma_catalogo()}"'
+        
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().get(request, *args, **kwargs)
+        
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            max_age = settings.CATALOGO_HTTP_MAX_AGE
+            if max_age:
+                # Que ningún navegador/CDN reutilice un precio más allá del próximo cambio
+                max_age = segundos_hasta_cambio_precio(max_age)
+            patch_cache_control(response, public=True, max_age=max_age, must_revalidate=True)
+        return response
+
+
+class ProductoListAPIView(CatalogoCondicionalMixin, generics.ListAPIView):
     """
     Endpoint GET /api/public/products
-    Lista todos los productos disponibles (público)
+    Lista los productos disponibles (público), paginado por cursor.
+    Filtros opcionales (todos se resuelven en SQL):
+    - categoria_id: ID de la categoría (usa el índice categoria/activo)
+    - categoria: nombre exacto de la categoría (compatibilidad)
+    - precio_min / precio_max: rango sobre el precio final (con oferta)
+    - en_stock=true: solo productos con stock
+    - en_oferta=true: solo productos con oferta vigente
+    Ejemplo: /api/public/products?categoria_id=2&en_oferta=true&page_size=24
     """
     queryset = Producto.objects.filter(activo=True).select_related('categoria')
     serializer_class = ProductoListSerializer
+    pagination_class = ProductoCursorPagination
     
     def get_queryset(self):
-        """
-        Opcionalmente permite filtrar por categoría
-        Ejemplo: /api/public/products?categoria=Hortalizas
-        """
-        queryset = super().get_queryset()
-        categoria = self.request.query_params.get('categoria', None)
+        filtros = ProductoFiltroSerializer(data=self.request.query_params)
+        filtros.is_valid(raise_exception=True)
+        datos = filtros.validated_data
+        
+        # El precio vigente se anota por request (depende de la hora actual)
+        queryset = super().get_queryset().con_precio_vigente()
+        
+        if 'categoria_id' in datos:
+            queryset = queryset.filter(categoria_id=datos['categoria_id'])
         
+        categoria = self.request.query_params.get('categoria', None)
         if categoria:
-            queryset = queryset.filter(categoria__nombre__icontains=categoria)
+            queryset = queryset.filter(categoria__nombre=categoria)
+        
+        if 'precio_min' in datos or 'precio_max' in datos:
+            queryset = queryset.alias(
+                precio_final=Coalesce('precio_oferta_vigente', 'precio_unitario')
+            )
+            if 'precio_min' in datos:
+                queryset = queryset.filter(precio_final__gte=datos['precio_min'])
+            if 'precio_max' in datos:
+                queryset = queryset.filter(precio_final__lte=datos['precio_max'])
+        
+        if datos.get('en_stock'):
+            queryset = queryset.filter(stock_disponible__gt=0)
+        
+        if datos.get('en_oferta'):
+            queryset = queryset.filter(oferta_vigente_id__isnull=False)
         
         return queryset
 
 
-class ProductoDetailAPIView(generics.RetrieveAPIView):
+class ProductoBusquedaAPIView(APIView):
+    """
+    Endpoint GET /api/public/products/search?q=<texto>&limite=20
+    Búsqueda de texto completo sobre nombre, descripción y categoría (público).
+    Retorna los productos ordenados por relevancia y sugerencias por prefijo.
+    Ejemplo: /api/public/products/search?q=tomate
+    """
+    
+    def get(self, request):
+        parametros = ProductoBusquedaSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        texto = parametros.validated_data['q']
+        
+        productos = buscar_productos(texto, limite=parametros.validated_data['limite'])
+        
+        return Response({
+            'query': texto,
+            'resultados': ProductoListSerializer(productos, many=True).data,
+            'sugerencias': sugerencias(texto),
+        }, status=status.HTTP_200_OK)
+
+class ProductoAutocompletadoAPIView(APIView):
+    """
+    Endpoint GET /api/public/products/suggest?q=<texto>
+    Autocompletado del buscador (público). Responde desde el índice en
+    memoria del proceso: no consulta la base de datos ni la sesión, por eso
+    no usa autenticación.
+    Ejemplo: /api/public/products/suggest?q=tom
+    """
+    authentication_classes = []
+    
+    def get(self, request):
+        texto = request.query_params.get('q', '')[:100]
+        return Response({
+            'query': texto,
+            'sugerencias': indice_autocompletado.buscar(texto),
+        }, status=status.HTTP_200_OK)
+
+class ProductoDetailAPIView(CatalogoCondicionalMixin, generics.RetrieveAPIView):
     """
     Endpoint GET /api/public/products/:id
     Obtiene el detalle completo de un producto específico (público)
     """
-    queryset = Producto.objects.filter(activo=True).select_related('categoria').prefetch_related('ofertas')
+    queryset = Producto.objects.filter(activo=True).select_related('categoria')
     serializer_class = ProductoSerializer
     lookup_field = 'pk'
     
+    def get_queryset(self):
+        """Anota el precio vigente y precarga solo las ofertas activas"""
+        now = timezone.now()
+        ofertas_vigentes = Oferta.objects.filter(
+            fecha_inicio__lte=now,
+            fecha_fin__gte=now,
+            activa=True
+        )
+        return super().get_queryset().con_precio_vigente(now).prefetch_related(
+            Prefetch('ofertas', queryset=ofertas_vigentes, to_attr='ofertas_vigentes')
+        )
+    
     def retrieve(self, request, *args, **kwargs):
         """
         Sobrescribe el método retrieve para manejar productos no encontrados
@@ -311,56 +455,79 @@ class ProductoDetailAPIView(generics.RetrieveAPIView):
 
 # ===== FUNCIONES AUXILIARES PARA CARRITO =====
 
-def obtener_carrito(request):
+def obtener_clave_carrito(request):
     """
-    Obtiene el carrito según si el usuario está logueado o no.
+    Retorna la clave de sesión del carrito según si el usuario está logueado o no.
     - Usuario logueado: carrito_user_{id}
     - Usuario invitado: carrito_guest
     """
-    # Determinar qué carrito usar
     cliente_id = request.session.get('cliente_id')
     
     if cliente_id:
-        # Usuario logueado
-        carrito_key = f'carrito_user_{cliente_id}'
-    else:
-        # Usuario invitado
-        carrito_key = 'carrito_guest'
+        return f'carrito_user_{cliente_id}'
+    return 'carrito_guest'
+
+
+def obtener_carrito(request):
+    """
+    Obtiene el carrito según si el usuario está logueado o no.
+    Se lee del almacén configurado en settings.CARRITO_BACKEND.
+    
+    Retorna una copia y recuerda los ítems leídos, para que guardar_carrito
+    pueda omitir la escritura si no cambiaron.
+    """
+    carrito_key = obtener_clave_carrito(request)
     
     # Obtener o crear carrito
-    carrito = request.session.get(carrito_key, {'items': {}})
+    carrito = obtener_almacen().obtener(request, carrito_key) or {'items': {}}
     
     # Asegurar estructura correcta
     if not isinstance(carrito, dict) or 'items' not in carrito:
         carrito = {'items': {}}
     
+    carrito = {'items': dict(carrito['items']), 'version': carrito.get('version', 0)}
+    _carritos_leidos(request)[carrito_key] = dict(carrito['items'])
     return carrito
 
 
 def guardar_carrito(request, carrito):
     """
     Guarda el carrito en la sesión correcta.
+    Incrementa la versión del carrito e invalida el resumen cacheado.
+    
+    Si los ítems son iguales a los leídos en este request no escribe nada
+    (ni la sesión ni la versión) y retorna False.
     """
-    # Determinar qué carrito usar
-    cliente_id = request.session.get('cliente_id')
+    carrito_key = obtener_clave_carrito(request)
+    leidos = _carritos_leidos(request)
     
-    if cliente_id:
-        carrito_key = f'carrito_user_{cliente_id}'
-    else:
-        carrito_key = 'carrito_guest'
+    if leidos.get(carrito_key) == carrito['items']:
+        registrar_escritura_evitada(request)
+        return False
+    
+    carrito['version'] = carrito.get('version', 0) + 1
     
     # Guardar carrito
-    request.session[carrito_key] = carrito
-    request.session.modified = True
+    obtener_almacen().guardar(request, carrito_key, carrito)
+    leidos[carrito_key] = dict(carrito['items'])
+    invalidar_resumen_carrito(request.session.session_key, carrito_key)
+    return True
+
+
+def _carritos_leidos(request):
+    """Ítems de cada carrito tal como se leyeron en este request."""
+    request = getattr(request, '_request', request)
+    if not hasattr(request, '_carritos_leidos'):
+        request._carritos_leidos = {}
+    return request._carritos_leidos
 
 
 def limpiar_carrito_invitado(request):
     """
     Limpia el carrito de invitado (para usar al hacer login).
     """
-    if 'carrito_guest' in request.session:
-        del request.session['carrito_guest']
-        request.session.modified = True
+    if obtener_almacen().eliminar(request, 'carrito_guest'):
+        invalidar_resumen_carrito(request.session.session_key, 'carrito_guest')
 
 
 def limpiar_carrito_usuario(request, cliente_id):
@@ -368,9 +535,8 @@ def limpiar_carrito_usuario(request, cliente_id):
     Limpia el carrito de un usuario específico (para usar al hacer logout).
     """
     carrito_key = f'carrito_user_{cliente_id}'
-    if carrito_key in request.session:
-        del request.session[carrito_key]
-        request.session.modified = True
+    if obtener_almacen().eliminar(request, carrito_key):
+        invalidar_resumen_carrito(request.session.session_key, carrito_key)
 
 
 def limpiar_carrito_actual(request):
@@ -384,59 +550,33 @@ def limpiar_carrito_actual(request):
         limpiar_carrito_usuario(request, cliente_id)
     else:
         limpiar_carrito_invitado(request)
+    
+    if reservas_activas() and request.session.session_key:
+        soltar(request.session.session_key)
 
 
-def calcular_carrito_completo(carrito):
+def stock_insuficiente(request, producto, cantidad):
     """
-    Calcula el carrito completo con información de productos y totales.
-    Retorna un diccionario con items detallados, total y cantidad de items.
+    Verifica el stock para dejar `cantidad` unidades del producto en el carrito.
+    Retorna una Response 400 si no alcanza, o None si está OK.
+
+    En modo de reservas (CARRITO_RESERVAS_ACTIVAS) además aparta las unidades
+    para esta sesión y descuenta las reservas vigentes de otros carritos.
     """
-    items_detallados = []
-    total = Decimal('0.00')
-    
-    for producto_id_str, cantidad in carrito.get('items', {}).items():
-        try:
-            producto_id = int(producto_id_str)
-            producto = Producto.objects.select_related('categoria').get(pk=producto_id)
-            
-            # Calcular precio (con oferta si existe)
-            now = timezone.now()
-            oferta = producto.ofertas.filter(
-                fecha_inicio__lte=now,
-                fecha_fin__gte=now,
-                activa=True
-            ).first()
-            
-            precio = Decimal(str(oferta.precio_oferta)) if oferta else Decimal(str(producto.precio_unitario))
-            subtotal = precio * cantidad
-            
-            imagen_url = None
-            if producto.imagen:
-                imagen_url = producto.get_imagen_url()
-            
-            item = {
-                'producto_id': producto.id,
-                'nombre': producto.nombre,
-                'precio_unitario': precio,
-                'cantidad': cantidad,
-                'unidad_medida': producto.unidad_medida,
-                'imagen_url': imagen_url,
-                'stock_disponible': producto.stock_disponible,
-                'subtotal': subtotal
-            }
-            
-            items_detallados.append(item)
-            total += subtotal
-            
-        except (Producto.DoesNotExist, ValueError):
-            # Si el producto ya no existe, lo omitimos
-            continue
+    if reservas_activas():
+        titular = titular_de(request)
+        ok, disponible = retener(titular, producto.id, cantidad)
+        if ok:
+            renovar(titular)
+    else:
+        disponible = producto.stock_disponible
+        ok = cantidad <= disponible
     
-    return {
-        'items': items_detallados,
-        'total': total,
-        'cantidad_items': sum(item['cantidad'] for item in items_detallados)
-    }
+    if ok:
+        return None
+    return Response({
+        'error': f'Stock insuficiente. Solo hay {disponible} unidades disponibles.'
+    }, status=status.HTTP_400_BAD_REQUEST)
 
 
 # ===== API VIEWS PARA EL CARRITO =====
@@ -445,6 +585,7 @@ class CarritoView(APIView):
     """
     GET /api/cart - Obtener el carrito actual
     POST /api/cart - Agregar un producto al carrito
+    PATCH /api/cart - Aplicar un lote de operaciones (set/add/remove)
     """
     
     def get(self, request):
@@ -480,10 +621,9 @@ class CarritoView(APIView):
         # Verificar stock
         try:
             producto = Producto.objects.get(pk=producto_id, activo=True)
-            if nueva_cantidad > producto.stock_disponible:
-                return Response({
-                    'error': f'Stock insuficiente. Solo hay {producto.stock_disponible} unidades disponibles.'
-                }, status=status.HTTP_400_BAD_REQUEST)
+            error = stock_insuficiente(request, producto, nueva_cantidad)
+            if error:
+                return error
             
             carrito['items'][producto_id_str] = nueva_cantidad
             guardar_carrito(request, carrito)
@@ -501,6 +641,61 @@ class CarritoView(APIView):
             return Response({'error': 'Producto no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
 
+    def patch(self, request):
+        """
+        Aplica varias operaciones en una sola petición, validadas con una
+        consulta de stock y de forma atómica (todas o ninguna):
+        {"operaciones": [{"op": "set", "producto_id": 1, "cantidad": 3},
+                         {"op": "add", "producto_id": 2, "cantidad": 1},
+                         {"op": "remove", "producto_id": 5}]}
+        """
+        lote_serializer = CarritoLoteSerializer(data=request.data)
+        
+        if not lote_serializer.is_valid():
+            return Response(lote_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        carrito = obtener_carrito(request)
+        titular = titular_de(request) if reservas_activas() else None
+        
+        try:
+            carrito, carrito_completo = aplicar_operaciones(
+                carrito, lote_serializer.validated_data['operaciones'], titular=titular
+            )
+        except StockInsuficienteError as se:
+            return Response({
+                'error': str(se),
+                'faltantes': se.faltantes
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        guardar_carrito(request, carrito)
+        if titular:
+            renovar(titular)
+        
+        serializer = CarritoSerializer(carrito_completo)
+        return Response({
+            'message': 'Carrito actualizado',
+            'carrito': serializer.data
+        }, status=status.HTTP_200_OK)
+
+
+class CarritoResumenView(APIView):
+    """
+    GET /api/cart/summary - Resumen liviano del carrito (cantidad, total y versión)
+    Pensado para el contador de la barra de navegación: usa un snapshot en cache
+    y no consulta productos ni ofertas mientras el carrito y el catálogo no cambien.
+    """
+    
+    def get(self, request):
+        """Obtiene el resumen del carrito"""
+        carrito = obtener_carrito(request)
+        resumen = resumen_carrito(
+            request.session.session_key,
+            obtener_clave_carrito(request),
+            carrito
+        )
+        return Response(resumen, status=status.HTTP_200_OK)
+
+
 class CarritoItemView(APIView):
     """
     PUT /api/cart/<producto_id> - Actualizar cantidad de un producto
@@ -523,10 +718,9 @@ class CarritoItemView(APIView):
         # Verificar stock
         try:
             producto = Producto.objects.get(pk=producto_id, activo=True)
-            if nueva_cantidad > producto.stock_disponible:
-                return Response({
-                    'error': f'Stock insuficiente. Solo hay {producto.stock_disponible} unidades disponibles.'
-                }, status=status.HTTP_400_BAD_REQUEST)
+            error = stock_insuficiente(request, producto, nueva_cantidad)
+            if error:
+                return error
             
             carrito['items'][producto_id_str] = nueva_cantidad
             guardar_carrito(request, carrito)
@@ -551,6 +745,9 @@ class CarritoItemView(APIView):
             del carrito['items'][producto_id_str]
             guardar_carrito(request, carrito)
             
+            if reservas_activas():
+                soltar(titular_de(request), [producto_id])
+            
             carrito_completo = calcular_carrito_completo(carrito)
             serializer = CarritoSerializer(carrito_completo)
             
@@ -596,127 +793,6 @@ def ver_carrito(request):
     return render(request, 'miapp/carrito.html', contexto)
 
 
-# ===== FUNCIONES DE CORREO =====
-
-def enviar_correo_confirmacion_pedido(pedido):
-    """
-    Envía correo de confirmación al cliente con instrucciones de pago
-    Usa Resend API (HTTP) en lugar de SMTP
-    """
-    try:
-        import resend
-        from django.conf import settings
-        
-        # Configurar API key de Resend
-        resend.api_key = settings.EMAIL_HOST_PASSWORD  # Usamos esta variable para la API key
-        
-        detalles = pedido.detalles.all()
-        
-        # Construir lista de productos
-        productos_html = ""
-        for detalle in detalles:
-            productos_html += f"<li>{detalle.cantidad} x {detalle.producto.nombre} - ${detalle.precio_compra:,.0f}</li>"
-        
-        mensaje_html = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <h2 style="color: #28a745;">¡Gracias por tu pedido!</h2>
-                
-                <div style="background: #f8f9fa; padding: 20px; border-radius: 5px; margin: 20px 0;">
-                    <h3>Pedido #{pedido.id}</h3>
-                    <p><strong>Total:</strong> ${pedido.total_pedido:,.0f}</p>
-                </div>
-                
-                <h3>Productos:</h3>
-                <ul>{productos_html}</ul>
-                
-                <div style="background: #fff3cd; padding: 20px; border-radius: 5px; margin: 20px 0; border-left: 4px solid #ffc107;">
-                    <h3 style="margin-top: 0;">💳 Datos para Transferencia</h3>
-                    <p><strong>Banco:</strong> Banco Estado</p>
-                    <p><strong>Tipo de Cuenta:</strong> Cuenta Vista</p>
-                    <p><strong>Número de Cuenta:</strong> 90272246717</p>
-                    <p><strong>RUT:</strong> 77.851.212-2</p>
-                    <p><strong>Titular:</strong> Tres en uno</p>
-                    <p><strong>Monto a transferir:</strong> ${pedido.total_pedido:,.0f}</p>
-                    <p style="color: #856404;"><strong>⚠️ Importante:</strong> Incluye el número de pedido #{pedido.id} en el mensaje de la transferencia.</p>
-                </div>
-                
-                <div style="background: #d4edda; padding: 20px; border-radius: 5px; margin: 20px 0;">
-                    <h3 style="margin-top: 0;">📦 Dirección de Envío</h3>
-                    <p>{pedido.direccion}</p>
-                    <p>{pedido.comuna}, {pedido.region}</p>
-                </div>
-                
-                <p>Si tienes alguna duda, contáctanos a: ventas.tresenuno@gmail.com</p>
-            </body>
-        </html>
-        """
-        
-        params = {
-            "from": f"Tres en Uno <{settings.DEFAULT_FROM_EMAIL}>",
-            "to": [pedido.correo_cliente],
-            "subject": f"Pedido #{pedido.id} - Confirmación y Datos de Pago",
-            "html": mensaje_html,
-        }
-        
-        resend.Emails.send(params)
-        logger.info(f"Correo de confirmación enviado para pedido #{pedido.id}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error al enviar correo: {str(e)}")
-        return False
-
-
-def enviar_correo_admin_nuevo_pedido(pedido):
-    """
-    Notifica al administrador sobre un nuevo pedido
-    Usa Resend API (HTTP)
-    """
-    try:
-        import resend
-        from django.conf import settings
-        
-        resend.api_key = settings.EMAIL_HOST_PASSWORD
-        
-        detalles = pedido.detalles.all()
-        productos_texto = "\n".join([f"- {d.cantidad} x {d.producto.nombre} - ${d.precio_compra:,.0f}" for d in detalles])
-        
-        mensaje = f"""
-        Nuevo pedido en Tres En Uno
-        
-        PEDIDO #{pedido.id}
-        Total: ${pedido.total_pedido:,.0f}
-        
-        CLIENTE:
-        Nombre: {pedido.nombre_cliente}
-        Email: {pedido.correo_cliente}
-        Teléfono: {pedido.telefono_cliente}
-        
-        DIRECCIÓN:
-        {pedido.direccion}
-        {pedido.comuna}, {pedido.region}
-        
-        PRODUCTOS:
-        {productos_texto}
-        """
-        
-        params = {
-            "from": f"Tres en Uno <{settings.DEFAULT_FROM_EMAIL}>",
-            "to": ["ventas.tresenuno@gmail.com"],
-            "subject": f"🛒 Nuevo Pedido #{pedido.id} - {pedido.nombre_cliente}",
-            "text": mensaje,
-        }
-        
-        resend.Emails.send(params)
-        logger.info(f"Correo admin enviado para pedido #{pedido.id}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Error al enviar correo admin: {str(e)}")
-        return False
-
-
 # ===== API VIEWS PARA CHECKOUT =====
 
 class CheckoutAPIView(APIView):
@@ -726,7 +802,44 @@ class CheckoutAPIView(APIView):
     """
     
     def post(self, request):
-        """Procesa el checkout y crea el pedido"""
+        """
+        Procesa el checkout y crea el pedido.
+        Con el encabezado Idempotency-Key, un reintento o doble envío con la
+        misma clave recibe la misma respuesta 201 sin crear otro pedido
+        (409 mientras la primera solicitud sigue en proceso).
+        """
+        clave = request.headers.get('Idempotency-Key')
+        if not clave:
+            return self._crear_pedido(request, None)
+        
+        if len(clave) > 100:
+            return Response({'error': 'Idempotency-Key inválida'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        huella = huella_solicitud(request.data)
+        registro, nueva = reclamar_clave(titular_clave(request), clave, huella)
+        
+        if not nueva:
+            if registro.huella != huella:
+                return Response({
+                    'error': 'La Idempotency-Key ya se usó con otros datos'
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if registro.estado == 'en_proceso':
+                logger.info(f"Checkout duplicado en proceso (clave {clave})")
+                return Response({
+                    'error': 'El pedido ya se está procesando'
+                }, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+            logger.info(f"Checkout repetido: se reenvía la respuesta del pedido #{registro.pedido_id}")
+            return Response(registro.respuesta, status=registro.codigo_estado,
+                            headers={'Idempotent-Replayed': 'true'})
+        
+        response = self._crear_pedido(request, registro)
+        if response.status_code != status.HTTP_201_CREATED:
+            # Solo se guardan las respuestas exitosas; la clave puede reintentarse
+            liberar_clave(registro)
+        return response
+    
+    def _crear_pedido(self, request, registro):
+        """Crea el pedido; si hay clave de idempotencia la completa en la misma transacción"""
         
         try:
             # Log de inicio para debugging
@@ -769,6 +882,9 @@ class CheckoutAPIView(APIView):
             else:
                 logger.info("Checkout como invitado")
             
+            # Resumen de las líneas que queda guardado en el pedido (historial sin joins)
+            cantidad_items, resumen = resumir_items(carrito_completo['items'])
+            
             # Crear el pedido dentro de una transacción
             with transaction.atomic():
                 # Crear el pedido
@@ -785,57 +901,59 @@ class CheckoutAPIView(APIView):
                     notas_pedido=datos_pedido.get('notas_pedido', ''),
                     metodo_pago=datos_pedido.get('metodo_pago', 'transferencia'),
                     total_pedido=carrito_completo['total'],
-                    estado_pedido='pendiente_pago'
+                    estado_pedido='pendiente_pago',
+                    cantidad_items=cantidad_items,
+                    resumen_items=resumen
                 )
                 
                 logger.info(f"Pedido creado: #{pedido.id}")
                 
-                # Crear detalles del pedido y descontar stock
-                for item in carrito_completo['items']:
-                    try:
-                        producto = Producto.objects.select_for_update().get(pk=item['producto_id'])
-                        
-                        # Verificar stock nuevamente (por si cambió)
-                        if producto.stock_disponible < item['cantidad']:
-                            logger.error(f"Stock insuficiente para {producto.nombre}")
-                            raise ValueError(f'Stock insuficiente para {producto.nombre}')
-                        
-                        # Crear detalle
-                        DetallePedido.objects.create(
-                            pedido=pedido,
-                            producto=producto,
-                            cantidad=item['cantidad'],
-                            precio_compra=item['precio_unitario']
-                        )
-                        
-                        # Descontar stock
-                        producto.reducir_stock(item['cantidad'])
-                        logger.info(f"Stock actualizado para {producto.nombre}: {producto.stock_disponible}")
-                        
-                    except Producto.DoesNotExist:
-                        logger.error(f"Producto {item['producto_id']} no encontrado")
-                        raise ValueError(f"Producto no encontrado: {item['nombre']}")
+                # Descontar stock de todas las líneas y crear los detalles
+                # (un bloqueo ordenado, un UPDATE condicional y un bulk_create)
+                descontar_stock_pedido(
+                    pedido,
+                    carrito_completo['items'],
+                    titular=titular_de(request) if reservas_activas() else None
+                )
+                logger.info(f"Stock descontado para {len(carrito_completo['items'])} producto(s)")
+                
+                # Correos al cliente y al admin en la cola de salida (misma transacción);
+                # los envía el worker `manage.py run_outbox`
+                encolar_correos_pedido(pedido)
+                
+                # Serializar el pedido para la respuesta (detalles y productos
+                # precargados: sin una consulta por línea)
+                pedido_serializer = PedidoSerializer(
+                    Pedido.objects.con_detalles().get(pk=pedido.pk),
+                    context={'request': request}
+                )
+                datos_respuesta = {
+                    'message': 'Pedido creado exitosamente',
+                    'pedido': pedido_serializer.data
+                }
+                
+                # La respuesta queda guardada junto con el pedido (mismo commit)
+                if registro is not None:
+                    completar_clave(registro, pedido, status.HTTP_201_CREATED, datos_respuesta)
                 
                 # Si llegamos aquí, todo OK - commit implícito al salir del with
                 logger.info(f"Transacción completada para pedido #{pedido.id}")
             
-            # FUERA de la transacción: limpiar carrito y enviar correos
+            # FUERA de la transacción: limpiar carrito
             limpiar_carrito_actual(request)
             logger.info("Carrito limpiado")
             
-            # Enviar correos (no afectan la transacción)
-            enviar_correo_confirmacion_pedido(pedido)
-            enviar_correo_admin_nuevo_pedido(pedido)
-            
-            # Serializar el pedido para la respuesta
-            pedido_serializer = PedidoSerializer(pedido, context={'request': request})
-            
             logger.info(f"=== CHECKOUT EXITOSO: Pedido #{pedido.id} ===")
             
+            return Response(datos_respuesta, status=status.HTTP_201_CREATED)
+            
+        except StockInsuficienteError as se:
+            # Se informan todas las líneas sin stock suficiente de una vez
+            logger.error(f"Stock insuficiente: {se.faltantes}")
             return Response({
-                'message': 'Pedido creado exitosamente',
-                'pedido': pedido_serializer.data
-            }, status=status.HTTP_201_CREATED)
+                'error': str(se),
+                'faltantes': se.faltantes
+            }, status=status.HTTP_400_BAD_REQUEST)
             
         except ValueError as ve:
             # Errores de validación de negocio (stock, etc)
@@ -855,12 +973,16 @@ class CheckoutAPIView(APIView):
 class MisPedidosAPIView(generics.ListAPIView):
     """
     GET /api/mis-pedidos - Lista los pedidos del usuario autenticado
+    Paginado por cursor; cantidad_items y resumen_items vienen guardados en
+    el pedido, por lo que cada página es una sola consulta sobre el índice
+    (usuario, -fecha_pedido), sin joins.
     """
     serializer_class = PedidoListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PedidoCursorPagination
     
     def get_queryset(self):
-        return Pedido.objects.filter(usuario=self.request.user).order_by('-fecha_pedido')
+        return Pedido.objects.filter(usuario=self.request.user)
 
 
 class DetallePedidoAPIView(generics.RetrieveAPIView):
@@ -871,7 +993,8 @@ class DetallePedidoAPIView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Pedido.objects.filter(usuario=self.request.user)
+        # Detalles y productos precargados: una consulta para todas las líneas
+        return Pedido.objects.filter(usuario=self.request.user).con_detalles()
 
 
 # ===== VISTAS HTML =====
@@ -945,15 +1068,20 @@ def mis_pedidos(request):
         from django.shortcuts import redirect
         return redirect('login-form')
     
-    pedidos = Pedido.objects.filter(usuario=request.user).order_by('-fecha_pedido')
+    pedidos = (
+        Pedido.objects.filter(usuario=request.user)
+        .order_by('-fecha_pedido', '-id')
+    )
+    pagina = Paginator(pedidos, 20).get_page(request.GET.get('pagina'))
     
     contexto = {
-        'pedidos': pedidos,
+        'pedidos': pagina,
+        'pagina': pagina,
     }
     
     return render(request, 'miapp/mis_pedidos.html', contexto)
 
-class CategoriaListAPIView(generics.ListAPIView):
+class CategoriaListAPIView(CatalogoCondicionalMixin, generics.ListAPIView):
     """
     Endpoint GET /api/public/categories
     Lista todas las categorías activas (público)
@@ -968,136 +1096,72 @@ class CategoriaListAPIView(generics.ListAPIView):
 
 @staff_member_required
 def dashboard_admin_view(request):
-    """Vista del dashboard de administración"""
-    from django.db.models import Sum, Count
-    
-    hoy = timezone.now()
-    hace_30_dias = hoy - timedelta(days=30)
-    hace_7_dias = hoy - timedelta(days=7)
-    
-    # Ventas del mes
-    ventas_mes_query = Pedido.objects.filter(
-        fecha_pedido__month=hoy.month,
-        fecha_pedido__year=hoy.year,
-        estado_pedido__in=['pagado', 'preparando', 'enviado', 'completado']
-    ).aggregate(total=Sum('total_pedido'))
-    
-    ventas_mes = ventas_mes_query['total'] if ventas_mes_query['total'] else 0
-    
-    # Resto de métricas
-    pedidos_mes = Pedido.objects.filter(
-        fecha_pedido__month=hoy.month,
-        fecha_pedido__year=hoy.year
-    ).count()
-    
-    pedidos_pendientes = Pedido.objects.filter(estado_pedido='pendiente_pago').count()
-    total_productos = Producto.objects.filter(activo=True).count()
-    total_clientes = Cliente.objects.filter(is_active=True).count()
-    
-    # Ventas por día
-    ventas_por_dia = []
-    labels_dias = []
-    
-    for i in range(30, -1, -1):
-        fecha = hoy - timedelta(days=i)
-        ventas_dia_query = Pedido.objects.filter(
-            fecha_pedido__date=fecha.date(),
-            estado_pedido__in=['pagado', 'preparando', 'enviado', 'completado']
-        ).aggregate(total=Sum('total_pedido'))
-        
-        ventas_dia = float(ventas_dia_query['total']) if ventas_dia_query['total'] else 0.0
-        ventas_por_dia.append(ventas_dia)
-        labels_dias.append(fecha.strftime('%d/%m'))
-    
-    # Top productos
-    productos_vendidos = DetallePedido.objects.filter(
-        pedido__estado_pedido__in=['pagado', 'preparando', 'enviado', 'completado'],
-        pedido__fecha_pedido__gte=hace_30_dias
-    ).values('producto__nombre').annotate(
-        total_vendido=Sum('cantidad')
-    ).order_by('-total_vendido')[:5]
-    
-    # Últimos pedidos
-    ultimos_pedidos = Pedido.objects.order_by('-fecha_pedido')[:10]
-    
-    # Pedidos por estado
-    pedidos_por_estado = Pedido.objects.values('estado_pedido').annotate(
-        total=Count('id')
-    ).order_by('-total')
-    
-    estados_labels = []
-    estados_data = []
-    estados_background = []
-    estados_colores = {
-        'pendiente_pago': '#ffc107',
-        'pagado': '#28a745',
-        'preparando': '#17a2b8',
-        'enviado': '#007bff',
-        'completado': '#6c757d',
-        'cancelado': '#dc3545',
-    }
-    
-    for estado in pedidos_por_estado:
-        estados_labels.append(dict(Pedido.ESTADOS).get(estado['estado_pedido'], estado['estado_pedido']))
-        estados_data.append(estado['total'])
-        estados_background.append(estados_colores.get(estado['estado_pedido'], '#6c757d'))
-    
-    # Ventas por categoría
-    ventas_por_categoria = DetallePedido.objects.filter(
-        pedido__estado_pedido__in=['pagado', 'preparando', 'enviado', 'completado'],
-        pedido__fecha_pedido__gte=hace_30_dias
-    ).values('producto__categoria__nombre').annotate(
-        total_vendido=Sum('cantidad')
-    ).order_by('-total_vendido')[:5]
-    
-    categorias_labels = [item['producto__categoria__nombre'] or 'Sin categoría' for item in ventas_por_categoria]
-    categorias_data = [item['total_vendido'] for item in ventas_por_categoria]
-    
-    # Comparación semana
-    ventas_semana_query = Pedido.objects.filter(
-        fecha_pedido__gte=hace_7_dias,
-        estado_pedido__in=['pagado', 'preparando', 'enviado', 'completado']
-    ).aggregate(total=Sum('total_pedido'))
-    
-    ventas_esta_semana = ventas_semana_query['total'] if ventas_semana_query['total'] else 0
-    
-    hace_14_dias = hoy - timedelta(days=14)
-    ventas_anterior_query = Pedido.objects.filter(
-        fecha_pedido__gte=hace_14_dias,
-        fecha_pedido__lt=hace_7_dias,
-        estado_pedido__in=['pagado', 'preparando', 'enviado', 'completado']
-    ).aggregate(total=Sum('total_pedido'))
-    
-    ventas_semana_anterior = ventas_anterior_query['total'] if ventas_anterior_query['total'] else 0
-    
-    if ventas_semana_anterior > 0:
-        cambio_porcentaje = ((ventas_esta_semana - ventas_semana_anterior) / ventas_semana_anterior) * 100
-    else:
-        cambio_porcentaje = 100 if ventas_esta_semana > 0 else 0
+    """Vista del dashboard de administración (rango del gráfico con ?dias=7/30/90/365)"""
+    dias = dias_desde_parametro(request.GET.get('dias'))
+    entrada = obtener_dashboard(dias=dias)
     
     contexto = {
         'title': 'Dashboard de Ventas',
-        'ventas_mes': ventas_mes,
-        'pedidos_mes': pedidos_mes,
-        'pedidos_pendientes': pedidos_pendientes,
-        'total_productos': total_productos,
-        'total_clientes': total_clientes,
-        'ventas_esta_semana': ventas_esta_semana,
-        'cambio_porcentaje': round(cambio_porcentaje, 1),
-        'ventas_labels': json.dumps(labels_dias),
-        'ventas_data': json.dumps(ventas_por_dia),
-        'estados_labels': json.dumps(estados_labels),
-        'estados_data': json.dumps(estados_data),
-        'estados_background': json.dumps(estados_background),
-        'categorias_labels': json.dumps(categorias_labels),
-        'categorias_data': json.dumps(categorias_data),
-        'productos_vendidos': productos_vendidos,
-        'ultimos_pedidos': ultimos_pedidos,
+        **entrada['datos'],
+        'version': entrada['version'],
     }
+    # Los gráficos se pasan como JSON al JavaScript de la plantilla
+    for clave in CLAVES_GRAFICOS:
+        contexto[clave] = json.dumps(contexto[clave])
     
     return render(request, 'admin/dashboard.html', contexto)
 
 
+@staff_member_required
+def dashboard_datos_view(request):
+    """
+    GET /admin/dashboard/data/?dias=30&version=<n>
+    Gráficos e indicadores en JSON; solo incluye lo que cambió desde la
+    versión que ya tiene la página.
+    """
+    dias = dias_desde_parametro(request.GET.get('dias'))
+    try:
+        version = int(request.GET['version'])
+    except (KeyError, ValueError):
+        version = None
+    return JsonResponse(cambios_dashboard(dias=dias, version_cliente=version))
+
+
+@staff_member_required
+def dashboard_metricas_view(request):
+    """GET /admin/dashboard/metrics/ - Estadísticas del cache del dashboard (monitoreo)"""
+    return JsonResponse(estadisticas_cache_dashboard())
+
+
+@staff_member_required
+def conciliar_transferencias_view(request):
+    """
+    GET/POST /admin/conciliar-transferencias/
+    Sube la cartola del banco (CSV) y marca como pagados los pedidos que
+    calzan por número en la glosa y monto (ver conciliacion_logic).
+    """
+    contexto = {'title': 'Conciliar transferencias'}
+    if request.method == 'POST':
+        archivo = request.FILES.get('cartola')
+        if not archivo:
+            contexto['error'] = 'Selecciona el archivo CSV de la cartola.'
+        else:
+            cartola = io.TextIOWrapper(
+                archivo.file, encoding=request.POST.get('encoding') or 'utf-8-sig', newline=''
+            )
+            try:
+                contexto['resumen'] = conciliar_transferencias(
+                    cartola,
+                    usuario=request.user,
+                    simular=bool(request.POST.get('simular')),
+                )
+                contexto['simular'] = bool(request.POST.get('simular'))
+            except (CartolaInvalidaError, UnicodeDecodeError, LookupError) as error:
+                contexto['error'] = f'No se pudo leer la cartola: {error}'
+    
+    return render(request, 'admin/conciliar_transferencias.html', contexto)
+
+
 @csrf_exempt
 def chatbot_ask(request):
     if request.method != 'POST':
@@ -1147,13 +1211,10 @@ def perfil_temporal(request):
     # Obtener el cliente actual desde la base de datos
     cliente = Cliente.objects.get(id=cliente_id)
     
-    # Obtener solo los pedidos de este cliente
+    # Obtener solo los pedidos de este cliente; las líneas salen de
+    # resumen_items, sin consultar detalles ni productos
     pedidos = Pedido.objects.filter(
         usuario=cliente
-    ).select_related(
-        'usuario'
-    ).prefetch_related(
-        'detalles__producto'
     ).order_by('-fecha_pedido')
     
     contexto = {
@@ -77,6 +77,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'miapp.almacen_carrito_logic.AlmacenCarritoMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -250,6 +251,16 @@ SIMPLE_JWT = {
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')  # API key de Resend
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='onboarding@resend.dev')
 
+# Cola de salida de correos (la drena `python manage.py run_outbox`)
+# Para desarrollo sin API key: CORREO_REMITENTE=miapp.correo_logic.RemitenteMemoria
+CORREO_REMITENTE = config('CORREO_REMITENTE', default='miapp.correo_logic.RemitenteResend')
+OUTBOX_LOTE = config('OUTBOX_LOTE', default=20, cast=int)
+OUTBOX_MAX_INTENTOS = config('OUTBOX_MAX_INTENTOS', default=6, cast=int)
+OUTBOX_REINTENTO_BASE = config('OUTBOX_REINTENTO_BASE', default=30, cast=int)  # segundos
+OUTBOX_REINTENTO_MAXIMO = config('OUTBOX_REINTENTO_MAXIMO', default=3600, cast=int)  # segundos
+OUTBOX_INTERVALO = config('OUTBOX_INTERVALO', default=5, cast=int)  # segundos entre lotes vacíos
+OUTBOX_RESERVA = config('OUTBOX_RESERVA', default=300, cast=int)  # segundos que un lote tomado queda reservado
+
 # ==============================================================================
 # SITE CONFIGURATION
 # ==============================================================================
@@ -262,11 +273,109 @@ elif not DEBUG:
 else:
     SITE_URL = config('SITE_URL', default='http://127.0.0.1:8000')
 
+# ==============================================================================
+# CACHE
+# ==============================================================================
+
+# La invalidación del catálogo (catalogo:version), los snapshots del resumen
+# del carrito, el próximo cambio de precio y el dashboard viven en el cache:
+# con varios workers de gunicorn el cache DEBE ser compartido, o un cambio
+# hecho en un worker no llega a los demás. Por eso el cache en memoria por
+# proceso solo se usa con DEBUG (runserver / tests, un solo proceso).
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    # Producción: cache compartido entre todos los workers de gunicorn
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+    CACHE_COMPARTIDO = True
+elif not DEBUG:
+    # Producción sin Redis: cache en la base de datos, compartido entre
+    # workers (la tabla se crea con `manage.py createcachetable`)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_tresenuno',
+        }
+    }
+    CACHE_COMPARTIDO = True
+else:
+    # Desarrollo local / tests: cache en memoria por proceso
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tresenuno',
+        }
+    }
+    CACHE_COMPARTIDO = False
+
+# Cache-Control max-age (segundos) de las APIs públicas del catálogo; con 0 el
+# navegador/CDN revalida siempre con If-None-Match (304 si el ETag no cambió)
+CATALOGO_HTTP_MAX_AGE = config('CATALOGO_HTTP_MAX_AGE', default=0, cast=int)
+
+# Cache de páginas HTML del catálogo (inicio, productos, detalle) para visitas
+# anónimas; se invalida con la versión del catálogo y el inicio/fin de ofertas.
+# El TTL acota además el "más vendidos" de inicio, que depende de los pedidos.
+# Por defecto solo se activa con un cache compartido: con LocMem cada worker
+# guardaría su copia y la invalidación de otro worker no la alcanzaría.
+PAGINAS_CATALOGO_CACHE = config('PAGINAS_CATALOGO_CACHE', default=CACHE_COMPARTIDO, cast=bool)
+PAGINAS_CATALOGO_TTL = config('PAGINAS_CATALOGO_TTL', default=300, cast=int)  # segundos
+
+# Cada cuántos segundos el índice de autocompletado de un proceso revisa la
+# versión compartida de los nombres (un cache.get; con DatabaseCache, una
+# consulta). Los cambios hechos en otros workers aparecen con este retraso
+AUTOCOMPLETADO_REVISION_VERSION = config('AUTOCOMPLETADO_REVISION_VERSION', default=5, cast=float)
+
+# Tiempo máximo (segundos) que se reutiliza el resumen del carrito de la barra de navegación
+CARRITO_RESUMEN_TTL = config('CARRITO_RESUMEN_TTL', default=300, cast=int)
+
+# Dónde se guardan los carritos: 'sesion' (fila de django_session), 'cache'
+# (requiere REDIS_URL con varios workers) o 'cookie' (cookie firmada, sin estado)
+CARRITO_BACKEND = config('CARRITO_BACKEND', default='sesion')
+CARRITO_COOKIE_NOMBRE = 'carrito'
+
+# Reservas de stock del carrito: agregar al carrito aparta unidades por un tiempo
+# (stock disponible = stock_disponible - reservas vigentes). Vencidas: `manage.py limpiar_reservas`
+CARRITO_RESERVAS_ACTIVAS = config('CARRITO_RESERVAS_ACTIVAS', default=False, cast=bool)
+CARRITO_RESERVA_TTL = config('CARRITO_RESERVA_TTL', default=900, cast=int)  # segundos
+
+# Vigencia (segundos) de las Idempotency-Key del checkout; las vencidas se
+# eliminan con `manage.py limpiar_reservas`
+CHECKOUT_IDEMPOTENCIA_TTL = config('CHECKOUT_IDEMPOTENCIA_TTL', default=86400, cast=int)
+# Segundos tras los que una clave 'en_proceso' se da por abandonada. Debe ser
+# mayor que el timeout de gunicorn (120 s en el Procfile): un checkout lento
+# pero vivo no puede perder su clave a manos de un reintento
+CHECKOUT_IDEMPOTENCIA_ABANDONO = config('CHECKOUT_IDEMPOTENCIA_ABANDONO', default=300, cast=int)
+
+# ==============================================================================
+# DASHBOARD CONFIGURATION
+# ==============================================================================
+
+# Fuente de las métricas del dashboard de ventas:
+# 'rollups' (tablas VentaDiaria, por defecto) o 'pedidos' (agregación directa en una consulta)
+DASHBOARD_FUENTE = config('DASHBOARD_FUENTE', default='rollups')
+
+# Segundos que las métricas en cache se consideran vigentes, y segundos extra
+# durante los que se sirven obsoletas mientras un solo proceso las recalcula
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=30, cast=int)
+DASHBOARD_CACHE_OBSOLETO = config('DASHBOARD_CACHE_OBSOLETO', default=300, cast=int)
+DASHBOARD_REFRESCO_ASINCRONO = config('DASHBOARD_REFRESCO_ASINCRONO', default=True, cast=bool)
+# Segundos que una petición sin métricas en cache espera a que el proceso con
+# el candado las calcule, en vez de calcularlas todas a la vez tras un deploy
+DASHBOARD_CACHE_ESPERA = config('DASHBOARD_CACHE_ESPERA', default=5, cast=float)
+
 # ==============================================================================
 # SESSION CONFIGURATION
 # ==============================================================================
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# 'django.contrib.sessions.backends.cached_db' lee la sesión desde el cache (Redis
+# con REDIS_URL) y solo consulta django_session en un fallo; '...backends.cache'
+# no usa la base de datos (las sesiones se pierden si el cache se vacía)
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.db')
 SESSION_COOKIE_NAME = 'sessionid'
 SESSION_COOKIE_AGE = 1209600  # 2 semanas
 SESSION_COOKIE_HTTPONLY = True
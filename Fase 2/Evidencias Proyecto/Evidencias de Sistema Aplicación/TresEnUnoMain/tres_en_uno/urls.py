@@ -3,11 +3,20 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
-from miapp.views import dashboard_admin_view, CustomPasswordResetView
+from miapp.views import (
+    dashboard_admin_view,
+    dashboard_datos_view,
+    dashboard_metricas_view,
+    conciliar_transferencias_view,
+    CustomPasswordResetView,
+)
 
 urlpatterns = [
     # ===== DASHBOARD ADMIN (DEBE IR ANTES DE admin/) =====
     path('admin/dashboard/', dashboard_admin_view, name='admin-dashboard'),
+    path('admin/dashboard/data/', dashboard_datos_view, name='admin-dashboard-data'),
+    path('admin/dashboard/metrics/', dashboard_metricas_view, name='admin-dashboard-metrics'),
+    path('admin/conciliar-transferencias/', conciliar_transferencias_view, name='admin-conciliar-transferencias'),
     
     path('admin/', admin.site.urls),
     path('', include('miapp.urls')),